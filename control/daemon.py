@@ -0,0 +1,106 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import sys
+import threading
+import time
+import traceback as tb
+
+
+class UpdateDaemon ():
+    '''
+    Keeps a Loader working on the due category and price updates
+    instead of running them in one burst. The price update runs of a
+    plan are spread evenly over price_update_age in chunks of
+    chunk_size, categories are updated one at a time next to them.
+    Limit the request rate with a RateLimitedRequestManager shared by
+    both.
+
+    stop() lets the work in progress finish: the current price chunk is
+    completed, the current category stops taking new products and
+    keeps its checkpoint.
+    '''
+    def __init__ (self, loader, category_update_age, price_update_age, chunk_size=100,
+                  scheduler=None, idle_interval=60.0):
+        self._loader = loader
+        self._category_update_age = category_update_age
+        self._price_update_age = price_update_age
+        self._chunk_size = chunk_size
+        self._scheduler = scheduler
+        # Seconds to wait when there is nothing to do or after errors
+        self._idle_interval = idle_interval
+
+        self._stop = threading.Event()
+
+    def stop (self):
+        self._stop.set()
+
+    def _wait (self, seconds):
+        # Returns whether the daemon is stopped
+        return self._stop.wait(max(0.0, seconds))
+
+    def _plan_prices (self):
+        # Returns the seconds per update run that spread the plan over
+        # price_update_age
+        planned = self._loader.plan_price_update_runs(self._price_update_age,
+                                                      scheduler=self._scheduler)
+        print("Planned {:d} price update runs".format(planned))
+
+        if planned == 0:
+            return 0.0
+
+        return self._price_update_age.total_seconds() / planned
+
+    def _run_prices (self):
+        next_plan = time.monotonic()
+        # Seconds per update run, runs left over from earlier plans or
+        # other loaders are worked on without delay
+        pace = 0.0
+
+        while not self._stop.is_set():
+            start = time.monotonic()
+
+            try:
+                runs, new, inconsistent = self._loader.update_price_chunk(self._chunk_size)
+            except Exception as e:
+                print("Price update failed", file=sys.stderr)
+                tb.print_exception(type(e), e, e.__traceback__)
+                self._wait(self._idle_interval)
+                continue
+
+            if runs != 0:
+                print("Price update runs: {:d}, new prices: {:d}, inconsistent: {:d}".format(
+                        runs, new, inconsistent
+                    ))
+                self._wait(runs * pace - (time.monotonic() - start))
+            elif start >= next_plan:
+                next_plan = start + self._price_update_age.total_seconds()
+                pace = self._plan_prices()
+            else:
+                self._wait(min(self._idle_interval, next_plan - start))
+
+    def _run_categories (self):
+        while not self._stop.is_set():
+            try:
+                category_id = self._loader.update_next_category(stop=self._stop)
+
+                if category_id is None and self._loader.plan_category_update_runs(
+                        self._category_update_age) == 0:
+                    self._wait(self._idle_interval)
+            except Exception as e:
+                print("Category update failed", file=sys.stderr)
+                tb.print_exception(type(e), e, e.__traceback__)
+                self._wait(self._idle_interval)
+
+    def run (self):
+        # Returns after stop() once the work in progress is done
+        categories = threading.Thread(target=self._run_categories, name="daemon-categories")
+        categories.start()
+
+        try:
+            self._run_prices()
+        finally:
+            self._stop.set()
+            categories.join()
@@ -1,200 +1,811 @@
-'''
-Created on 14.02.2022
-
-@author: larsw
-'''
-from pprint import pprint
-from model.storage import MySQLStorage, StorageInsertError
-from control.scraping import IdealoRequester
-import datetime as dt
-import numpy as np
-import sys
-import traceback as tb
-
-
-class Loader(object):
-    '''
-    classdocs
-    '''
-
-
-    def __init__(self, storage, scraper):
-        self._storage = storage
-        self._scraper = scraper
-        
-    def load_products_of_category (self, category_id, min_date=None):
-        category_name = self._scraper.get_name_of_category(category_id,
-                                                           min_date=min_date)
-        self._storage.store_category(category_id, category_name)
-        
-        # Product ID -> (Name, Product URL)
-        product_ids = self._scraper.get_products_of_category(category_id,
-                                                             min_date=min_date)
-        
-        # {ProductID : Product URL}
-        product_detail_pages = {}
-        
-        for product_id in product_ids:
-            # Product Name, Product URL
-            _, product_url = product_ids[product_id]
-            product_detail_pages[product_id] = IdealoRequester.URL_BASE+product_url
-            
-        return product_detail_pages
-            
-    def load_prices (self, product_ids, min_date=None):
-        # Product ID -> Series
-        prices = self._scraper.get_api(product_ids, min_date=min_date)
-        
-        for product_id in prices:
-            series = prices[product_id]
-            self._storage.store_prices(product_id, series)
-            
-        return prices
-    
-    def load_product_variants (self, variant_urls, product_categories, min_date=None):
-        # variant_urls: {Product ID : Product URL}
-        # product_categories: {Product ID : Category ID}
-        
-        # {Product ID : (Product Name, Datasheet (uncompressed))}
-        product_details = self._scraper.get_details_from_variant_pages(variant_urls,
-                                                                       min_date=min_date)
-        
-        stored_pids = []
-
-        for product_id in product_details:
-            category_id = product_categories[product_id]
-            product_name, datasheet = product_details[product_id]
-            
-            try:
-                self._storage.store_product(product_id, product_name, 
-                                            category_id, datasheet)
-                stored_pids.append(product_id)
-            except StorageInsertError as e:
-                errmsg = f"""Product storage failed with
-                PID: {product_id}
-                CID: {category_id}
-                Name: {product_name}
-                Datasheet:
-                {datasheet}
-                """
-                print(errmsg, file=sys.stderr)
-                tb.print_exc()
-
-        self.load_prices(stored_pids, min_date=min_date)
-    
-    def load_full_category (self, category_id, min_date=None):        
-        # {ProductID : Product Detail Page}
-        product_detail_urls = self.load_products_of_category(category_id,
-                                                             min_date=min_date)
-        print("Product detail URLs: "+str(len(product_detail_urls)))
-        pprint(product_detail_urls, indent=3)
-
-        # {Product ID : [URL1, URL2, ...]
-        variant_urls = self._scraper.get_product_variants_of_product_detail_page(
-                    product_detail_urls,
-                    min_date=min_date
-        )
-        pprint(variant_urls)
-        # {Variant Product ID : Variant URL}
-        variant_urls = {
-                int(IdealoRequester.product_offer_url_to_id(variant_url)) : variant_url
-                for x in variant_urls
-                for variant_url in variant_urls[x]
-            }
-        print("Variant URLs: "+str(len(variant_urls)))
-        
-        # {Product ID : (Product Name, Datasheet (uncompressed))}
-        product_details = self._scraper.get_details_from_variant_pages(variant_urls,
-                                                                       min_date=min_date)
-        product_categories = {x : category_id for x in product_details}
-        self.load_product_variants(variant_urls, product_categories,
-                                   min_date=min_date)
-        
-    def _get_executeable_update_runs (self, update_runs, min_update_age):
-        if len(update_runs) == 0:
-            now = dt.datetime.utcnow()
-            last_price_ages = self._storage.get_last_price_ages(now)
-            sel = last_price_ages["Age"] >= min_update_age
-            last_price_ages = last_price_ages[sel]
-            last_price_ages = last_price_ages * 2
-            
-            periods = [
-                    IdealoRequester.get_api_period_for_timedelta(
-                            dt.timedelta(seconds=x / np.timedelta64(1, 's'))
-                        )
-                    for x in last_price_ages["Age"].values
-                ]
-            
-            last_price_ages["Period"] = periods
-            
-            update_runs = last_price_ages.drop("Age", axis=1)
-            update_runs["Date"] = [now for _ in range(len(update_runs))]
-            
-            self._storage.store_update_runs(update_runs)
-        else:
-            update_runs = update_runs.reset_index()
-            update_runs = update_runs.set_index("ProductId")
-        
-        return update_runs
-        
-    def update_prices (self, min_update_age):
-        update_runs = self._storage.get_update_runs()
-        update_runs = self._get_executeable_update_runs(update_runs, min_update_age)
-        
-        product_ids = list(update_runs.index.values)
-        min_dates = [x.to_pydatetime() for x in update_runs["Date"]]
-        periods = list(update_runs["Period"].values)
-        
-        # Product ID -> Series
-        prices = self._scraper.get_api(product_ids, min_date=min_dates, period=periods)
-        
-        for product_id in prices:
-            series = prices[product_id]
-            self._storage.store_prices(product_id, series)
-        
-        for product_id in product_ids:
-            v = update_runs.loc[product_id]
-            run_date = v["Date"].to_pydatetime()
-            
-            self._storage.delete_update_run(run_date, product_id)
-
-    def _update_category_indices(self, updateable_df):
-        # updateable_df: V_CATEGORY_ID -> [V_TIMESTAMP]
-        
-        for category_id in updateable_df.index.values:
-            timestamp = updateable_df.loc[category_id][MySQLStorage.V_TIMESTAMP]
-            print(f"Update of {category_id} at {timestamp}")
-
-            # Loading category ...
-            self.load_full_category(category_id, min_date=timestamp)
-
-            self._storage.delete_category_update_run(category_id) 
-    
-    def _run_current_category_update_runs(self):
-        # V_CATEGORY_ID -> V_TIMESTAMP 
-        update_runs = self._storage.get_category_update_run()
-
-        if len(update_runs) != 0:
-            self._update_category_indices(update_runs)
-
-    def _select_updateable_categories(self, last_updates, min_update_age):
-        # V_CATEGORY_ID -> V_TIMESTAMP 
-
-        last_updates[MySQLStorage.V_TIMESTAMP] += min_update_age
-        selector = last_updates[MySQLStorage.V_TIMESTAMP] <= dt.datetime.utcnow()
-        last_updates = last_updates[selector]
-        return last_updates.index.unique()
-
-    def update_categories(self, min_update_age):
-        self._run_current_category_update_runs()
-
-        # V_CATEGORY_ID -> V_TIMESTAMP 
-        last_updates = self._storage.get_last_category_update()
-        updateables = self._select_updateable_categories(last_updates,
-                                                         min_update_age)
-        utcnow = dt.datetime.utcnow()
-
-        for updateable in updateables:
-            self._storage.store_category_update_run(updateable, utcnow)
-        
-        self._run_current_category_update_runs()
+'''
+Created on 14.02.2022
+
+@author: larsw
+'''
+from model.storage import Storage, MySQLStorage, StorageInsertError
+from control.scraping import IdealoRequester
+from control.pipeline import Pipeline
+from control.planning import RequestPlanner
+from control.metrics import METRICS
+import datetime as dt
+import numpy as np
+import pandas as pd
+import sys
+import os
+import socket
+import threading
+import traceback as tb
+import time
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class LeaseHeartbeat(object):
+    '''
+    Calls renew every interval seconds in a background thread while
+    the with-block runs, so that leased runs do not expire during
+    long work.
+    '''
+    
+    def __init__(self, renew, interval):
+        self._renew = renew
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self._renew()
+            except Exception as e:
+                print("Renewing the lease failed: "+str(e), file=sys.stderr)
+        
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+
+class Loader(object):
+    '''
+    Loads categories and prices into the storage. Update runs are
+    leased to owner before they are worked on, so several loaders,
+    also on other nodes, can share the update runs of one database.
+    A loader restarted with the same owner resumes its leased runs
+    without waiting for the leases to expire.
+    
+    With a StageProfiler, the listing crawl and the stages of the
+    category pipeline and of the price updates are profiled. If the
+    scraper parses in a ParseStage, the pages are parsed in its worker
+    processes, which are not profiled: the stages "listing", "variants"
+    and "details" then show fetching the pages and waiting for the
+    parse results, not the parsing itself. Run without a parse stage
+    to profile the parsing.
+    '''
+
+
+    def __init__(self, storage, scraper, owner=None, lease=dt.timedelta(minutes=10),
+                 profiler=None):
+        self._storage = storage
+        self._scraper = scraper
+        self._profiler = profiler
+        
+        if owner is None:
+            owner = "{:s}-{:d}".format(socket.gethostname(), os.getpid())
+            
+        self._owner = owner
+        self._lease = lease
+        
+    def _set_backlog_gauges(self):
+        METRICS.set("loader_update_runs_backlog", self._storage.get_update_run_count())
+        METRICS.set("loader_category_update_runs_backlog",
+                    len(self._storage.get_category_update_run()))
+        
+    def _profile(self, stage):
+        if self._profiler is None:
+            return nullcontext()
+        
+        return self._profiler.profile(stage)
+        
+    def _heartbeat(self, renew):
+        # Renews three times per lease
+        return LeaseHeartbeat(lambda: renew(self._owner, self._lease),
+                              self._lease.total_seconds() / 3)
+        
+    def load_products_of_category (self, category_id, min_date=None):
+        # Product ID -> (Name, Product URL)
+        category_name, product_ids = self._scraper.get_listing_of_category(category_id,
+                                                                           min_date=min_date)
+        
+        if category_name is None:
+            # The first listing page lacks the headline
+            category_name = self._scraper.get_name_of_category(category_id,
+                                                               min_date=min_date)
+            
+        self._storage.store_category(category_id, category_name)
+        
+        # {ProductID : Product URL}
+        product_detail_pages = {}
+        
+        for product_id in product_ids:
+            # Product Name, Product URL
+            _, product_url = product_ids[product_id]
+            product_detail_pages[product_id] = IdealoRequester.URL_BASE+product_url
+            
+        return product_detail_pages
+            
+    def load_prices (self, product_ids, min_date=None):
+        # Product ID -> Series
+        prices = self._scraper.get_api(product_ids, min_date=min_date)
+        
+        for product_id in prices:
+            series = prices[product_id]
+            self._storage.store_prices(product_id, series)
+            
+        return prices
+    
+    def load_product_variants (self, variant_urls, product_categories, min_date=None,
+                               product_details=None):
+        # variant_urls: {Product ID : Product URL}
+        # product_categories: {Product ID : Category ID}
+        # product_details: Already scraped details, the variant pages
+        # are only requested if not given
+        
+        if product_details is None:
+            # {Product ID : (Product Name, Datasheet (uncompressed))}
+            product_details = self._scraper.get_details_from_variant_pages(variant_urls,
+                                                                           min_date=min_date)
+        
+        stored_pids = [
+                product_id
+                for product_id in product_details
+                if self._store_product(product_id, product_details[product_id],
+                                       product_categories[product_id])
+            ]
+
+        self.load_prices(stored_pids, min_date=min_date)
+        
+    def _store_product (self, product_id, product_details, category_id):
+        # Returns whether the product could be stored
+        product_name, datasheet = product_details
+        
+        try:
+            self._storage.store_product(product_id, product_name, 
+                                        category_id, datasheet)
+            return True
+        except StorageInsertError as e:
+            errmsg = f"""Product storage failed with
+            PID: {product_id}
+            CID: {category_id}
+            Name: {product_name}
+            Datasheet:
+            {datasheet}
+            """
+            print(errmsg, file=sys.stderr)
+            tb.print_exc()
+            return False
+    
+    @classmethod
+    def _get_periods_for_ages (cls, ages):
+        # Smallest price chart periods covering the ages of the last
+        # prices, the last stored price is fetched again and checked
+        # by merge_prices_frame
+        return [
+                IdealoRequester.get_covering_api_period(
+                        dt.timedelta(seconds=x / np.timedelta64(1, 's'))
+                    )
+                for x in ages.values
+            ]
+    
+    def _build_category_pipeline (self, category_id, min_date, known_variants, periods):
+        # Product detail pages -> variants -> details -> stored
+        # products -> prices -> stored prices
+        # Items entering: ("product", Product ID, Product Detail URL)
+        # or, resumed from the checkpoint, ("variant", Variant ID,
+        # Variant URL, Stage). Every stage records its progress in
+        # the checkpoint of the category.
+        # periods: {Variant ID : Period} of the refreshed variants, the
+        # others get the full price history
+        pipeline = Pipeline(profiler=self._profiler)
+        # Variant IDs already passed on or known from the checkpoint,
+        # variants are listed on several product detail pages
+        seen_variants = set(known_variants)
+        
+        def resolve_variants (batch):
+            # Yields (Variant ID, Variant URL, Details or None, Stage)
+            # {Product ID : Product Detail URL}
+            pdp_dict = {}
+            
+            for item in batch:
+                if item[0] == "variant":
+                    _, variant_id, variant_url, stage = item
+                    yield variant_id, variant_url, None, stage
+                else:
+                    pdp_dict[item[1]] = item[2]
+                    
+            if len(pdp_dict) == 0:
+                return
+            
+            # The variants of the batch enter the checkpoint before
+            # they are passed on
+            # [(Variant ID, Variant URL, Details or None)]
+            new_variants = []
+            # {Product ID : {Variant ID : Variant URL}}
+            product_variants = {product_id : {} for product_id in pdp_dict}
+            
+            for product_id, variant_id, variant_url, details in \
+                    self._scraper.iter_product_variants_of_product_detail_page(pdp_dict,
+                                                                              min_date=min_date):
+                product_variants[product_id][variant_id] = variant_url
+                
+                if variant_id in seen_variants:
+                    pipeline.counters["duplicate_variants"] += 1
+                    continue
+                
+                seen_variants.add(variant_id)
+                new_variants.append((variant_id, variant_url, details))
+                
+            self._storage.store_product_variants(product_variants)
+            self._storage.store_checkpoint_variants(
+                    category_id, list(pdp_dict.keys()),
+                    {variant_id : variant_url for variant_id, variant_url, _ in new_variants}
+                )
+            
+            for variant_id, variant_url, details in new_variants:
+                yield variant_id, variant_url, details, Storage.CHECKPOINT_DISCOVERED
+        
+        def load_details (batch):
+            # Only the variant pages not already parsed as product detail
+            # page or stored before
+            missing_variant_urls = {
+                    variant_id : variant_url
+                    for variant_id, variant_url, details, stage in batch
+                    if details is None and stage == Storage.CHECKPOINT_DISCOVERED
+                }
+            
+            for variant_id, _, details, stage in batch:
+                if variant_id not in missing_variant_urls:
+                    yield variant_id, details, stage
+                    
+            if len(missing_variant_urls) != 0:
+                yield from (
+                        (variant_id, details, Storage.CHECKPOINT_DISCOVERED)
+                        for variant_id, details in self._scraper.iter_details_from_variant_pages(
+                                missing_variant_urls, min_date=min_date
+                            )
+                    )
+                
+        def store_products (batch):
+            stored = []
+            
+            for product_id, product_details, stage in batch:
+                if stage != Storage.CHECKPOINT_DISCOVERED:
+                    yield product_id
+                elif self._store_product(product_id, product_details, category_id):
+                    stored.append(product_id)
+                    yield product_id
+                    
+            self._storage.set_checkpoint_variant_stage(category_id, stored,
+                                                       Storage.CHECKPOINT_STORED)
+                    
+        def load_prices (batch):
+            refreshed = sum(product_id in periods for product_id in batch)
+            pipeline.counters["refreshed_price_charts"] += refreshed
+            pipeline.counters["new_price_charts"] += len(batch) - refreshed
+            
+            yield batch, self._scraper.get_api(
+                    batch,
+                    min_date=min_date,
+                    period=[periods.get(product_id, "P500D") for product_id in batch],
+                    long_format=True
+                )
+            
+        def store_prices (batch):
+            for product_ids, prices in batch:
+                new, inconsistent = self._storage.merge_prices_frame(prices)
+                self._storage.store_price_checks(product_ids, dt.datetime.utcnow())
+                self._storage.set_checkpoint_variant_stage(category_id, product_ids,
+                                                           Storage.CHECKPOINT_PRICED)
+                pipeline.counters["price_rows"] += new
+                pipeline.counters["inconsistent_prices"] += inconsistent
+                yield new
+        
+        return (pipeline
+                .add_stage("variants", resolve_variants)
+                .add_stage("details", load_details)
+                .add_stage("products", store_products)
+                .add_stage("prices", load_prices)
+                .add_stage("stored_prices", store_prices))
+        
+    def _resolve_known_products (self, category_id, product_ids):
+        # Resolves the products whose variants are all stored from the
+        # stored variants instead of their product detail pages. Their
+        # variants enter the checkpoint as stored, so only their prices
+        # are loaded.
+        variants = self._storage.get_product_variants(product_ids)
+        stored = variants[MySQLStorage.V_STORED].groupby(level=0).all()
+        known_products = [int(x) for x in stored.index[stored.values]]
+        variants = variants[variants.index.isin(known_products)]
+        
+        # {Variant ID : Variant URL}
+        variant_urls = {
+                int(variant_id) : url
+                for variant_id, url in zip(variants[MySQLStorage.V_VARIANT_ID], variants[MySQLStorage.V_URL])
+            }
+        
+        self._storage.store_checkpoint_variants(category_id, known_products, variant_urls)
+        self._storage.set_checkpoint_variant_stage(category_id, list(variant_urls.keys()),
+                                                   Storage.CHECKPOINT_STORED)
+        
+        print("Known products: {:d} of {:d} with {:d} variants".format(
+                len(known_products), len(product_ids), len(variant_urls)
+            ))
+    
+    def _get_refresh_periods (self, items):
+        # The stored variants only need the prices since their last
+        # stored price
+        # Returns {Variant ID : Period}
+        variant_ids = [
+                item[1]
+                for item in items
+                if item[0] == "variant" and item[3] == Storage.CHECKPOINT_STORED
+            ]
+        if len(variant_ids) == 0:
+            return {}
+        
+        ages = self._storage.get_last_price_ages(dt.datetime.utcnow(),
+                                                 product_ids=variant_ids)[MySQLStorage.V_AGE]
+        
+        periods = {variant_id : "P500D" for variant_id in variant_ids}
+        periods.update(zip([int(x) for x in ages.index], Loader._get_periods_for_ages(ages)))
+        return periods
+        
+    def _get_category_work (self, category_id, min_date, refresh=False):
+        # Returns the pipeline items of the category update still to do
+        # and the variant IDs known from the checkpoint. The listing
+        # is only crawled if the category has no checkpoint. With
+        # refresh, the products already stored are not requested again.
+        checkpoint = self._storage.get_category_checkpoint(category_id)
+        resumed = checkpoint is not None
+        
+        if not resumed:
+            # {ProductID : Product Detail Page}
+            with self._profile("listing"):
+                product_detail_urls = self.load_products_of_category(category_id,
+                                                                     min_date=min_date)
+            print("Product detail URLs: "+str(len(product_detail_urls)))
+            self._storage.store_category_checkpoint(category_id, product_detail_urls)
+            
+            if not refresh:
+                items = [("product", product_id, url) for product_id, url in product_detail_urls.items()]
+                return items, []
+            
+            self._resolve_known_products(category_id, list(product_detail_urls.keys()))
+            checkpoint = self._storage.get_category_checkpoint(category_id)
+        
+        products, variants = checkpoint
+        unresolved = products[~products[MySQLStorage.V_RESOLVED]]
+        pending = variants[variants[MySQLStorage.V_STAGE] < Storage.CHECKPOINT_PRICED]
+        
+        if resumed:
+            print("Resuming category {:d}: {:d} of {:d} product detail pages and {:d} of {:d} variants left".format(
+                    category_id, len(unresolved), len(products), len(pending), len(variants)
+                ))
+        
+        items = [
+                ("variant", int(variant_id), url, int(stage))
+                for variant_id, url, stage in zip(pending.index, pending[MySQLStorage.V_URL],
+                                                  pending[MySQLStorage.V_STAGE])
+            ]
+        items += [
+                ("product", int(product_id), url)
+                for product_id, url in zip(unresolved.index, unresolved[MySQLStorage.V_URL])
+            ]
+        return items, [int(x) for x in variants.index]
+    
+    @classmethod
+    def _take_until (cls, items, stop):
+        # Yields the items until the event stop is set
+        for item in items:
+            if stop.is_set():
+                return
+            
+            yield item
+            
+    def _take_within_budget (self, category_id, items, budget):
+        # Returns the leading items whose planned requests stay within
+        # budget and whether these are all items
+        product_cost = None
+        taken = []
+        
+        for item in items:
+            if item[0] == "variant":
+                cost = RequestPlanner.get_variant_cost(item[3])
+            else:
+                if product_cost is None:
+                    product_cost = RequestPlanner(self._storage).get_product_cost(category_id)
+                    
+                cost = product_cost
+                
+            if cost > budget:
+                return taken, False
+            
+            budget -= cost
+            taken.append(item)
+            
+        return taken, True
+    
+    @classmethod
+    def _count_requests (cls, counters):
+        return sum(value for key, value in counters.items() if key.startswith("requested_"))
+    
+    def load_full_category (self, category_id, min_date=None, batch_size=50, refresh=False,
+                            stop=None, budget=None):
+        # Product detail pages stream through fetching, parsing and
+        # storing in batches of batch_size, see _build_category_pipeline.
+        # The progress is checkpointed, a repeated call after a failure
+        # skips the work already done. With refresh, only the products
+        # new in the listing are loaded completely, the stored ones
+        # only get the prices since their last stored price.
+        # Once the optional event stop is set, no further items enter
+        # the pipeline. The call returns False after the items in
+        # progress if items were left out, the checkpoint is kept.
+        # Returns True when the category is complete.
+        # With budget, only the items whose planned requests fit into
+        # budget requests besides the listing are loaded, see
+        # RequestPlanner. The call returns False if items are left, the
+        # next call continues from the checkpoint. The costs of new
+        # products are estimated, the budget of a shared
+        # RateLimitedRequestManager caps the requests exactly.
+        counters_before = Counter(self._scraper.counters)
+        start = time.perf_counter()
+        
+        items, known_variants = self._get_category_work(category_id, min_date, refresh=refresh)
+        listing_time = time.perf_counter() - start
+        
+        periods = self._get_refresh_periods(items) if refresh else {}
+        pipeline = self._build_category_pipeline(category_id, min_date, known_variants, periods)
+        complete = True
+        
+        if budget is not None:
+            spent = Loader._count_requests(self._scraper.counters - counters_before)
+            items, complete = self._take_within_budget(category_id, items, budget - spent)
+        
+        taken = len(items)
+        
+        if stop is not None:
+            items = Loader._take_until(items, stop)
+        
+        pipeline.run(items, batch_size=batch_size)
+        
+        # The pipeline drains the items that entered it, the category is
+        # only incomplete if stop kept items out
+        if pipeline.counters["variants_in"] < taken:
+            print("Category {:d} stopped after {:d} variants".format(
+                    category_id, pipeline.counters["variants_out"]
+                ))
+            return False
+        
+        if not complete:
+            print("Category {:d} paused after {:d} variants, budget of {:d} requests used: {:d}".format(
+                    category_id, pipeline.counters["variants_out"], budget,
+                    Loader._count_requests(self._scraper.counters - counters_before)
+                ))
+            return False
+        
+        self._storage.delete_category_checkpoint(category_id)
+        
+        METRICS.observe("loader_operation_seconds", time.perf_counter() - start,
+                        operation="load_full_category")
+        METRICS.inc("loader_variants_total", pipeline.counters["variants_out"])
+        METRICS.inc("loader_products_stored_total", pipeline.counters["products_out"])
+        METRICS.inc("loader_inconsistent_prices_total", pipeline.counters["inconsistent_prices"])
+        
+        print("Variant URLs: {:d}, duplicates: {:d}, products stored: {:d}, prices stored: {:d}, inconsistent: {:d}".format(
+                pipeline.counters["variants_out"],
+                pipeline.counters["duplicate_variants"],
+                pipeline.counters["products_out"],
+                pipeline.counters["price_rows"],
+                pipeline.counters["inconsistent_prices"]
+            ))
+        print("Stage busy times: "+", ".join(
+                "{:s} {:.2f} s".format(stage, busy)
+                for stage, busy in pipeline.busy.items()
+            ))
+        
+        for stage in ("products", "stored_prices"):
+            if stage in pipeline.first_output:
+                print("First row of {:s} after {:.2f} s".format(
+                        stage, listing_time + pipeline.first_output[stage]
+                    ))
+        
+        counters = self._scraper.counters - counters_before
+        print("Product detail pages: {:d} requested, {:d} parsed".format(
+                counters["requested_product_detail_pages"],
+                counters["parsed_product_detail_pages"]
+            ))
+        print("Variant pages: {:d} requested, {:d} parsed".format(
+                counters["requested_variant_pages"],
+                counters["parsed_variant_pages"]
+            ))
+        
+        if refresh:
+            print("Requests for known products: {:d} price charts".format(
+                    pipeline.counters["refreshed_price_charts"]
+                ))
+            print("Requests for new products: {:d} product detail pages, {:d} variant pages, {:d} price charts".format(
+                    counters["requested_product_detail_pages"],
+                    counters["requested_variant_pages"],
+                    pipeline.counters["new_price_charts"]
+                ))
+            
+        return True
+        
+    def _plan_scheduled_update_runs (self, scheduler, interval, store=True):
+        # Plans the update runs chosen by scheduler for interval
+        now = dt.datetime.utcnow()
+        statistics = self._storage.get_price_statistics(now - scheduler.history)
+        selected = scheduler.select(statistics, now, interval=interval)
+        
+        ages = now - statistics.loc[selected, MySQLStorage.V_LAST_DATE]
+        update_runs = pd.DataFrame({
+                "Period" : Loader._get_periods_for_ages(ages),
+                "Date" : [now for _ in range(len(selected))]
+            }, index=selected)
+        
+        print("Scheduled {:d} of {:d} products, {:d} discontinued".format(
+                len(selected), len(statistics),
+                int(scheduler.get_discontinued(statistics.loc[selected]).sum())
+            ))
+        
+        if store:
+            self._storage.store_update_runs(update_runs)
+            
+        return update_runs
+    
+    def _get_executeable_update_runs (self, update_runs, min_update_age, store=True):
+        if len(update_runs) == 0:
+            now = dt.datetime.utcnow()
+            last_price_ages = self._storage.get_last_price_ages(now)
+            sel = last_price_ages["Age"] >= min_update_age
+            last_price_ages = last_price_ages[sel].copy()
+            last_price_ages["Period"] = Loader._get_periods_for_ages(last_price_ages["Age"])
+            
+            update_runs = last_price_ages.drop("Age", axis=1)
+            update_runs["Date"] = [now for _ in range(len(update_runs))]
+            
+            if store:
+                self._storage.store_update_runs(update_runs)
+        else:
+            update_runs = update_runs.reset_index()
+            update_runs = update_runs.set_index("ProductId")
+        
+        return update_runs
+        
+    def _update_price_chunk (self, update_runs):
+        # update_runs: claimed runs, see claim_update_runs
+        # Returns (New Prices, Inconsistent Prices)
+        run_keys = list(update_runs.index)
+        update_runs = update_runs.reset_index()
+        
+        with self._heartbeat(self._storage.renew_update_runs):
+            try:
+                product_ids = [int(x) for x in update_runs["ProductId"].values]
+                min_dates = [x.to_pydatetime() for x in update_runs["Date"]]
+                periods = list(update_runs["Period"].values)
+                
+                # Columns: ProductId, Date, Price
+                with self._profile("prices"):
+                    prices = self._scraper.get_api(product_ids, min_date=min_dates, 
+                                                   period=periods, long_format=True)
+                    
+                with self._profile("stored_prices"):
+                    merged = self._storage.merge_prices_frame(prices)
+                    self._storage.store_price_checks(product_ids, dt.datetime.utcnow())
+            except:
+                # Other loaders may take the runs over right away
+                self._storage.release_update_runs(self._owner, run_keys)
+                raise
+            
+            self._storage.complete_update_runs(self._owner, run_keys)
+            return merged
+    
+    def plan_price_update_runs (self, min_update_age, scheduler=None):
+        # Plans update runs if none are left and returns their number.
+        # Without scheduler, every product with prices older than
+        # min_update_age is updated. With a RefreshScheduler, it
+        # chooses the products within its budget for min_update_age,
+        # plan every min_update_age then.
+        update_runs = self._storage.get_update_runs()
+        
+        if len(update_runs) != 0:
+            return 0
+        
+        if scheduler is None:
+            update_runs = self._get_executeable_update_runs(update_runs, min_update_age)
+        else:
+            update_runs = self._plan_scheduled_update_runs(scheduler, min_update_age)
+            
+        METRICS.inc("loader_update_runs_planned_total", len(update_runs))
+        self._set_backlog_gauges()
+        return len(update_runs)
+    
+    def get_price_update_plan (self, min_update_age, scheduler=None):
+        # The update runs update_prices would work on, without storing
+        # or claiming them: the pending runs or the runs a new plan
+        # would contain
+        # Index: ProductId
+        # Columns: Period, Date
+        update_runs = self._storage.get_update_runs()
+        
+        if len(update_runs) != 0 or scheduler is None:
+            return self._get_executeable_update_runs(update_runs, min_update_age, store=False)
+        
+        return self._plan_scheduled_update_runs(scheduler, min_update_age, store=False)
+    
+    def plan_updates (self, category_update_age, price_update_age, scheduler=None, now=None):
+        # Request plan of run_updates from the storage, see
+        # RequestPlanner. Nothing is requested or stored.
+        planner = RequestPlanner(self._storage)
+        
+        last_updates = self._storage.get_last_category_update()
+        category_ids = set(int(x) for x in self._storage.get_category_update_run().index)
+        category_ids.update(int(x) for x in self._select_updateable_categories(last_updates,
+                                                                              category_update_age))
+        
+        plans = [
+                planner.plan_category(category_id, refresh=True, now=now)
+                for category_id in sorted(category_ids)
+            ]
+        plans.append(planner.plan_prices(self.get_price_update_plan(price_update_age, scheduler=scheduler),
+                                         now=now))
+        
+        return pd.concat(plans, ignore_index=True)
+    
+    def update_price_chunk (self, chunk_size=1000):
+        # Claims up to chunk_size update runs not leased by another
+        # loader and updates them
+        # Returns (Runs, New Prices, Inconsistent Prices)
+        update_runs = self._storage.claim_update_runs(self._owner, chunk_size, self._lease)
+        
+        if len(update_runs) == 0:
+            return 0, 0, 0
+        
+        with METRICS.timer("loader_operation_seconds", operation="update_price_chunk"):
+            new, inconsistent = self._update_price_chunk(update_runs)
+            
+        METRICS.inc("loader_update_runs_completed_total", len(update_runs))
+        METRICS.inc("loader_inconsistent_prices_total", inconsistent)
+        self._set_backlog_gauges()
+        return len(update_runs), new, inconsistent
+    
+    def update_prices (self, min_update_age, chunk_size=1000, scheduler=None, budget=None):
+        # Plans update runs if none are left, see plan_price_update_runs,
+        # and works on the runs in chunks of chunk_size. Every chunk is
+        # fetched, stored and completed on its own, so a restart
+        # continues with the runs not completed yet. Every run is one
+        # request, with budget at most budget runs are completed and
+        # the others are left for the next call.
+        self.plan_price_update_runs(min_update_age, scheduler=scheduler)
+            
+        completed = 0
+        new_prices = 0
+        inconsistent_prices = 0
+        
+        while budget is None or completed < budget:
+            limit = chunk_size if budget is None else min(chunk_size, budget - completed)
+            runs, new, inconsistent = self.update_price_chunk(limit)
+            
+            if runs == 0:
+                break
+            
+            completed += runs
+            new_prices += new
+            inconsistent_prices += inconsistent
+            print("Price update runs completed: {:d}, new prices: {:d}, inconsistent: {:d}".format(
+                    completed, new_prices, inconsistent_prices
+                ))
+
+    def _update_category(self, category_id, timestamp, stop=None):
+        print(f"Update of {category_id} at {timestamp}")
+
+        try:
+            # Loading category ...
+            complete = self.load_full_category(category_id, min_date=timestamp, refresh=True,
+                                               stop=stop)
+        except:
+            self._storage.release_category_update_runs(self._owner, category_id)
+            raise
+
+        if complete:
+            self._storage.complete_category_update_run(self._owner, category_id)
+            METRICS.inc("loader_category_updates_completed_total")
+            self._set_backlog_gauges()
+        else:
+            # Continues from the checkpoint
+            self._storage.release_category_update_runs(self._owner, category_id)
+
+    def _update_category_indices(self, updateable_df, workers=1):
+        # updateable_df: V_CATEGORY_ID -> [V_TIMESTAMP], leased runs
+        # Up to workers categories are loaded at once. A failed
+        # category keeps its update run and is retried next time.
+        category_ids = list(updateable_df.index.values)
+        start = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                    executor.submit(
+                            self._update_category, category_id,
+                            updateable_df.loc[category_id][MySQLStorage.V_TIMESTAMP]
+                        ) : category_id
+                    for category_id in category_ids
+                }
+            
+            for done, future in enumerate(as_completed(futures), start=1):
+                category_id = futures[future]
+                
+                try:
+                    future.result()
+                    status = "done"
+                except Exception as e:
+                    print(f"Update of {category_id} failed", file=sys.stderr)
+                    tb.print_exception(type(e), e, e.__traceback__)
+                    status = "failed"
+                    
+                print("Categories {:d}/{:d}: {:d} {:s} after {:.1f} s".format(
+                        done, len(category_ids), category_id, status,
+                        time.perf_counter() - start
+                    ))
+    
+    def _run_current_category_update_runs(self, workers=1):
+        # V_CATEGORY_ID -> V_TIMESTAMP 
+        update_runs = self._storage.claim_category_update_runs(self._owner, None, self._lease)
+
+        if len(update_runs) != 0:
+            with self._heartbeat(self._storage.renew_category_update_runs):
+                self._update_category_indices(update_runs, workers=workers)
+
+    def _select_updateable_categories(self, last_updates, min_update_age):
+        # V_CATEGORY_ID -> V_TIMESTAMP 
+
+        last_updates[MySQLStorage.V_TIMESTAMP] += min_update_age
+        selector = last_updates[MySQLStorage.V_TIMESTAMP] <= dt.datetime.utcnow()
+        last_updates = last_updates[selector]
+        return last_updates.index.unique()
+
+    def plan_category_update_runs(self, min_update_age):
+        # Plans an update run for every category last updated before
+        # min_update_age and returns their number
+        # V_CATEGORY_ID -> V_TIMESTAMP 
+        last_updates = self._storage.get_last_category_update()
+        updateables = self._select_updateable_categories(last_updates,
+                                                         min_update_age)
+        utcnow = dt.datetime.utcnow()
+
+        for updateable in updateables:
+            self._storage.store_category_update_run(updateable, utcnow)
+            
+        self._set_backlog_gauges()
+        return len(updateables)
+    
+    def update_next_category(self, stop=None):
+        # Claims one category update run and works on it, see
+        # load_full_category for stop. Returns the category ID, None
+        # if no run is left.
+        update_runs = self._storage.claim_category_update_runs(self._owner, 1, self._lease)
+        
+        if len(update_runs) == 0:
+            return None
+        
+        category_id = int(update_runs.index[0])
+        
+        with self._heartbeat(self._storage.renew_category_update_runs):
+            self._update_category(category_id,
+                                  update_runs.loc[category_id][MySQLStorage.V_TIMESTAMP],
+                                  stop=stop)
+            
+        return category_id
+
+    def update_categories(self, min_update_age, workers=1):
+        self._run_current_category_update_runs(workers=workers)
+        self.plan_category_update_runs(min_update_age)
+        self._run_current_category_update_runs(workers=workers)
+        
+    def run_updates(self, category_update_age, price_update_age, workers=4, scheduler=None):
+        # Updates the prices while up to workers categories are
+        # refreshed. Share one RateLimitedRequestManager between them
+        # to keep a global request rate and budget.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prices = executor.submit(self.update_prices, price_update_age,
+                                     scheduler=scheduler)
+            
+            self.update_categories(category_update_age, workers=workers)
+            print("Done updating categories.")
+            
+            prices.result()
+            print("Done updating prices.")
@@ -0,0 +1,245 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import json
+import threading
+import time
+import bisect
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class Histogram ():
+    # Observations counted in cumulative buckets of upper bounds
+    def __init__ (self, buckets):
+        self.buckets = buckets
+        self.counts = [0 for _ in range(len(buckets) + 1)]
+        self.count = 0
+        self.sum = 0.0
+
+    def observe (self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative (self):
+        # [(Upper Bound, Observations <= Upper Bound), ...], the last
+        # bound is inf
+        cumulative = []
+        total = 0
+
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            cumulative.append((bound, total))
+
+        return cumulative
+
+class Metrics ():
+    '''
+    Thread-safe registry of counters, gauges and latency histograms.
+    Every metric is identified by its name and labels, e.g.
+    inc("idealo_pages_total", page_type="listing_pages", status=200).
+    The components record into the module registry METRICS, see
+    MetricsServer for the Prometheus text format and summary() for a
+    JSON summary of a run.
+    '''
+    # Seconds
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__ (self):
+        self._lock = threading.Lock()
+        # (Name, Labels) -> Value, Labels are sorted (Label, Value) tuples
+        self._counters = {}
+        self._gauges = {}
+        # (Name, Labels) -> Histogram
+        self._histograms = {}
+
+    @classmethod
+    def _key (cls, name, labels):
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc (self, name, value=1, **labels):
+        key = Metrics._key(name, labels)
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set (self, name, value, **labels):
+        key = Metrics._key(name, labels)
+
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe (self, name, value, **labels):
+        key = Metrics._key(name, labels)
+
+        with self._lock:
+            histogram = self._histograms.get(key, None)
+
+            if histogram is None:
+                histogram = Histogram(Metrics.BUCKETS)
+                self._histograms[key] = histogram
+
+            histogram.observe(value)
+
+    @contextmanager
+    def timer (self, name, **labels):
+        # Observes the seconds spent in the with-block
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset (self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    @classmethod
+    def _format_labels (cls, labels):
+        if len(labels) == 0:
+            return ""
+
+        return "{"+",".join(
+                '{:s}="{:s}"'.format(label, value.replace("\\", "\\\\").replace('"', '\\"')
+                                                 .replace("\n", "\\n"))
+                for label, value in labels
+            )+"}"
+
+    @classmethod
+    def _format_number (cls, value):
+        if value == float("inf"):
+            return "+Inf"
+
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def to_prometheus (self):
+        # Prometheus text exposition format
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                    (key, histogram.get_cumulative(), histogram.count, histogram.sum)
+                    for key, histogram in self._histograms.items()
+                )
+
+        lines = []
+        typed = set()
+
+        def add_type (name, metric_type):
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {:s} {:s}".format(name, metric_type))
+
+        for metric_type, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in values:
+                add_type(name, metric_type)
+                lines.append("{:s}{:s} {:s}".format(name, Metrics._format_labels(labels),
+                                                    Metrics._format_number(value)))
+
+        for (name, labels), cumulative, count, total in histograms:
+            add_type(name, "histogram")
+
+            for bound, bucket_count in cumulative:
+                bucket_labels = labels + (("le", Metrics._format_number(bound)),)
+                lines.append("{:s}_bucket{:s} {:d}".format(name, Metrics._format_labels(bucket_labels),
+                                                           bucket_count))
+
+            lines.append("{:s}_count{:s} {:d}".format(name, Metrics._format_labels(labels), count))
+            lines.append("{:s}_sum{:s} {:s}".format(name, Metrics._format_labels(labels),
+                                                    Metrics._format_number(total)))
+
+        return "\n".join(lines)+"\n"
+
+    @classmethod
+    def _summary_key (cls, name, labels):
+        return name+"".join("|{:s}={:s}".format(label, value) for label, value in labels)
+
+    def summary (self):
+        # {"counters" : {Key : Value}, "gauges" : {Key : Value},
+        # "histograms" : {Key : {"count", "sum", "mean"}}}, keys are
+        # "<Name>|<Label>=<Value>|..."
+        with self._lock:
+            return {
+                    "counters" : {
+                            Metrics._summary_key(name, labels) : value
+                            for (name, labels), value in sorted(self._counters.items())
+                        },
+                    "gauges" : {
+                            Metrics._summary_key(name, labels) : value
+                            for (name, labels), value in sorted(self._gauges.items())
+                        },
+                    "histograms" : {
+                            Metrics._summary_key(name, labels) : {
+                                    "count" : histogram.count,
+                                    "sum" : histogram.sum,
+                                    "mean" : histogram.sum / histogram.count if histogram.count != 0 else 0.0
+                                }
+                            for (name, labels), histogram in sorted(self._histograms.items())
+                        }
+                }
+
+    def write_summary (self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+# Registry the components record into
+METRICS = Metrics()
+
+class _MetricsHandler (BaseHTTPRequestHandler):
+    def log_message (self, format, *args):
+        pass
+
+    def do_GET (self):
+        if self.path.split("?")[0] == "/metrics":
+            body = self.server.metrics.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+            status_code = 200
+        else:
+            body = b""
+            content_type = "text/plain; charset=utf-8"
+            status_code = 404
+
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer (ThreadingHTTPServer):
+    '''
+    Serves the metrics at /metrics in the Prometheus text format, by
+    default on localhost only.
+    '''
+    daemon_threads = True
+
+    def __init__ (self, metrics=METRICS, host="127.0.0.1", port=9464):
+        super().__init__((host, port), _MetricsHandler)
+
+        self.metrics = metrics
+        self._thread = None
+
+    def start (self):
+        # Serves in a background thread
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop (self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self.server_close()
+
+    def __enter__ (self):
+        return self.start()
+
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,556 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+from abc import ABC, abstractmethod
+import math
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from control.metrics import METRICS
+import pandas as pd
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:
+    try:
+        # selectolax before 1.0
+        from selectolax.parser import HTMLParser as SelectolaxHTMLParser
+    except ImportError:
+        SelectolaxHTMLParser = None
+
+try:
+    import lxml.html
+    import lxml.etree
+    # lxml needs cssselect for CSS selectors
+    import cssselect
+except ImportError:
+    lxml = None
+
+
+def product_offer_url_to_id (url):
+    last_slash = url.rfind("/")
+    url = url[last_slash+1:]
+
+    if "_-" in url:
+        separator = url.rfind("_-")
+    else:
+        separator = url.rfind(".")
+
+    return url[:separator]
+
+def datasheet_from_rows (rows):
+    # rows: [(Header, Attribute, Value), ...] in page order
+    # Returns the datasheet as Series indexed by (Header, Attribute)
+    # or None if the page has no datasheet entries.
+    all_data_headers = []
+    all_data_serieses = []
+
+    for header, group in _group_rows_by_header(rows):
+        indx = [attribute for _, attribute, _ in group]
+        values = [value for _, _, value in group]
+
+        all_data_headers.append(header)
+        all_data_serieses.append(pd.Series(values, index=indx))
+
+    if len(all_data_serieses) != 0:
+        return pd.concat(all_data_serieses, axis=0, keys=all_data_headers)
+    else:
+        return None
+
+def _group_rows_by_header (rows):
+    group = []
+
+    for row in rows:
+        if len(group) != 0 and group[-1][0] != row[0]:
+            yield group[0][0], group
+            group = []
+
+        group.append(row)
+
+    if len(group) != 0:
+        yield group[0][0], group
+
+
+def _region_pattern (tags, attribute, value):
+    # Matches the start tag of an element with the given id or class,
+    # the attribute value may be quoted or not
+    return re.compile(
+            rb"<(" + rb"|".join(tags) + rb")\b[^>]*?\b" + attribute + rb"\s*=\s*(?:" +
+            rb"[\"'][^\"']*(?<![\w-])" + value + rb"(?![\w-])[^\"']*[\"']|" +
+            value + rb"(?=[\s/>]))"
+        )
+
+# Tag -> Pattern of its start and end tags
+_TAG_PATTERNS = {}
+
+def _find_element_end (html, tag, start):
+    # Index behind the end tag matching the start tag at start,
+    # None if the element is not closed
+    pattern = _TAG_PATTERNS.get(tag, None)
+
+    if pattern is None:
+        pattern = re.compile(rb"<(/?)" + tag + rb"\b")
+        _TAG_PATTERNS[tag] = pattern
+
+    depth = 0
+
+    for match in pattern.finditer(html, start):
+        if match.group(1) == b"":
+            depth += 1
+        else:
+            depth -= 1
+
+        if depth == 0:
+            end = html.find(b">", match.end())
+            return None if end == -1 else end + 1
+
+    return None
+
+_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w-]+)", re.IGNORECASE)
+
+
+class PageParser (ABC):
+    '''
+    Extracts the fields IdealoRequester needs from idealo pages
+    through CSS selectors. Backends only implement document
+    parsing and node access.
+    '''
+    # Products per category listing page
+    CAT_PAGE_SIZE = 15
+    CAT_RESULT_COUNT_PATTERN = re.compile(r"([0-9][0-9.]*)\s*(?:Produkte|Ergebnisse|Angebote)")
+
+    # Page regions the scrapers read: (Pattern, Required), Required is
+    # True, False or the name of a group of regions of which at least
+    # one must be found
+    HEADLINE_REGION = (_region_pattern([b"div"], b"class", b"category-headline"), False)
+    LISTING_REGIONS = [
+            (_region_pattern([b"div"], b"class", b"resultlist"), True),
+            (_region_pattern([b"div", b"nav", b"ul"], b"class", b"pagination"), False),
+            HEADLINE_REGION
+        ]
+    CATEGORY_REGIONS = [
+            (HEADLINE_REGION[0], True)
+        ]
+    DETAIL_REGIONS = [
+            (_region_pattern([b"h1"], b"class", b"oopStage-title"), False),
+            # A product page without either is parsed completely
+            (_region_pattern([b"div"], b"id", b"product-variants"), "content"),
+            (_region_pattern([b"div"], b"id", b"datasheet"), "content")
+        ]
+
+    def __init__ (self, url_base, partial=True):
+        self._url_base = url_base
+        # Only parse the regions the scrapers read
+        self._partial = partial
+
+    @classmethod
+    def slice_regions (cls, html, regions):
+        # Cuts the given regions out of the page and joins them into
+        # a small document, None if a required region is missing or
+        # can not be delimited
+        if not isinstance(html, bytes):
+            return None
+
+        # [(Start, End), ...]
+        spans = []
+        # Group -> Whether a region of the group was found
+        groups = {}
+
+        for pattern, required in regions:
+            match = pattern.search(html)
+
+            if isinstance(required, str):
+                groups[required] = groups.get(required, False) or match is not None
+            elif match is None and required:
+                return None
+
+            if match is None:
+                continue
+
+            end = _find_element_end(html, match.group(1), match.start())
+
+            if end is None:
+                return None
+
+            spans.append((match.start(), end))
+
+        if len(spans) == 0 or not all(groups.values()):
+            return None
+
+        charset = _CHARSET_PATTERN.search(html, 0, 4096)
+        charset = b"utf-8" if charset is None else charset.group(1)
+
+        fragments = [b"<html><head><meta charset=\"" + charset + b"\"></head><body>"]
+        last_end = 0
+
+        for start, end in sorted(spans):
+            # Nested regions are already part of the enclosing one
+            if start >= last_end:
+                fragments.append(html[start:end])
+                last_end = end
+
+        fragments.append(b"</body></html>")
+        return b"".join(fragments)
+
+    def _parse_regions (self, html, regions):
+        if self._partial:
+            fragment = PageParser.slice_regions(html, regions)
+
+            if fragment is not None:
+                return self._parse(fragment)
+
+        return self._parse(html)
+
+    @abstractmethod
+    def _parse (self, html):
+        pass
+
+    @abstractmethod
+    def _select (self, node, selector):
+        pass
+
+    @abstractmethod
+    def _select_one (self, node, selector):
+        pass
+
+    @abstractmethod
+    def _text (self, node):
+        pass
+
+    @abstractmethod
+    def _attr (self, node, name):
+        pass
+
+    def _scrape_items (self, root):
+        all_products = {}
+
+        resultlist = self._select_one(root, "div.resultlist")
+
+        if resultlist is None:
+            return all_products
+
+        for product in self._select(resultlist, "div.offerList-item"):
+            a = self._select_one(product, "a.offerList-itemWrapper")
+            product_url = self._attr(a, "href").strip()
+            product_id = product_offer_url_to_id(product_url)
+
+            try:
+                product_id = int(product_id)
+            except:
+                continue
+
+            name = self._select_one(a, "div.offerList-item-detailsWrapper "
+                                       "div.offerList-item-description-title")
+            all_products[product_id] = (self._text(name).strip(), product_url)
+
+        return all_products
+
+    def _scrape_page_count (self, root):
+        # Number of listing pages from the last page of the pagination
+        # or from the result count in the headline, None if neither
+        # can be read
+        pagination = self._select_one(root, "div.pagination, nav.pagination, ul.pagination")
+
+        if pagination is not None:
+            pages = [
+                    int(self._text(x).strip())
+                    for x in self._select(pagination, "a, span, li")
+                    if self._text(x).strip().isdigit()
+                ]
+
+            if len(pages) != 0:
+                return max(pages)
+
+        headline = self._select_one(root, "div.category-headline")
+
+        if headline is not None:
+            match = PageParser.CAT_RESULT_COUNT_PATTERN.search(self._text(headline))
+
+            if match is not None:
+                result_count = int(match.group(1).replace(".", ""))
+                return max(1, math.ceil(result_count / PageParser.CAT_PAGE_SIZE))
+
+        return None
+
+    def _scrape_variants (self, root):
+        variants = self._select_one(root, "div#product-variants")
+
+        if variants is None:
+            # No variants exist, given page is the product
+            return None
+        else:
+            return set(
+                    self._url_base+self._attr(variant_box, "href").strip()
+                    for variant_box in self._select(variants, "a.productVariants-listItemWrapper")
+                )
+
+    def _scrape_datasheet_rows (self, datasheet):
+        header = "General"
+        rows = []
+
+        for row in self._select(datasheet, "li"):
+            if self._attr(row, "class") is None:
+                for subrow in self._select(row, "li"):
+                    cols = self._select(subrow, "span")
+                    rows.append((header, self._text(cols[0]).strip(),
+                                 self._text(cols[1]).strip()))
+            else:
+                header = self._text(row).replace("\t", "").replace("\n", "")
+
+        return rows
+
+    def _scrape_details (self, root):
+        name_element = self._select_one(root, "h1.oopStage-title")
+        name_element = self._select(name_element, "span")
+
+        if len(name_element) == 2:
+            main_name = self._text(name_element[0]).strip()
+            variant_name = self._text(name_element[1]).strip()
+            product_name = main_name+" "+variant_name
+        else:
+            product_name = self._text(name_element[0]).strip()
+
+        datasheet = self._select_one(root, "div#datasheet ul.datasheet-list")
+
+        return product_name, self._scrape_datasheet_rows(datasheet)
+
+    def _scrape_category_name (self, root):
+        header = self._select_one(root, "div.category-headline h1.offerList-title")
+
+        if header is None:
+            return None
+
+        return self._text(header).strip()
+
+    def parse_listing (self, html):
+        # Returns ({Product ID : (Name, Product URL)}, Page Count or None,
+        # Category Name or None)
+        root = self._parse_regions(html, PageParser.LISTING_REGIONS)
+        return self._scrape_items(root), self._scrape_page_count(root), self._scrape_category_name(root)
+
+    def parse_category_name (self, html):
+        root = self._parse_regions(html, PageParser.CATEGORY_REGIONS)
+        header = self._select_one(root, "div.category-headline h1.offerList-title")
+        return self._text(header).strip()
+
+    def parse_variants (self, html):
+        # Returns the variant URLs or None if the page is the product
+        return self._scrape_variants(self._parse_regions(html, PageParser.DETAIL_REGIONS))
+
+    def parse_details (self, html):
+        # Returns (Product Name, [(Header, Attribute, Value), ...])
+        return self._scrape_details(self._parse_regions(html, PageParser.DETAIL_REGIONS))
+
+    def parse_product_detail_page (self, html):
+        # Returns (Variant URLs, None) for pages listing variants and
+        # (None, (Product Name, Datasheet Rows)) for pages which are
+        # the product themselves
+        root = self._parse_regions(html, PageParser.DETAIL_REGIONS)
+        variant_urls = self._scrape_variants(root)
+
+        if variant_urls is None:
+            return None, self._scrape_details(root)
+        else:
+            return variant_urls, None
+
+class SoupParser (PageParser):
+    '''
+    Pure Python fallback on BeautifulSoup with html.parser.
+    '''
+    NAME = "html.parser"
+
+    def _parse (self, html):
+        return BeautifulSoup(html, "html.parser")
+
+    def _select (self, node, selector):
+        return node.select(selector)
+
+    def _select_one (self, node, selector):
+        return node.select_one(selector)
+
+    def _text (self, node):
+        return node.get_text()
+
+    def _attr (self, node, name):
+        return node.get(name, None)
+
+class LxmlParser (PageParser):
+    NAME = "lxml"
+    # Selector -> compiled XPath, shared by all instances
+    _XPATHS = {}
+
+    def _parse (self, html):
+        return lxml.html.document_fromstring(html)
+
+    def _select (self, node, selector):
+        xpath = LxmlParser._XPATHS.get(selector, None)
+
+        if xpath is None:
+            # lxml's cssselect() matches the context node itself as
+            # well, selectors here only match descendants
+            xpath = cssselect.HTMLTranslator().css_to_xpath(selector,
+                                                            prefix="descendant::")
+            xpath = lxml.etree.XPath(xpath)
+            LxmlParser._XPATHS[selector] = xpath
+
+        return xpath(node)
+
+    def _select_one (self, node, selector):
+        nodes = self._select(node, selector)
+
+        if len(nodes) != 0:
+            return nodes[0]
+        else:
+            return None
+
+    def _text (self, node):
+        return node.text_content()
+
+    def _attr (self, node, name):
+        return node.get(name, None)
+
+class SelectolaxParser (PageParser):
+    NAME = "selectolax"
+
+    def _parse (self, html):
+        return SelectolaxHTMLParser(html).root
+
+    def _select (self, node, selector):
+        # css() matches the node itself as well, selectors here
+        # only match descendants
+        return [x for x in node.css(selector) if x.mem_id != node.mem_id]
+
+    def _select_one (self, node, selector):
+        nodes = self._select(node, selector)
+
+        if len(nodes) != 0:
+            return nodes[0]
+        else:
+            return None
+
+    def _text (self, node):
+        return node.text()
+
+    def _attr (self, node, name):
+        return node.attributes.get(name, None)
+
+# Fastest first
+PARSERS = [
+        (SelectolaxParser, SelectolaxHTMLParser is not None),
+        (LxmlParser, lxml is not None),
+        (SoupParser, True)
+    ]
+
+def get_available_parsers ():
+    return [parser_cls.NAME for parser_cls, available in PARSERS if available]
+
+def get_parser (name=None, url_base="", partial=True):
+    # Returns the named backend or the fastest available one
+    for parser_cls, available in PARSERS:
+        if name is None or name == parser_cls.NAME:
+            if available:
+                return parser_cls(url_base, partial=partial)
+            elif name is not None:
+                errmsg = "Parser backend not installed: {:s}".format(name)
+                raise ImportError(errmsg)
+
+    errmsg = "Unknown parser backend: {:s}".format(str(name))
+    raise ValueError(errmsg)
+
+
+# Picklable parse entry points. They take the raw page and a parser
+# instance and return plain dicts, so that they can run in a
+# ParseStage worker process.
+
+def parse_listing_page (html, parser):
+    products, page_count, category_name = parser.parse_listing(html)
+
+    return {
+            "products" : products,
+            "page_count" : page_count,
+            "category_name" : category_name
+        }
+
+def parse_category_page (html, parser):
+    return {
+            "category_name" : parser.parse_category_name(html)
+        }
+
+def parse_product_detail_page (html, parser):
+    variant_urls, details = parser.parse_product_detail_page(html)
+
+    if variant_urls is None:
+        product_name, rows = details
+
+        return {
+                "variant_urls" : None,
+                "product_name" : product_name,
+                "datasheet" : rows
+            }
+    else:
+        return {
+                "variant_urls" : sorted(variant_urls)
+            }
+
+def parse_variant_page (html, parser):
+    product_name, rows = parser.parse_details(html)
+
+    return {
+            "product_name" : product_name,
+            "datasheet" : rows
+        }
+
+class ParseStage ():
+    '''
+    Parses raw pages in a process pool, so parsing scales with the
+    cores instead of sharing the GIL with the fetching thread.
+    At most max_pending pages wait for a worker, submit blocks
+    beyond that.
+    '''
+    def __init__ (self, workers=None, max_pending=None):
+        self._max_workers = workers if workers is not None else (os.cpu_count() or 1)
+        self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+
+        if max_pending is None:
+            max_pending = 4 * self._max_workers
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        # Pages submitted and not parsed yet
+        self._pending = 0
+
+    def _add_pending (self, count):
+        with self._lock:
+            self._pending += count
+            METRICS.set("parse_stage_pending", self._pending)
+
+    def _release (self):
+        self._add_pending(-1)
+        self._slots.release()
+
+    def submit (self, entry_point, html, parser):
+        # Returns a Future of entry_point(html, parser)
+        self._slots.acquire()
+        self._add_pending(1)
+
+        try:
+            future = self._executor.submit(entry_point, html, parser)
+        except:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def close (self):
+        self._executor.shutdown()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,149 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from control.metrics import METRICS
+
+
+class _Done ():
+    # Marks the end of a stage's input
+    pass
+
+class Pipeline ():
+    '''
+    Runs stages in threads connected by bounded queues. A stage is a
+    function taking a batch (list) of items and yielding the items for
+    the next stage. Yielded items are passed on while the function
+    still runs, once batch_size items are collected or whenever the
+    next stage waits for input. Single items flow through without
+    waiting for the rest of their batch.
+
+    At most queue_size batches wait between two stages. busy counts
+    the seconds of a stage without the time it waits for a full queue.
+    The batches in front of a stage are recorded as the gauge
+    pipeline_queue_depth, the seconds per batch as
+    pipeline_stage_seconds. With a StageProfiler, every stage is
+    profiled under its name.
+    '''
+    def __init__ (self, queue_size=4, profiler=None):
+        self._queue_size = queue_size
+        self._profiler = profiler
+        # [(Name, Function), ...]
+        self._stages = []
+
+        # Stage Name -> Seconds from the start to its first output
+        self.first_output = {}
+        # "<Stage Name>_in" / "<Stage Name>_out" -> Items
+        self.counters = Counter()
+        # Stage Name -> Seconds spent in the stage function
+        self.busy = Counter()
+
+    def add_stage (self, name, function):
+        self._stages.append((name, function))
+        return self
+
+    @classmethod
+    def _batches (cls, items, batch_size):
+        batch = []
+
+        for item in items:
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if len(batch) != 0:
+            yield batch
+
+    def _run_stage (self, name, function, in_queue, out_queue, batch_size, errors, start):
+        failed = False
+
+        while True:
+            batch = in_queue.get()
+            METRICS.set("pipeline_queue_depth", in_queue.qsize(), stage=name)
+
+            if isinstance(batch, _Done):
+                break
+
+            if failed:
+                # Drain so that the previous stage does not block
+                continue
+
+            output = []
+
+            try:
+                stage_start = time.perf_counter()
+                # Seconds waiting for the next stage
+                waited = 0.0
+                self.counters[name+"_in"] += len(batch)
+
+                with (nullcontext() if self._profiler is None else self._profiler.profile(name)):
+                    for item in function(batch):
+                        if name not in self.first_output:
+                            self.first_output[name] = time.perf_counter() - start
+
+                        self.counters[name+"_out"] += 1
+
+                        if out_queue is None:
+                            continue
+
+                        output.append(item)
+
+                        if len(output) >= batch_size or out_queue.empty():
+                            put_start = time.perf_counter()
+                            out_queue.put(output)
+                            waited += time.perf_counter() - put_start
+                            output = []
+
+                busy = time.perf_counter() - stage_start - waited
+                self.busy[name] += busy
+                METRICS.observe("pipeline_stage_seconds", busy, stage=name)
+            except BaseException as e:
+                errors.append(e)
+                failed = True
+                continue
+
+            if len(output) != 0:
+                out_queue.put(output)
+
+        if out_queue is not None:
+            out_queue.put(_Done())
+
+    def run (self, items, batch_size=50):
+        # Feeds items in batches to the first stage and returns when all
+        # stages are done. The first error of a stage is raised.
+        start = time.perf_counter()
+        queues = [queue.Queue(self._queue_size) for _ in self._stages]
+        errors = []
+        threads = []
+
+        for i, (name, function) in enumerate(self._stages):
+            out_queue = queues[i+1] if i+1 < len(queues) else None
+            thread = threading.Thread(target=self._run_stage,
+                                      args=(name, function, queues[i], out_queue, batch_size,
+                                            errors, start),
+                                      name="pipeline-"+name, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            for batch in Pipeline._batches(items, batch_size):
+                if len(errors) != 0:
+                    break
+
+                queues[0].put(batch)
+        finally:
+            queues[0].put(_Done())
+
+            for thread in threads:
+                thread.join()
+
+        if len(errors) != 0:
+            raise errors[0]
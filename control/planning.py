@@ -0,0 +1,158 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import math
+import datetime as dt
+import numpy as np
+import pandas as pd
+from model.storage import Storage, MySQLStorage
+from control.scraping import IdealoRequester
+
+
+class RequestPlanner ():
+    '''
+    Computes the requests and the price rows to store of Loader
+    operations from the storage, without requesting anything. Pending
+    update runs and the checkpoints of interrupted category updates
+    give exact plans. For the other categories the listing and the
+    variants are estimated from the products stored for the category,
+    products new in the listing are not known beforehand.
+    '''
+    OPERATION_PRICES = "update_prices"
+    OPERATION_CATEGORY = "load_full_category"
+    REQUEST_COLUMNS = ["ListingPages", "DetailPages", "VariantPages", "PriceCharts"]
+    PLAN_COLUMNS = ["Operation", "Target"] + REQUEST_COLUMNS + ["Requests", "Rows"]
+    SPLIT_COLUMNS = ["Run", "Operation", "Target", "Requests", "Rows"]
+    # Price points of a product without stored prices
+    FULL_HISTORY_DAYS = 500
+
+    def __init__ (self, storage):
+        self._storage = storage
+
+    @classmethod
+    def _to_plan (cls, rows):
+        plan = pd.DataFrame(rows, columns=RequestPlanner.PLAN_COLUMNS[:-2] + ["Rows"])
+        plan["Requests"] = plan[RequestPlanner.REQUEST_COLUMNS].sum(axis=1)
+        return plan[RequestPlanner.PLAN_COLUMNS]
+
+    @classmethod
+    def get_listing_requests (cls, products):
+        # The listing pages and the probe behind a full final page, the
+        # category name is read from the first listing page
+        pages = max(1, math.ceil(products / IdealoRequester.CAT_PAGE_SIZE))
+        probe = 1 if products % IdealoRequester.CAT_PAGE_SIZE == 0 else 0
+        return pages + probe
+
+    @classmethod
+    def get_variant_cost (cls, stage):
+        # Requests of a variant in the checkpoint
+        return 2 if stage == Storage.CHECKPOINT_DISCOVERED else 1
+
+    def _get_new_points (self, product_ids, now):
+        # Series: ProductId -> Price points newer than the stored ones
+        ages = self._storage.get_last_price_ages(now)[MySQLStorage.V_AGE]
+        days = (ages // pd.Timedelta(days=1)).clip(upper=RequestPlanner.FULL_HISTORY_DAYS)
+        return days.reindex(product_ids).fillna(RequestPlanner.FULL_HISTORY_DAYS).astype(np.int64)
+
+    def plan_prices (self, update_runs, now=None):
+        # update_runs: ProductId -> [Period, Date], see
+        # Loader.get_price_update_plan
+        # One request per run, the rows are the new price points
+        now = dt.datetime.utcnow() if now is None else now
+        product_ids = [int(x) for x in update_runs.index]
+        points = self._get_new_points(product_ids, now)
+
+        return RequestPlanner._to_plan([
+                (RequestPlanner.OPERATION_PRICES, product_id, 0, 0, 0, 1, int(rows))
+                for product_id, rows in zip(product_ids, points.values)
+            ])
+
+    def plan_category (self, category_id, refresh=False, now=None):
+        # One plan row for load_full_category
+        now = dt.datetime.utcnow() if now is None else now
+        checkpoint = self._storage.get_category_checkpoint(category_id)
+
+        if checkpoint is not None:
+            products, variants = checkpoint
+            pending = variants[variants[MySQLStorage.V_STAGE] < Storage.CHECKPOINT_PRICED]
+
+            listing_pages = 0
+            detail_pages = int((~products[MySQLStorage.V_RESOLVED]).sum())
+            variant_pages = int((pending[MySQLStorage.V_STAGE] == Storage.CHECKPOINT_DISCOVERED).sum())
+            variant_ids = [int(x) for x in pending.index]
+        else:
+            variants = self._storage.get_product_variants_of_category(category_id)
+            variant_ids = [int(x) for x in variants[MySQLStorage.V_VARIANT_ID].unique()]
+
+            listing_pages = RequestPlanner.get_listing_requests(variants.index.nunique())
+
+            if refresh:
+                detail_pages = 0
+                variant_pages = 0
+            else:
+                detail_pages = variants.index.nunique()
+                # Products without variants are their own variant
+                variant_pages = variants[variants[MySQLStorage.V_VARIANT_ID] != variants.index][
+                        MySQLStorage.V_VARIANT_ID
+                    ].nunique()
+
+        rows = int(self._get_new_points(variant_ids, now).sum())
+
+        return RequestPlanner._to_plan([
+                (RequestPlanner.OPERATION_CATEGORY, category_id, listing_pages, detail_pages,
+                 variant_pages, len(variant_ids), rows)
+            ])
+
+    def get_product_cost (self, category_id):
+        # Expected requests of a product detail page, its variant pages
+        # and price charts, from the products stored for the category
+        variants = self._storage.get_product_variants_of_category(category_id)
+        products = variants.index.nunique()
+
+        if products == 0:
+            # Detail page and price chart of a product without variants
+            return 2.0
+
+        variant_ids = variants[MySQLStorage.V_VARIANT_ID]
+        variant_pages = variant_ids[variant_ids != variants.index].nunique()
+        return 1.0 + (variant_pages + variant_ids.nunique()) / products
+
+    @classmethod
+    def split (cls, plan, budget):
+        # Assigns the plan to runs of at most budget requests. A category
+        # continues from its checkpoint, so it is split where the budget
+        # of a run ends, its rows in proportion. Price update runs are
+        # single requests.
+        parts = []
+        run = 0
+        left = budget
+
+        for operation, target, requests, rows in zip(plan["Operation"], plan["Target"],
+                                                     plan["Requests"], plan["Rows"]):
+            while True:
+                if requests <= left:
+                    parts.append((run, operation, target, requests, rows))
+                    left -= requests
+                    break
+
+                if left != 0:
+                    part_rows = int(round(rows * left / requests))
+                    parts.append((run, operation, target, left, part_rows))
+                    requests -= left
+                    rows -= part_rows
+
+                run += 1
+                left = budget
+
+        return pd.DataFrame(parts, columns=RequestPlanner.SPLIT_COLUMNS)
+
+    @classmethod
+    def summarize (cls, split):
+        # Run -> [Operations, Requests, Rows]
+        return split.groupby("Run").agg(
+                Operations=("Target", "size"),
+                Requests=("Requests", "sum"),
+                Rows=("Rows", "sum")
+            )
@@ -0,0 +1,243 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import os
+import os.path as osp
+import sys
+import io
+import random
+import threading
+import time
+import cProfile
+import pstats
+import datetime as dt
+from collections import Counter
+from contextlib import contextmanager
+
+
+class StageProfiler ():
+    '''
+    Opt-in profiling of the stages of a run. Code within
+    profile(stage) is attributed to stage, write() stores the profile
+    of every stage and a summary of the top hotspots in a new directory
+    below directory.
+
+    mode "cprofile" profiles every function call of the stages, which
+    slows Python heavy stages down considerably. mode "sample" records
+    the stacks of the threads within a stage every interval seconds
+    from a background thread instead, cheap enough for production runs.
+    With sample_rate, only that share of the runs is profiled at all.
+
+    Stages may be entered by several threads at once, a stage entered
+    within another one is attributed to the outer stage. Only the
+    threads of this process are profiled, work handed to other
+    processes shows up as the time waited for it.
+    '''
+    MODE_CPROFILE = "cprofile"
+    MODE_SAMPLE = "sample"
+    # Environment variables of from_environ
+    ENV_DIRECTORY = "IDEALO_PROFILE"
+    ENV_MODE = "IDEALO_PROFILE_MODE"
+    ENV_RATE = "IDEALO_PROFILE_RATE"
+
+    def __init__ (self, directory, mode=MODE_SAMPLE, sample_rate=1.0, interval=0.005, top=20):
+        if mode not in (StageProfiler.MODE_CPROFILE, StageProfiler.MODE_SAMPLE):
+            raise ValueError("Unknown profiling mode: {:s}".format(mode))
+
+        self._directory = directory
+        self._mode = mode
+        self._interval = interval
+        self._top = top
+        self.enabled = random.random() < sample_rate
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Stage -> [cProfile.Profile, ...]
+        self._profiles = {}
+        # Stage -> Seconds within the stage, summed over the threads
+        self.busy = Counter()
+        # Thread ID -> Stage, the threads within a stage
+        self._threads = {}
+        # Stage -> Counter: Stack (tuple of frames, outermost first) -> Samples
+        self._samples = {}
+        self._sampler = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_environ (cls):
+        # StageProfiler configured by IDEALO_PROFILE (directory),
+        # IDEALO_PROFILE_MODE and IDEALO_PROFILE_RATE, None if
+        # IDEALO_PROFILE is not set
+        directory = os.environ.get(StageProfiler.ENV_DIRECTORY, None)
+
+        if directory is None:
+            return None
+
+        return StageProfiler(
+                directory,
+                mode=os.environ.get(StageProfiler.ENV_MODE, StageProfiler.MODE_SAMPLE),
+                sample_rate=float(os.environ.get(StageProfiler.ENV_RATE, "1.0"))
+            )
+
+    @contextmanager
+    def profile (self, stage):
+        if not self.enabled or getattr(self._local, "stage", None) is not None:
+            yield
+            return
+
+        self._local.stage = stage
+        start = time.perf_counter()
+
+        profile = None
+        sampled = self._mode == StageProfiler.MODE_SAMPLE
+
+        if sampled:
+            with self._lock:
+                self._threads[threading.get_ident()] = stage
+        else:
+            profile = cProfile.Profile()
+
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12 and later run one profiler at a time, the
+                # stage is only timed then
+                profile = None
+
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+
+            with self._lock:
+                if profile is not None:
+                    self._profiles.setdefault(stage, []).append(profile)
+
+                if sampled:
+                    del self._threads[threading.get_ident()]
+
+                self.busy[stage] += time.perf_counter() - start
+
+            self._local.stage = None
+
+    @classmethod
+    def _get_frame_key (cls, frame):
+        code = frame.f_code
+        return "{:s}:{:d}({:s})".format(code.co_filename, code.co_firstlineno, code.co_name)
+
+    def _sample (self):
+        while not self._stopped.wait(self._interval):
+            with self._lock:
+                threads = dict(self._threads)
+
+            if len(threads) == 0:
+                continue
+
+            frames = sys._current_frames()
+            stacks = []
+
+            for thread_id, stage in threads.items():
+                frame = frames.get(thread_id, None)
+                stack = []
+
+                while frame is not None:
+                    stack.append(StageProfiler._get_frame_key(frame))
+                    frame = frame.f_back
+
+                stacks.append((stage, tuple(reversed(stack))))
+
+            with self._lock:
+                for stage, stack in stacks:
+                    self._samples.setdefault(stage, Counter())[stack] += 1
+
+    def start (self):
+        if self.enabled and self._mode == StageProfiler.MODE_SAMPLE:
+            self._stopped.clear()
+            self._sampler = threading.Thread(target=self._sample, name="stage-profiler", daemon=True)
+            self._sampler.start()
+
+        return self
+
+    def stop (self):
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def __enter__ (self):
+        return self.start()
+
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+        if self.enabled:
+            print(self.write())
+
+    def _write_cprofile (self, directory, stage, profiles):
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(osp.join(directory, stage+".prof"))
+
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self._top)
+        return output.getvalue()
+
+    def _write_samples (self, directory, stage, samples):
+        # Collapsed stacks, e.g. for flamegraph.pl
+        with open(osp.join(directory, stage+".stacks"), "w") as f:
+            for stack, count in samples.most_common():
+                f.write("{:s} {:d}\n".format(";".join(stack), count))
+
+        total = sum(samples.values())
+        # Frame -> Samples in the frame itself / anywhere in the stack
+        own = Counter()
+        inclusive = Counter()
+
+        for stack, count in samples.items():
+            if len(stack) != 0:
+                own[stack[-1]] += count
+
+            for frame in set(stack):
+                inclusive[frame] += count
+
+        lines = ["{:>8s} {:>8s}  {:s}".format("own %", "total %", "function")]
+
+        for frame, count in own.most_common(self._top):
+            lines.append("{:8.1f} {:8.1f}  {:s}".format(
+                    100.0 * count / total, 100.0 * inclusive[frame] / total, frame
+                ))
+
+        return "\n".join(lines)+"\n"
+
+    def write (self):
+        # Writes the stage profiles and hotspots.txt into a new
+        # directory and returns the hotspot summary
+        directory = osp.join(self._directory, "{:s}-{:d}".format(
+                dt.datetime.now().strftime("%Y%m%d-%H%M%S"), os.getpid()
+            ))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            profiles = dict(self._profiles)
+            samples = {stage : Counter(counter) for stage, counter in self._samples.items()}
+            busy = Counter(self.busy)
+
+        parts = ["Profile of {:d} stages in {:s}".format(len(busy), directory)]
+
+        for stage, seconds in busy.most_common():
+            parts.append("== {:s}: {:.2f} s".format(stage, seconds))
+
+            if stage in profiles:
+                parts.append(self._write_cprofile(directory, stage, profiles[stage]))
+            elif stage in samples:
+                parts.append(self._write_samples(directory, stage, samples[stage]))
+
+        summary = "\n".join(parts)
+
+        with open(osp.join(directory, "hotspots.txt"), "w") as f:
+            f.write(summary)
+
+        return summary
@@ -0,0 +1,194 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import json
+import random
+import threading
+import time
+import itertools
+import zipfile
+from control.scraping import RequestManager, StatusError
+
+
+class RecordingRequestManager (RequestManager):
+    '''
+    Passes the requests on to another manager and records URL, status,
+    request header and body of every fetched response in a zip archive
+    that ReplayRequestManager serves back. The response header is only
+    known, and recorded, for rejected responses.
+    '''
+    INDEX_NAME = "index.json"
+
+    def __init__ (self, request_manager, path):
+        super().__init__()
+
+        self._reqman = request_manager
+        self._archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._lock = threading.Lock()
+        # [{"url", "status", "request_header", "response_header", "body"}, ...]
+        self._index = []
+
+        self._keys = itertools.count()
+        # Key -> (Inner Key, URL, Header)
+        self._pending = {}
+
+    def _add_pending (self, inner_key, url, header):
+        with self._lock:
+            key = next(self._keys)
+            self._pending[key] = (inner_key, url, header)
+
+        return key
+
+    def _pop_pending (self, key):
+        # (Inner Key, URL, Header)
+        with self._lock:
+            return self._pending.pop(key)
+
+    def _record (self, url, header, content, status_code, response_header=None):
+        with self._lock:
+            body = "bodies/{:08d}".format(len(self._index))
+            self._archive.writestr(body, content)
+            self._index.append({
+                    "url" : url,
+                    "status" : int(status_code),
+                    "request_header" : header,
+                    "response_header" : None if response_header is None else dict(response_header),
+                    "body" : body
+                })
+            self._counters.inc("recorded")
+
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        inner_key = self._reqman.request(url, header, status_codes,
+                                         max_age=max_age, min_date=min_date)
+        self._counters.inc("requests")
+        return self._add_pending(inner_key, url, header)
+
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        urls = list(urls)
+        inner_keys = self._reqman.request_many(urls, header, status_codes,
+                                               max_age=max_age, min_date=min_date)
+        self._counters.inc("requests", len(urls))
+
+        return [
+                self._add_pending(inner_key, url, header)
+                for inner_key, url in zip(inner_keys, urls)
+            ]
+
+    def fetch (self, key):
+        inner_key, url, header = self._pop_pending(key)
+
+        try:
+            content, status_code = self._reqman.fetch(inner_key)
+        except StatusError as e:
+            # Rejected responses are replayed as rejected
+            self._record(url, header, b"", e.status_code, e.response_header)
+            raise
+
+        self._record(url, header, content, status_code)
+        return content, status_code
+
+    def fetch_many (self, keys):
+        if self._reqman.get_batch_size() is None:
+            # The wrapped manager fetches one by one anyway, a rejected
+            # response is recorded like in fetch
+            return [self.fetch(key) for key in keys]
+
+        # Managers fetching in batches return the rejected responses
+        pending = [self._pop_pending(key) for key in keys]
+        responses = self._reqman.fetch_many([inner_key for inner_key, _, _ in pending])
+
+        for (_, url, header), (content, status_code) in zip(pending, responses):
+            self._record(url, header, content, status_code)
+
+        return responses
+
+    def discard (self, key):
+        inner_key, _, _ = self._pop_pending(key)
+        self._reqman.discard(inner_key)
+
+    def can_request (self):
+        return self._reqman.can_request()
+
+    def get_batch_size (self):
+        return self._reqman.get_batch_size()
+
+    def close (self):
+        with self._lock:
+            self._archive.writestr(RecordingRequestManager.INDEX_NAME,
+                                   json.dumps(self._index))
+            self._archive.close()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class ReplayRequestManager (RequestManager):
+    '''
+    Serves the responses of a RecordingRequestManager archive. Every
+    response becomes available latency seconds (+- jitter) after it was
+    requested, so outstanding requests overlap like on the network.
+    The latest recording of a URL wins, max_age and min_date are ignored.
+    '''
+    def __init__ (self, path, latency=0.0, jitter=0.0, seed=None):
+        super().__init__()
+
+        self._latency = latency
+        self._jitter = jitter
+        self._random = random.Random(seed)
+
+        with zipfile.ZipFile(path, "r") as archive:
+            index = json.loads(archive.read(RecordingRequestManager.INDEX_NAME))
+
+            # URL -> (Content, Status Code, Response Header)
+            self._responses = {
+                    entry["url"] : (archive.read(entry["body"]), entry["status"],
+                                    entry["response_header"])
+                    for entry in index
+                }
+
+        self._lock = threading.Lock()
+        self._keys = itertools.count()
+        # Key -> (URL, Status Codes, Ready Time)
+        self._pending = {}
+
+    def get_urls (self):
+        return list(self._responses.keys())
+
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        if not isinstance(status_codes, (list, tuple)):
+            status_codes = [status_codes]
+
+        with self._lock:
+            delay = self._latency + self._random.uniform(-self._jitter, self._jitter)
+            key = next(self._keys)
+            self._pending[key] = (url, status_codes, time.perf_counter() + max(0.0, delay))
+            self._counters.inc("requests")
+
+        return key
+
+    def fetch (self, key):
+        with self._lock:
+            url, status_codes, ready = self._pending.pop(key)
+
+        delay = ready - time.perf_counter()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if url not in self._responses:
+            raise KeyError("Not recorded: {:s}".format(url))
+
+        content, status_code, response_header = self._responses[url]
+
+        if status_code not in status_codes:
+            raise StatusError(url, status_code, response_header)
+
+        return content, status_code
+
+    def discard (self, key):
+        with self._lock:
+            self._pending.pop(key)
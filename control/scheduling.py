@@ -0,0 +1,80 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import datetime as dt
+import numpy as np
+import pandas as pd
+from model.storage import MySQLStorage
+
+
+class RefreshScheduler ():
+    '''
+    Chooses the products whose prices are updated next by their price
+    volatility. The change rate of a product is estimated from the
+    price changes within the last history, a price chart request
+    returns all changes since the last one, so the expected changes of
+    a product grow with its change rate and the time since its last
+    check. The products with the most expected changes are chosen,
+    up to daily_budget requests per day.
+
+    Products are not checked again within min_interval and are always
+    due after max_interval. Products whose last price is older than
+    discontinued_after at their last check no longer get new prices,
+    their change rate is reduced by discontinued_factor.
+    '''
+    # Prior of the change rate estimate: products with little history
+    # start at PRIOR_CHANGES changes within PRIOR_DAYS days
+    PRIOR_CHANGES = 1.0
+    PRIOR_DAYS = 30.0
+
+    def __init__ (self, daily_budget, history=dt.timedelta(days=180),
+                  min_interval=dt.timedelta(days=1), max_interval=dt.timedelta(days=90),
+                  discontinued_after=dt.timedelta(days=14), discontinued_factor=0.1):
+        self.daily_budget = daily_budget
+        self.history = history
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.discontinued_after = discontinued_after
+        self.discontinued_factor = discontinued_factor
+
+    def get_budget (self, interval):
+        # Requests for a plan covering interval, at least one day
+        return int(self.daily_budget * max(1.0, interval / dt.timedelta(days=1)))
+
+    @classmethod
+    def _get_checked (cls, statistics):
+        # Products never checked count as checked at their last price
+        checked = statistics[MySQLStorage.V_CHECKED]
+        return checked.fillna(statistics[MySQLStorage.V_LAST_DATE])
+
+    def get_discontinued (self, statistics):
+        # Boolean Series: ProductId -> Discontinued
+        checked = RefreshScheduler._get_checked(statistics)
+        return (checked - statistics[MySQLStorage.V_LAST_DATE]) > self.discontinued_after
+
+    def get_change_rates (self, statistics):
+        # Series: ProductId -> Expected price changes per day
+        rates = ((statistics[MySQLStorage.V_CHANGES] + RefreshScheduler.PRIOR_CHANGES) /
+                 (statistics[MySQLStorage.V_POINTS] + RefreshScheduler.PRIOR_DAYS))
+        return rates.where(~self.get_discontinued(statistics), rates * self.discontinued_factor)
+
+    def get_expected_changes (self, statistics, now):
+        # Series: ProductId -> Expected price changes since the last check
+        since_check = now - RefreshScheduler._get_checked(statistics)
+        return self.get_change_rates(statistics) * (since_check / pd.Timedelta(days=1))
+
+    def select (self, statistics, now, interval=dt.timedelta(days=1)):
+        # statistics: see Storage.get_price_statistics
+        # Returns the IDs of the products to update within interval,
+        # the most expected changes first
+        since_check = now - RefreshScheduler._get_checked(statistics)
+        expected = self.get_expected_changes(statistics, now)
+
+        # Overdue products first, then by expected changes
+        score = expected.where(since_check < self.max_interval, np.inf)
+        score = score[since_check >= self.min_interval]
+        score = score.sort_values(ascending=False, kind="stable")
+
+        return score.index[:self.get_budget(interval)]
@@ -1,474 +1,1347 @@
-'''
-Created on 05.01.2022
-
-@author: larsw
-'''
-from bs4 import BeautifulSoup
-import requests
-import json
-import pandas as pd
-import time
-from abc import ABC, abstractmethod
-import datetime as dt
-from webrequestmanager.control.api import WebRequestAPIClient
-import numpy as np
-
-class StatusError (Exception):
-    def __init__ (self, url, status_code, response_header):
-        super().__init__("Error: {:d}\n{:s}\n{:s}".format(
-                status_code, url, str(response_header)
-            ))
-        
-        self.url = url
-        self.status_code = status_code
-
-class RequestManager (ABC):
-    def __init__ (self):
-        pass
-    
-    @abstractmethod
-    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
-        pass
-    
-    @abstractmethod
-    def fetch (self, key):
-        pass
-    
-class StandardRequestManager (RequestManager):
-    def __init__ (self):
-        self._session = requests.Session()
-        
-        self._buffer = {}
-        
-    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
-        hashable_header = tuple(list(header.keys()) + list(header.values()))
-        
-        h = hash(url) + 31 * hash(hashable_header)
-        
-        html = self._session.get(url, headers=IdealoRequester.HEADERS_DICT,
-                            allow_redirects=False)
-        
-        if html.status_code == status_codes:
-            self._buffer[h] = html.content
-        else:
-            exc = StatusError(url, html.status_code, html.headers)
-            raise exc
-        
-    def fetch (self, key):
-        c = self._buffer[key]
-        del self._buffer[key]
-        
-        return c, 200
-    
-class WebRequestManager (RequestManager):
-    def __init__ (self, api, max_age):
-        self._api = api
-        self._max_age = max_age
-        
-    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
-        if min_date is None:
-            if max_age is None:
-                max_age = self._max_age
-            
-            max_date = dt.datetime.utcnow()
-            min_date = max_date - max_age
-        else:
-            max_date = dt.datetime.utcnow()
-        
-        request_id = self._api.post_page_request(url, header, 
-                                                 accepted_status=status_codes,
-                                                 min_date=min_date, max_date=max_date)
-        return request_id
-    
-    def fetch (self, key):
-        response_df = self._api.get_response(request_id=key, wait=True)
-        return response_df["Content"], response_df["StatusCode"]
-
-class IdealoRequester ():
-    HEADERS_DICT = {
-            "Accept" : "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-            "Accept-Encoding" : "gzip, deflate, br",
-            "Accept-Language" : "de,en-US;q=0.7,en;q=0.3",
-            "Cache-Control" : "max-age=0",
-            "Connection" : "keep-alive",
-            "Host" : "www.idealo.de",
-            "Sec-Fetch-Dest" : "document",
-            "Sec-Fetch-Mode" : "navigate",
-            "Sec-Fetch-Site" : "same-origin",
-            "TE" : "trailers",
-            "Upgrade-Insecure-Requests" : "1",
-            "User-Agent" : "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0"
-        }
-    
-    URL_BASE = "https://www.idealo.de" 
-    PRODOFFERS_SEGMENT_FORMAT = URL_BASE+"/offerpage/offerlist/product/{:s}/start/{:d}/sort/default?includeFilters=0&excludeFilters="
-    API_FORMAT = URL_BASE+"/offerpage/pricechart/api/{:d}?period={:s}"
-    API_PERIODS = {
-            dt.timedelta(days=30) : "P1M",
-            dt.timedelta(days=90) : "P3M",
-            dt.timedelta(days=180) : "P6M",
-            dt.timedelta(days=365) : "P1Y",
-            dt.timedelta(days=2) : "P2D",
-            dt.timedelta(days=500) : "P500D"
-        }
-    SORTED_API_PERIODS = sorted(list(API_PERIODS.keys()))
-    CAT_START_FORMAT = URL_BASE+"/preisvergleich/ProductCategory/{:d}.html"
-    CAT_CONT_FORMAT = URL_BASE+"/preisvergleich/ProductCategory/{:d}I16-{:d}.html"
-    
-    def __init__ (self, request_manager):
-        # Time to wait before each request in order to
-        # mitigate HTTP 429 Too Many Requests
-        
-        self._reqman = request_manager        
-    
-    @classmethod
-    def get_api_period_for_timedelta (cls, td):
-        start = dt.timedelta(seconds=0)
-        
-        for i in range(0, len(cls.SORTED_API_PERIODS)):
-            end = cls.SORTED_API_PERIODS[i]
-            
-            if (td >= start) and (td < end):
-                return cls.API_PERIODS[end]
-            
-            start = end
-            
-        return cls.API_PERIODS[cls.SORTED_API_PERIODS[-1]]
-        
-        
-    
-    def get_api (self, product_id, max_age=None, min_date=None, period=None):
-        if period is None:
-            period = "P500D"
-        
-        if isinstance(product_id, int):
-            url = IdealoRequester.API_FORMAT.format(product_id, period)
-            html, _ = self._reqman.fetch(
-                        self._reqman.request(
-                                url, 
-                                IdealoRequester.HEADERS_DICT, 
-                                max_age=max_age, 
-                                min_date=min_date
-                        )
-            )
-            
-            data = json.loads(html.decode("utf-8"))["data"]
-            
-            indx = []
-            values = []
-            
-            for v in data:
-                x = v["x"]
-                y = v["y"]
-                
-                indx.append(x)
-                values.append(y)
-            
-            indx = pd.Index(indx)
-            indx = pd.to_datetime(indx)
-            
-            return pd.Series(values, indx)
-        elif isinstance(product_id, (list, tuple)):
-            if not isinstance(max_age, (list, tuple)):
-                max_age = [max_age for _ in range(len(product_id))]
-                
-            if not isinstance(min_date, (list, tuple)):
-                min_date = [min_date for _ in range(len(product_id))]
-                
-            if not isinstance(period, (list, tuple)):
-                period = [period for _ in range(len(product_id))]
-            
-            keys = []
-            
-            for pid, cmax_age, cmin_date, cperiod in zip(product_id, max_age, min_date, period):
-                url = IdealoRequester.API_FORMAT.format(pid, cperiod)
-                keys.append(
-                    self._reqman.request(
-                        url, 
-                        IdealoRequester.HEADERS_DICT,
-                        max_age=cmax_age,
-                        min_date=cmin_date
-                    )
-                )
-                
-            datas = {}
-                
-            for key, pid in zip(keys, product_id):
-                html, _ = self._reqman.fetch(key)
-                
-                data = json.loads(html.decode("utf-8"))["data"]
-                
-                indx = []
-                values = []
-                
-                for v in data:
-                    x = v["x"]
-                    y = v["y"]
-                    
-                    indx.append(x)
-                    values.append(y)
-                
-                indx = pd.Index(indx)
-                indx = pd.to_datetime(indx)
-                
-                datas[pid] = pd.Series(values, index=indx)
-                
-            return datas
-        else:
-            errmsg = "Wrong product id type: {:s}".format(str(type(product_id)))
-            raise TypeError(errmsg)
-    
-    @classmethod
-    def product_offer_url_to_id (cls, url):
-        last_slash = url.rfind("/")
-        url = url[last_slash+1:]
-        
-        if "_-" in url:
-            separator = url.rfind("_-")
-        else:
-            separator = url.rfind(".")
-            
-        return url[:separator]
-        
-    @classmethod
-    def scrape_items_from_product_category (cls, html):
-        all_products = {}
-        
-        html = BeautifulSoup(html, "html.parser")
-        html = html.find("div", {"class" : "resultlist"})
-        products = html.find_all("div", {"class" : "offerList-item"})
-        
-        for product in products:
-            a = product.find("a", {"class" : "offerList-itemWrapper"})
-            product_url = a["href"].strip()
-            product_id = IdealoRequester.product_offer_url_to_id(product_url)
-            
-            try:
-                product_id = int(product_id)
-            except:
-                continue
-            
-            name = a.find("div", {"class" : "offerList-item-detailsWrapper"})
-            name = name.find("div", {"class" : "offerList-item-description-title"}).get_text().strip()
-            
-            all_products[product_id] = (name, product_url)
-            
-        return all_products
-        
-    def get_name_of_category (self, category_id, max_age=None, min_date=None):
-        url = IdealoRequester.CAT_START_FORMAT.format(category_id)
-        content, _ = self._reqman.fetch(
-            self._reqman.request(
-                url,
-                IdealoRequester.HEADERS_DICT,
-                200,
-                max_age=max_age,
-                min_date=min_date
-            )
-        )
-        
-        content = BeautifulSoup(content, "html.parser")
-        header = content.find("div", {"class" : "category-headline"})
-        header = header.find("h1", {"class" : "offerList-title"}).get_text().strip()
-        
-        return header
-        
-    def get_products_of_category (self, category_id, max_age=None, min_date=None):
-        # https://www.idealo.de/preisvergleich/ProductCategory/16073.html
-        # https://www.idealo.de/preisvergleich/ProductCategory/16073I16-15.html
-        # Index zu hoch -> 301 Moved Permanently, Verweis auf Anfangsseite
-        all_products = {}
-        
-        url = IdealoRequester.CAT_START_FORMAT.format(category_id)
-        
-        offset_count = 40
-        step = 15
-        counter_start = 0
-        
-        while True:
-            offsets = np.arange(counter_start, counter_start + step * offset_count, step)
-            print("Loading products: "+str(offsets))
-            counter_start = counter_start + step * offset_count
-            
-            request_ids = []
-            
-            for offset in offsets:
-                if offset == 0:
-                    url = IdealoRequester.CAT_START_FORMAT.format(category_id)
-                else:
-                    url = IdealoRequester.CAT_CONT_FORMAT.format(category_id, offset)
-                    
-                request_id = self._reqman.request(
-                    url,
-                    IdealoRequester.HEADERS_DICT,
-                    [200, 301],
-                    max_age=max_age,
-                    min_date=min_date
-                )
-                request_ids.append(request_id)
-                
-            hit_final_page = False
-                
-            for request_id in request_ids:
-                content, status_code = self._reqman.fetch(request_id)
-                
-                if status_code != 301:
-                    subproducts = IdealoRequester.scrape_items_from_product_category(content)
-                    all_products.update(subproducts)
-                else:
-                    hit_final_page = True
-                    break
-                
-            if hit_final_page:
-                break
-        
-        return all_products
-    
-    @classmethod
-    def scrape_variants_from_product_detail (cls, html):
-        html = BeautifulSoup(html, "html.parser")
-        html = html.find("div", id="product-variants")
-        
-        if html is None:
-            # No variants exist, given page is the product
-            return None
-        else:
-            html = html.find_all("a", {"class" : "productVariants-listItemWrapper"})
-            
-            urls = set()
-            
-            for variant_box in html:
-                urls.add(cls.URL_BASE+variant_box["href"].strip())
-            
-            return urls
-    
-    def get_product_variants_of_product_detail_page (self, pdp_dict, max_age=None, min_date=None):
-        # pdp_dict: {Product ID : Product Detail URL}
-        
-        request_ids = {
-                product_id : self._reqman.request(
-                    pdp_dict[product_id], 
-                    IdealoRequester.HEADERS_DICT,
-                    200,
-                    max_age=max_age,
-                    min_date=min_date
-                )
-                for product_id in pdp_dict
-            }
-        
-        variant_urls = {}
-        
-        for product_id in request_ids:
-            request_id = request_ids[product_id]
-            html, _ = self._reqman.fetch(request_id)
-            
-            detail_url = IdealoRequester.scrape_variants_from_product_detail(html)
-            
-            if detail_url is None:
-                detail_url = set([pdp_dict[product_id]])
-                
-            variant_urls[product_id] = detail_url
-        
-        return variant_urls
-    
-    @classmethod
-    def _parse_datasheet_rows (cls, rows):
-        header = "General"
-        
-        all_data_headers = []
-        all_data_serieses = []
-        
-        collected_indx = []
-        collected_values = []
-        
-        for row in rows:
-            row_cls = row.get("class", None)
-            
-            if row_cls is None:
-                subrows = row.find_all("li")
-                
-                for subrow in subrows:
-                    cols = subrow.find_all("span")
-                    
-                    col = cols[0].get_text().strip()
-                    value = cols[1].get_text().strip()
-                    
-                    collected_indx.append(col)
-                    collected_values.append(value)
-            else:
-                new_header = row.get_text().replace("\t", "").replace("\n", "")
-                
-                if len(collected_indx) != 0:
-                    s = pd.Series(collected_values, index=collected_indx)
-                    all_data_headers.append(header)
-                    all_data_serieses.append(s)
-                    
-                    collected_indx = []
-                    collected_values = []
-                    
-                header = new_header
-                
-        if len(collected_indx) != 0:
-            s = pd.Series(collected_values, index=collected_indx)
-            all_data_headers.append(header)
-            all_data_serieses.append(s)
-            
-        if len(all_data_serieses) != 0:
-            all_data_serieses = pd.concat(all_data_serieses, axis=0,
-                                          keys=all_data_headers)
-        else:
-            all_data_serieses = None
-            
-        return all_data_serieses
-    
-    @classmethod
-    def scrape_product_details (cls, html):
-        html = BeautifulSoup(html, "html.parser")
-        
-        name_element = html.find("h1", {"class" : "oopStage-title"})
-        name_element = name_element.find_all("span")
-        
-        if len(name_element) == 2:
-            main_name = name_element[0].get_text().strip()
-            variant_name = name_element[1].get_text().strip()
-            product_name = main_name+" "+variant_name
-        else:
-            product_name = name_element[0].get_text().strip()
-        
-        try:
-            print(product_name)
-        except:
-            print("Produktname kann nicht wiedergegeben werden.")
-            
-        datasheet = html.find("div", id="datasheet")
-        datasheet = datasheet.find("ul", {"class" : "datasheet-list"})
-        
-        datasheet = cls._parse_datasheet_rows(datasheet.find_all("li"))
-        
-        return product_name, datasheet
-    
-    def get_details_from_variant_pages (self, variant_page_dict, max_age=None, min_date=None):
-        # variant_page_dict: {Product ID : Variant Page URL}
-        
-        request_ids = {
-                product_id : self._reqman.request(
-                        variant_page_dict[product_id],
-                        IdealoRequester.HEADERS_DICT,
-                        200,
-                        max_age=max_age,
-                        min_date=min_date
-                    )
-                for product_id in variant_page_dict
-            }
-        
-        details = {}
-        
-        for product_id in request_ids:
-            request_id = request_ids[product_id]
-            
-            html, _ = self._reqman.fetch(request_id)
-            product_name, datasheet = IdealoRequester.scrape_product_details(html)
-            
-            details[product_id] = (product_name, datasheet)
-            
-        return details
+'''
+Created on 05.01.2022
+
+@author: larsw
+'''
+import requests
+import json
+import pandas as pd
+import time
+from abc import ABC, abstractmethod
+import datetime as dt
+from webrequestmanager.control.api import WebRequestAPIClient
+import numpy as np
+import itertools
+import threading
+from collections import deque, Counter, OrderedDict
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, Future
+from control.metrics import METRICS
+from control.parsing import get_parser, datasheet_from_rows,\
+    product_offer_url_to_id, PageParser, parse_listing_page,\
+    parse_category_page, parse_product_detail_page, parse_variant_page
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+class StatusError (Exception):
+    def __init__ (self, url, status_code, response_header):
+        super().__init__("Error: {:d}\n{:s}\n{:s}".format(
+                status_code, url, str(response_header)
+            ))
+        
+        self.url = url
+        self.status_code = status_code
+        self.response_header = response_header
+
+class SharedCounter ():
+    # Counter incremented by several threads, read as snapshots
+    def __init__ (self):
+        self._counter = Counter()
+        self._lock = threading.Lock()
+        
+    def inc (self, key, value=1):
+        with self._lock:
+            self._counter[key] += value
+            
+    def get (self, key):
+        with self._lock:
+            return self._counter[key]
+        
+    def snapshot (self):
+        with self._lock:
+            return Counter(self._counter)
+    
+class RequestManager (ABC):
+    def __init__ (self):
+        self._counters = SharedCounter()
+        
+    @property
+    def counters (self):
+        # Snapshot of the counters, e.g. requests
+        return self._counters.snapshot()
+    
+    @abstractmethod
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        pass
+    
+    @abstractmethod
+    def fetch (self, key):
+        pass
+    
+    @classmethod
+    def _expand_argument (cls, value, count):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        else:
+            return [value for _ in range(count)]
+    
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        # Default implementation for managers that can not batch:
+        # one request per URL. max_age and min_date may be given
+        # per URL as lists.
+        max_ages = RequestManager._expand_argument(max_age, len(urls))
+        min_dates = RequestManager._expand_argument(min_date, len(urls))
+        
+        return [
+                self.request(url, header, status_codes,
+                             max_age=cmax_age, min_date=cmin_date)
+                for url, cmax_age, cmin_date in zip(urls, max_ages, min_dates)
+            ]
+    
+    def fetch_many (self, keys):
+        return [self.fetch(key) for key in keys]
+    
+    @classmethod
+    def _parse_responses (cls, responses, parser):
+        # Pages with another status than 200 are not parsed
+        # and yield None.
+        for content, status_code in responses:
+            if parser is None:
+                yield content, status_code
+            elif status_code == 200:
+                yield parser(content), status_code
+            else:
+                yield None, status_code
+    
+    def fetch_many_parsed (self, keys, parser):
+        return list(RequestManager._parse_responses(self.fetch_many(keys), parser))
+    
+    def fetch_parsed (self, key, parser):
+        # Returns (parser(Content), Status Code)
+        return self.fetch_many_parsed([key], parser)[0]
+    
+    def discard (self, key):
+        # Drops a request whose response is not needed anymore
+        pass
+    
+    def can_request (self):
+        # Managers with a bounded buffer return False while a further
+        # request would have to wait for buffered responses to be fetched
+        return True
+    
+    def get_batch_size (self):
+        # Managers that send and poll in chunks return the chunk size
+        return None
+    
+    @classmethod
+    def _iter_argument (cls, value):
+        if isinstance(value, (list, tuple)):
+            return iter(value)
+        else:
+            return itertools.repeat(value)
+        
+    @classmethod
+    def _iter_chunks (cls, values, chunk_size):
+        values = iter(values)
+        
+        while True:
+            chunk = list(itertools.islice(values, chunk_size))
+            
+            if len(chunk) == 0:
+                break
+            
+            yield chunk
+    
+    def stream (self, urls, header, status_codes=200, max_age=None, min_date=None,
+                window=64, parser=None):
+        # Yields (Content, Status Code) in the order of urls while
+        # keeping at most window requests outstanding. Requests left
+        # over when the consumer stops early are discarded. With a
+        # parser, the parsed content is yielded (see fetch_parsed).
+        batch_size = self.get_batch_size()
+        
+        if batch_size is not None:
+            yield from self._stream_chunks(urls, header, status_codes, max_age,
+                                           min_date, parser, batch_size)
+            return
+        
+        pending = deque()
+        
+        try:
+            for url, cmax_age, cmin_date in zip(urls,
+                                                RequestManager._iter_argument(max_age),
+                                                RequestManager._iter_argument(min_date)):
+                while (len(pending) != 0 and
+                       (len(pending) >= window or not self.can_request())):
+                    yield self.fetch_parsed(pending.popleft(), parser)
+                    
+                pending.append(self.request(url, header, status_codes,
+                                            max_age=cmax_age, min_date=cmin_date))
+                
+            while len(pending) != 0:
+                yield self.fetch_parsed(pending.popleft(), parser)
+        finally:
+            for key in pending:
+                self.discard(key)
+                
+    def _stream_chunks (self, urls, header, status_codes, max_age, min_date,
+                        parser, chunk_size):
+        # For managers whose backend buffers the responses itself: the
+        # next chunk is requested before the current one is fetched.
+        page_requests = zip(urls,
+                            RequestManager._iter_argument(max_age),
+                            RequestManager._iter_argument(min_date))
+        pending = []
+        
+        try:
+            for chunk in RequestManager._iter_chunks(page_requests, chunk_size):
+                chunk_urls, chunk_max_ages, chunk_min_dates = zip(*chunk)
+                
+                keys = self.request_many(list(chunk_urls), header, status_codes,
+                                         max_age=list(chunk_max_ages),
+                                         min_date=list(chunk_min_dates))
+                fetched, pending = pending, keys
+                
+                yield from self.fetch_many_parsed(fetched, parser)
+                
+            fetched, pending = pending, []
+            yield from self.fetch_many_parsed(fetched, parser)
+        finally:
+            for key in pending:
+                self.discard(key)
+    
+class StandardRequestManager (RequestManager):
+    # Body size reserved for a request whose response has not
+    # arrived yet, refined with the sizes actually received
+    INITIAL_SIZE_ESTIMATE = 256 * 1024
+    # Seconds to wait before retrying a 429 without Retry-After,
+    # doubled with every retry
+    RETRY_BACKOFF = 1.0
+    
+    def __init__ (self, max_buffer_bytes=64 * 1024 * 1024, workers=8,
+                  max_retries=5, rewrite_hosts=None):
+        super().__init__()
+        
+        # Attempts per URL after HTTP 429 Too Many Requests
+        self._max_retries = max_retries
+        # {URL Prefix : Replacement}, e.g. to send the requests
+        # to a local stand-in server
+        self._rewrite_hosts = rewrite_hosts or {}
+        
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        
+        self._max_buffer_bytes = max_buffer_bytes
+        self._size_estimate = StandardRequestManager.INITIAL_SIZE_ESTIMATE
+        # Bytes of buffered bodies plus estimates for outstanding requests
+        self._reserved_bytes = 0
+        self._condition = threading.Condition()
+        
+        self._request_ids = itertools.count()
+        # Request ID -> [Future, Reserved Bytes]
+        self._buffer = {}
+        # Request ID -> (URL, Header, Status Codes) of requests of
+        # request_many that wait for the budget, sent in this order
+        self._deferred = OrderedDict()
+        
+    def _get_session (self):
+        # requests.Session is not thread-safe, one per worker
+        session = getattr(self._local, "session", None)
+        
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+            
+        return session
+    
+    def _is_full (self):
+        # A single request is always admitted so that an oversized
+        # page can not block the manager forever
+        return (len(self._buffer) != 0 and
+                self._reserved_bytes + self._size_estimate > self._max_buffer_bytes)
+    
+    def can_request (self):
+        with self._condition:
+            return not self._is_full() and len(self._deferred) == 0
+        
+    def _rewrite_url (self, url):
+        for prefix, replacement in self._rewrite_hosts.items():
+            if url.startswith(prefix):
+                return replacement+url[len(prefix):]
+            
+        return url
+    
+    @classmethod
+    def _get_retry_delay (cls, response, attempt):
+        retry_after = response.headers.get("Retry-After", "")
+        
+        if retry_after.isdigit():
+            return int(retry_after)
+        else:
+            return cls.RETRY_BACKOFF * 2 ** attempt
+        
+    def _get (self, url, header):
+        target = self._rewrite_url(url)
+        
+        for attempt in range(self._max_retries + 1):
+            html = self._get_session().get(target, headers=header,
+                                           allow_redirects=False)
+            
+            if html.status_code != 429 or attempt == self._max_retries:
+                return html
+            
+            with self._condition:
+                self._counters.inc("retries")
+                
+            METRICS.inc("http_retries_total")
+            time.sleep(StandardRequestManager._get_retry_delay(html, attempt))
+        
+    def _set_buffer_gauges (self):
+        # Requires self._condition
+        METRICS.set("http_requests_in_flight", len(self._buffer))
+        METRICS.set("http_buffer_reserved_bytes", self._reserved_bytes)
+        
+    def _submit (self, request_id, url, header, status_codes):
+        # Requires self._condition
+        entry = [None, self._size_estimate]
+        self._buffer[request_id] = entry
+        self._reserved_bytes += entry[1]
+        entry[0] = self._executor.submit(self._download, request_id,
+                                         url, header, status_codes)
+        self._set_buffer_gauges()
+        
+    def _submit_deferred (self):
+        # Requires self._condition
+        while len(self._deferred) != 0 and not self._is_full():
+            request_id, request = self._deferred.popitem(last=False)
+            self._submit(request_id, *request)
+        
+    def _download (self, request_id, url, header, status_codes):
+        start = time.perf_counter()
+        html = self._get(url, header)
+        content = html.content
+        METRICS.observe("http_request_seconds", time.perf_counter() - start,
+                        status=html.status_code)
+        METRICS.inc("http_responses_total", status=html.status_code)
+        METRICS.inc("http_response_bytes_total", len(content))
+        
+        with self._condition:
+            entry = self._buffer.get(request_id, None)
+            
+            if entry is not None:
+                self._reserved_bytes += len(content) - entry[1]
+                entry[1] = len(content)
+                
+            self._size_estimate = (7 * self._size_estimate + len(content)) // 8
+            self._set_buffer_gauges()
+            self._submit_deferred()
+            self._condition.notify_all()
+        
+        if html.status_code not in status_codes:
+            raise StatusError(url, html.status_code, html.headers)
+        
+        return content, html.status_code
+        
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        if not isinstance(status_codes, (list, tuple)):
+            status_codes = [status_codes]
+        
+        with self._condition:
+            # Backpressure: wait until fetched responses free the budget
+            while self._is_full():
+                self._condition.wait()
+                
+            request_id = next(self._request_ids)
+            self._counters.inc("requests")
+            self._submit(request_id, url, header, status_codes)
+            
+        return request_id
+    
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        # Does not wait for the budget like request: the caller could
+        # only free it by fetching keys it does not have yet. The
+        # requests beyond the budget are sent once fetched responses
+        # free it, or when their own response is fetched.
+        if not isinstance(status_codes, (list, tuple)):
+            status_codes = [status_codes]
+        
+        request_ids = []
+        
+        with self._condition:
+            for url in urls:
+                request_id = next(self._request_ids)
+                self._counters.inc("requests")
+                self._deferred[request_id] = (url, header, status_codes)
+                request_ids.append(request_id)
+                
+            self._submit_deferred()
+            
+        return request_ids
+    
+    def _release (self, key):
+        with self._condition:
+            _, reserved = self._buffer.pop(key)
+            self._reserved_bytes -= reserved
+            self._set_buffer_gauges()
+            self._submit_deferred()
+            self._condition.notify_all()
+        
+    def fetch (self, key):
+        with self._condition:
+            if key in self._deferred:
+                # Sent past the budget, like a single request on
+                # an empty buffer
+                self._submit(key, *self._deferred.pop(key))
+                
+            future = self._buffer[key][0]
+        
+        try:
+            return future.result()
+        finally:
+            self._release(key)
+            
+    def discard (self, key):
+        with self._condition:
+            if self._deferred.pop(key, None) is not None:
+                return
+            
+        self._buffer[key][0].cancel()
+        self._release(key)
+    
+class WebRequestManager (RequestManager):
+    def __init__ (self, api, max_age, chunk_size=500):
+        super().__init__()
+        
+        self._api = api
+        self._max_age = max_age
+        # Number of requests sent or polled in one call to the
+        # request service, if it supports batches
+        self._chunk_size = chunk_size
+        
+    def _get_date_range (self, max_age, min_date):
+        if min_date is None:
+            if max_age is None:
+                max_age = self._max_age
+            
+            max_date = dt.datetime.utcnow()
+            min_date = max_date - max_age
+        else:
+            max_date = dt.datetime.utcnow()
+            
+        return min_date, max_date
+        
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        min_date, max_date = self._get_date_range(max_age, min_date)
+        
+        request_id = self._api.post_page_request(url, header, 
+                                                 accepted_status=status_codes,
+                                                 min_date=min_date, max_date=max_date)
+        self._counters.inc("requests")
+        return request_id
+    
+    def fetch (self, key):
+        with METRICS.timer("http_request_service_wait_seconds"):
+            response_df = self._api.get_response(request_id=key, wait=True)
+            
+        METRICS.inc("http_responses_total", status=response_df["StatusCode"])
+        return response_df["Content"], response_df["StatusCode"]
+    
+    def _chunks (self, values):
+        for start in range(0, len(values), self._chunk_size):
+            yield values[start:start+self._chunk_size]
+            
+    def get_batch_size (self):
+        # The request service buffers the responses itself
+        return self._chunk_size
+    
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        if not hasattr(self._api, "post_page_requests"):
+            # Older API clients can only post single requests
+            return super().request_many(urls, header, status_codes,
+                                        max_age=max_age, min_date=min_date)
+        
+        urls = list(urls)
+        max_ages = RequestManager._expand_argument(max_age, len(urls))
+        min_dates = RequestManager._expand_argument(min_date, len(urls))
+        
+        # [(URL, Min Date, Max Date), ...]
+        page_requests = [
+                (url, ) + self._get_date_range(cmax_age, cmin_date)
+                for url, cmax_age, cmin_date in zip(urls, max_ages, min_dates)
+            ]
+        
+        request_ids = []
+        
+        for chunk in self._chunks(page_requests):
+            chunk_urls, chunk_min_dates, chunk_max_dates = zip(*chunk)
+            
+            request_ids.extend(
+                self._api.post_page_requests(list(chunk_urls), header,
+                                             accepted_status=status_codes,
+                                             min_date=list(chunk_min_dates),
+                                             max_date=list(chunk_max_dates))
+            )
+            
+        self._counters.inc("requests", len(request_ids))
+        return request_ids
+    
+    def fetch_many (self, keys):
+        if not hasattr(self._api, "get_responses"):
+            return super().fetch_many(keys)
+        
+        keys = list(keys)
+        responses = []
+        
+        for chunk in self._chunks(keys):
+            # Request ID -> [Content, StatusCode]
+            with METRICS.timer("http_request_service_wait_seconds"):
+                response_df = self._api.get_responses(request_ids=chunk, wait=True)
+            
+            for key in chunk:
+                response = response_df.loc[key]
+                METRICS.inc("http_responses_total", status=response["StatusCode"])
+                responses.append((response["Content"], response["StatusCode"]))
+                
+        return responses
+    
+class BudgetExhaustedError (Exception):
+    def __init__ (self, budget):
+        super().__init__("Request budget of {:d} requests exhausted".format(budget))
+        
+        self.budget = budget
+
+class RateLimiter ():
+    # Token bucket shared by all threads: on average rate requests
+    # per second, bursts of up to burst requests
+    # Seconds of requests a burst of for_rate may take at once
+    BURST_SECONDS = 1.0
+    
+    def __init__ (self, rate, burst=1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        
+    @classmethod
+    def for_rate (cls, rate):
+        # Rate limiter of the entry points, bursts of BURST_SECONDS
+        # worth of requests
+        return RateLimiter(rate, burst=max(1, int(RateLimiter.BURST_SECONDS * rate)))
+        
+    def acquire (self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            # Tokens may go negative, later callers queue behind
+            self._tokens -= 1
+            delay = -self._tokens / self._rate
+            
+        if delay > 0:
+            time.sleep(delay)
+    
+class RateLimitedRequestManager (RequestManager):
+    # Wraps another request manager. Every request waits for the
+    # shared rate limiter, and once budget requests are sent, further
+    # requests raise BudgetExhaustedError.
+    def __init__ (self, request_manager, rate_limiter=None, budget=None):
+        super().__init__()
+        
+        self._reqman = request_manager
+        self._rate_limiter = rate_limiter
+        self._budget = budget
+        self._lock = threading.Lock()
+        
+    def _admit (self, count):
+        with self._lock:
+            if (self._budget is not None and
+                    self._counters.get("requests") + count > self._budget):
+                METRICS.inc("http_budget_exhausted_total")
+                raise BudgetExhaustedError(self._budget)
+            
+            self._counters.inc("requests", count)
+            
+        if self._rate_limiter is not None:
+            with METRICS.timer("http_rate_limit_wait_seconds"):
+                for _ in range(count):
+                    self._rate_limiter.acquire()
+                
+    def get_remaining_budget (self):
+        # None without budget
+        if self._budget is None:
+            return None
+        
+        with self._lock:
+            return self._budget - self._counters.get("requests")
+        
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        self._admit(1)
+        return self._reqman.request(url, header, status_codes,
+                                    max_age=max_age, min_date=min_date)
+    
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        urls = list(urls)
+        self._admit(len(urls))
+        return self._reqman.request_many(urls, header, status_codes,
+                                         max_age=max_age, min_date=min_date)
+        
+    def fetch (self, key):
+        return self._reqman.fetch(key)
+    
+    def fetch_many (self, keys):
+        return self._reqman.fetch_many(keys)
+    
+    def discard (self, key):
+        self._reqman.discard(key)
+        
+    def can_request (self):
+        return self._reqman.can_request()
+    
+    def get_batch_size (self):
+        return self._reqman.get_batch_size()
+    
+class _Flight ():
+    def __init__ (self, key):
+        self.key = key
+        # Set once the wrapped request is sent / its response is known
+        self.sent = threading.Event()
+        self.done = threading.Event()
+        self.parse_lock = threading.Lock()
+        
+        self.inner_key = None
+        self.waiters = 0
+        self.claimed = False
+        self.response = None
+        self.error = None
+        # Parser -> Parsed Content
+        self.parsed = {}
+    
+class SingleFlightRequestManager (RequestManager):
+    # Wraps another request manager. Concurrent requests for the same
+    # URL, header, status codes and freshness share one request of
+    # the wrapped manager and, with fetch_parsed, one parsed result.
+    # A flight lasts until every request joined to it is fetched.
+    def __init__ (self, request_manager):
+        super().__init__()
+        
+        self._reqman = request_manager
+        self._lock = threading.Lock()
+        self._handles = itertools.count()
+        
+        # Flight Key -> _Flight
+        self._flights = {}
+        # Handle -> _Flight
+        self._flight_of_handle = {}
+        
+    @classmethod
+    def _get_flight_key (cls, url, header, status_codes, max_age, min_date):
+        if isinstance(status_codes, list):
+            status_codes = tuple(status_codes)
+        
+        return (url, tuple(sorted(header.items())), status_codes, max_age, min_date)
+    
+    def _join (self, key):
+        # Requires self._lock
+        flight = self._flights.get(key, None)
+        is_new = flight is None
+        
+        if is_new:
+            flight = _Flight(key)
+            self._flights[key] = flight
+        else:
+            self._counters.inc("coalesced")
+            METRICS.inc("http_coalesced_requests_total")
+            
+        self._counters.inc("requests")
+        flight.waiters += 1
+        
+        handle = next(self._handles)
+        self._flight_of_handle[handle] = flight
+        
+        return handle, flight, is_new
+    
+    def _leave (self, handle):
+        with self._lock:
+            flight = self._flight_of_handle.pop(handle)
+            flight.waiters -= 1
+            last = flight.waiters == 0
+            
+            if last and self._flights.get(flight.key, None) is flight:
+                del self._flights[flight.key]
+                
+        return flight, last
+        
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        return self.request_many([url], header, status_codes,
+                                 max_age=[max_age], min_date=[min_date])[0]
+    
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        urls = list(urls)
+        max_ages = RequestManager._expand_argument(max_age, len(urls))
+        min_dates = RequestManager._expand_argument(min_date, len(urls))
+        
+        handles = []
+        new_flights = []
+        new_requests = []
+        
+        with self._lock:
+            for url, cmax_age, cmin_date in zip(urls, max_ages, min_dates):
+                key = SingleFlightRequestManager._get_flight_key(url, header, status_codes,
+                                                                  cmax_age, cmin_date)
+                handle, flight, is_new = self._join(key)
+                handles.append(handle)
+                
+                if is_new:
+                    new_flights.append(flight)
+                    new_requests.append((url, cmax_age, cmin_date))
+                    
+        if len(new_flights) != 0:
+            new_urls, new_max_ages, new_min_dates = zip(*new_requests)
+            
+            try:
+                inner_keys = self._reqman.request_many(list(new_urls), header,
+                                                       status_codes,
+                                                       max_age=list(new_max_ages),
+                                                       min_date=list(new_min_dates))
+            except Exception as e:
+                for flight in new_flights:
+                    flight.error = e
+                    flight.done.set()
+                    flight.sent.set()
+                    
+                for handle in handles:
+                    self._leave(handle)
+                    
+                raise
+            
+            for flight, inner_key in zip(new_flights, inner_keys):
+                flight.inner_key = inner_key
+                flight.sent.set()
+            
+        return handles
+    
+    def _resolve (self, flights):
+        # Fetches the responses of all flights no other caller is
+        # fetching already with one call to the wrapped manager.
+        # Failures are kept in the flights and raised per request.
+        claimed = []
+        
+        with self._lock:
+            for flight in flights:
+                if not flight.claimed:
+                    flight.claimed = True
+                    claimed.append(flight)
+                    
+        for flight in claimed:
+            flight.sent.wait()
+            
+        claimed = [flight for flight in claimed if flight.error is None]
+        
+        if self._reqman.get_batch_size() is None:
+            # Keeps a failing request from taking the others with it
+            batches = [[flight] for flight in claimed]
+        else:
+            batches = [claimed]
+        
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            
+            try:
+                responses = self._reqman.fetch_many([flight.inner_key for flight in batch])
+            except Exception as e:
+                for flight in batch:
+                    flight.error = e
+                    flight.done.set()
+            else:
+                for flight, response in zip(batch, responses):
+                    flight.response = response
+                    flight.done.set()
+                
+    def _get_parsed (self, flight, parser):
+        flight.done.wait()
+        
+        if flight.error is not None:
+            raise flight.error
+        
+        content, status_code = flight.response
+        
+        if parser is None:
+            return content, status_code
+        elif status_code != 200:
+            return None, status_code
+        
+        with flight.parse_lock:
+            if parser in flight.parsed:
+                self._counters.inc("coalesced_parses")
+            else:
+                flight.parsed[parser] = parser(content)
+                
+            return flight.parsed[parser], status_code
+        
+    def fetch_many_parsed (self, keys, parser):
+        with self._lock:
+            flights = [self._flight_of_handle[key] for key in keys]
+            
+        try:
+            self._resolve(flights)
+            
+            return [self._get_parsed(flight, parser) for flight in flights]
+        finally:
+            for key in keys:
+                self._leave(key)
+        
+    def fetch (self, key):
+        return self.fetch_many_parsed([key], None)[0]
+    
+    def fetch_many (self, keys):
+        return self.fetch_many_parsed(keys, None)
+            
+    def discard (self, key):
+        flight, last = self._leave(key)
+        
+        if last:
+            with self._lock:
+                unclaimed = not flight.claimed
+                flight.claimed = True
+                
+            if unclaimed:
+                flight.sent.wait()
+                
+                if flight.error is None:
+                    self._reqman.discard(flight.inner_key)
+                
+    def can_request (self):
+        return self._reqman.can_request()
+    
+    def get_batch_size (self):
+        return self._reqman.get_batch_size()
+
+class IdealoRequester ():
+    HEADERS_DICT = {
+            "Accept" : "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+            "Accept-Encoding" : "gzip, deflate, br",
+            "Accept-Language" : "de,en-US;q=0.7,en;q=0.3",
+            "Cache-Control" : "max-age=0",
+            "Connection" : "keep-alive",
+            "Host" : "www.idealo.de",
+            "Sec-Fetch-Dest" : "document",
+            "Sec-Fetch-Mode" : "navigate",
+            "Sec-Fetch-Site" : "same-origin",
+            "TE" : "trailers",
+            "Upgrade-Insecure-Requests" : "1",
+            "User-Agent" : "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0"
+        }
+    
+    URL_BASE = "https://www.idealo.de" 
+    PRODOFFERS_SEGMENT_FORMAT = URL_BASE+"/offerpage/offerlist/product/{:s}/start/{:d}/sort/default?includeFilters=0&excludeFilters="
+    API_FORMAT = URL_BASE+"/offerpage/pricechart/api/{:d}?period={:s}"
+    API_PERIODS = {
+            dt.timedelta(days=30) : "P1M",
+            dt.timedelta(days=90) : "P3M",
+            dt.timedelta(days=180) : "P6M",
+            dt.timedelta(days=365) : "P1Y",
+            dt.timedelta(days=2) : "P2D",
+            dt.timedelta(days=500) : "P500D"
+        }
+    SORTED_API_PERIODS = sorted(list(API_PERIODS.keys()))
+    CAT_START_FORMAT = URL_BASE+"/preisvergleich/ProductCategory/{:d}.html"
+    CAT_CONT_FORMAT = URL_BASE+"/preisvergleich/ProductCategory/{:d}I16-{:d}.html"
+    # Products per category listing page
+    CAT_PAGE_SIZE = PageParser.CAT_PAGE_SIZE
+    # Columns of the long price frame
+    PRICE_COLUMNS = ["ProductId", "Date", "Price"]
+    # Pages fetched ahead of the oldest page still being parsed
+    PARSE_AHEAD = 64
+    
+    def __init__ (self, request_manager, parser=None, parse_stage=None):
+        # Time to wait before each request in order to
+        # mitigate HTTP 429 Too Many Requests
+        
+        self._reqman = request_manager        
+        # Parser backend name, None for the fastest one installed, or
+        # a parser object such as a PageParser
+        if parser is None or isinstance(parser, str):
+            parser = get_parser(parser, url_base=IdealoRequester.URL_BASE)
+            
+        self._parser = parser
+        # Optional ParseStage, pages are parsed inline without
+        self._parse_stage = parse_stage
+        # Requested and parsed pages by page type, counted by the
+        # threads of the request manager and the pipeline stages
+        self._counters = SharedCounter()
+        
+    @property
+    def counters (self):
+        # Snapshot of the counters, e.g. requested_listing_pages
+        return self._counters.snapshot()
+        
+    @classmethod
+    def _observe_pages (cls, page_type, responses):
+        # Counts the responses by page type and status and observes
+        # the time waited for each of them
+        responses = iter(responses)
+        
+        while True:
+            start = time.perf_counter()
+            
+            try:
+                response = next(responses)
+            except StopIteration:
+                return
+            
+            METRICS.observe("idealo_page_wait_seconds", time.perf_counter() - start,
+                            page_type=page_type)
+            METRICS.inc("idealo_pages_total", page_type=page_type, status=response[1])
+            yield response
+    
+    def _stream_pages (self, page_type, urls, status_codes, max_age, min_date, parser):
+        urls = list(urls)
+        self._counters.inc("requested_"+page_type, len(urls))
+        
+        return IdealoRequester._observe_pages(page_type, self._reqman.stream(
+                urls,
+                IdealoRequester.HEADERS_DICT,
+                status_codes,
+                max_age=max_age,
+                min_date=min_date,
+                parser=parser
+            ))
+        
+    def _parse (self, entry_point, html):
+        # Returns the parsed dict or, with a parse stage, its Future.
+        # The parse stage is observed from submitting to the result,
+        # including the wait for a worker.
+        # parse_listing_page -> listing_pages
+        page_type = entry_point.__name__[len("parse_"):]+"s"
+        start = time.perf_counter()
+        
+        if self._parse_stage is None:
+            parsed = entry_point(html, self._parser)
+            METRICS.observe("idealo_parse_seconds", time.perf_counter() - start,
+                            page_type=page_type)
+            return parsed
+        else:
+            future = self._parse_stage.submit(entry_point, html, self._parser)
+            future.add_done_callback(lambda _: METRICS.observe(
+                    "idealo_parse_stage_seconds", time.perf_counter() - start,
+                    page_type=page_type
+                ))
+            return future
+        
+    @classmethod
+    def _resolve (cls, parsed):
+        if isinstance(parsed, Future):
+            return parsed.result()
+        else:
+            return parsed
+        
+    @classmethod
+    def _resolve_ahead (cls, keyed_responses):
+        # keyed_responses: [(Key, (Parsed or Future, Status Code)), ...]
+        # Yields (Key, Parsed, Status Code) in order. Up to PARSE_AHEAD
+        # further pages are fetched while the parse stage works on
+        # the pages before them.
+        pending = deque()
+        
+        for key, (parsed, status_code) in keyed_responses:
+            pending.append((key, parsed, status_code))
+            
+            while (len(pending) != 0 and
+                   (len(pending) > cls.PARSE_AHEAD or
+                    not isinstance(pending[0][1], Future) or pending[0][1].done())):
+                key, parsed, status_code = pending.popleft()
+                yield key, cls._resolve(parsed), status_code
+                
+        while len(pending) != 0:
+            key, parsed, status_code = pending.popleft()
+            yield key, cls._resolve(parsed), status_code
+    
+    # Parsers handed to the request manager. Bound methods of one
+    # requester compare equal, so coalesced requests share the result.
+    def _parse_listing_page (self, html):
+        self._counters.inc("parsed_listing_pages")
+        return self._parse(parse_listing_page, html)
+    
+    def _parse_product_detail_page (self, html):
+        self._counters.inc("parsed_product_detail_pages")
+        return self._parse(parse_product_detail_page, html)
+    
+    def _parse_variant_page (self, html):
+        self._counters.inc("parsed_variant_pages")
+        return self._parse(parse_variant_page, html)
+    
+    def _parse_category_page (self, html):
+        return self._parse(parse_category_page, html)
+    
+    @classmethod
+    def get_api_period_for_timedelta (cls, td):
+        start = dt.timedelta(seconds=0)
+        
+        for i in range(0, len(cls.SORTED_API_PERIODS)):
+            end = cls.SORTED_API_PERIODS[i]
+            
+            if (td >= start) and (td < end):
+                return cls.API_PERIODS[end]
+            
+            start = end
+            
+        return cls.API_PERIODS[cls.SORTED_API_PERIODS[-1]]
+    
+    @classmethod
+    def get_covering_api_period (cls, td):
+        # Smallest period reaching back at least td, the longest one if
+        # none does
+        for end in cls.SORTED_API_PERIODS:
+            if td <= end:
+                return cls.API_PERIODS[end]
+            
+        return cls.API_PERIODS[cls.SORTED_API_PERIODS[-1]]
+        
+        
+    
+    @classmethod
+    def decode_price_charts (cls, product_ids, contents):
+        # Decodes the price chart responses of the given products into
+        # a long frame with PRICE_COLUMNS. The dates of all products
+        # are converted at once.
+        get_x = itemgetter("x")
+        get_y = itemgetter("y")
+        
+        dates = []
+        prices = []
+        counts = []
+        
+        for content in contents:
+            data = _json_loads(content)["data"]
+            
+            dates.extend(map(get_x, data))
+            # Points without a price are null, converted to NaN
+            prices.append(np.array(list(map(get_y, data)), dtype=np.float64))
+            counts.append(len(data))
+            
+        if len(prices) != 0:
+            prices = np.concatenate(prices)
+        else:
+            prices = np.empty(0, dtype=np.float64)
+        
+        return pd.DataFrame({
+                cls.PRICE_COLUMNS[0] : np.repeat(np.asarray(product_ids, dtype=np.int64), counts),
+                cls.PRICE_COLUMNS[1] : pd.to_datetime(pd.Index(dates, dtype=object)),
+                cls.PRICE_COLUMNS[2] : prices
+            })
+        
+    @classmethod
+    def split_price_frame (cls, frame):
+        # Long price frame -> {Product ID -> Series}
+        product_id, date, price = cls.PRICE_COLUMNS
+        
+        return {
+                pid : pd.Series(group[price].values, index=pd.Index(group[date].values))
+                for pid, group in frame.groupby(product_id, sort=False)
+            }
+    
+    def get_api (self, product_id, max_age=None, min_date=None, period=None, long_format=False):
+        # Returns the price history as Series, or as {Product ID -> Series}
+        # for several products. With long_format, a single frame with
+        # PRICE_COLUMNS is returned instead.
+        if period is None:
+            period = "P500D"
+        
+        if isinstance(product_id, int):
+            url = IdealoRequester.API_FORMAT.format(product_id, period)
+            self._counters.inc("requested_price_charts")
+            html, status_code = self._reqman.fetch(
+                        self._reqman.request(
+                                url, 
+                                IdealoRequester.HEADERS_DICT, 
+                                max_age=max_age, 
+                                min_date=min_date
+                        )
+            )
+            METRICS.inc("idealo_pages_total", page_type="price_charts", status=status_code)
+            
+            frame = IdealoRequester.decode_price_charts([product_id], [html])
+            
+            if long_format:
+                return frame
+            
+            return pd.Series(
+                    frame[IdealoRequester.PRICE_COLUMNS[2]].values, 
+                    index=pd.Index(frame[IdealoRequester.PRICE_COLUMNS[1]].values)
+                )
+        elif isinstance(product_id, (list, tuple)):
+            if not isinstance(max_age, (list, tuple)):
+                max_age = [max_age for _ in range(len(product_id))]
+                
+            if not isinstance(min_date, (list, tuple)):
+                min_date = [min_date for _ in range(len(product_id))]
+                
+            if not isinstance(period, (list, tuple)):
+                period = [period for _ in range(len(product_id))]
+            
+            urls = [
+                    IdealoRequester.API_FORMAT.format(pid, cperiod)
+                    for pid, cperiod in zip(product_id, period)
+                ]
+            self._counters.inc("requested_price_charts", len(urls))
+            responses = IdealoRequester._observe_pages("price_charts", self._reqman.stream(
+                    urls,
+                    IdealoRequester.HEADERS_DICT,
+                    max_age=max_age,
+                    min_date=min_date
+                ))
+            
+            frame = IdealoRequester.decode_price_charts(
+                    product_id,
+                    [html for html, _ in responses]
+                )
+            
+            if long_format:
+                return frame
+            
+            datas = IdealoRequester.split_price_frame(frame)
+            
+            # Products without any price points
+            for pid in product_id:
+                if pid not in datas:
+                    datas[pid] = pd.Series([], index=pd.DatetimeIndex([]), dtype=np.float64)
+            
+            return datas
+        else:
+            errmsg = "Wrong product id type: {:s}".format(str(type(product_id)))
+            raise TypeError(errmsg)
+    
+    @classmethod
+    def product_offer_url_to_id (cls, url):
+        return product_offer_url_to_id(url)
+    
+    @classmethod
+    def scrape_items_from_product_category (cls, html):
+        return get_parser(url_base=cls.URL_BASE).parse_listing(html)[0]
+        
+    def get_name_of_category (self, category_id, max_age=None, min_date=None):
+        # Requests the first listing page for the name alone, see
+        # get_listing_of_category for the name along with the products
+        url = IdealoRequester.CAT_START_FORMAT.format(category_id)
+        self._counters.inc("requested_category_pages")
+        parsed, status_code = self._reqman.fetch_parsed(
+            self._reqman.request(
+                url,
+                IdealoRequester.HEADERS_DICT,
+                200,
+                max_age=max_age,
+                min_date=min_date
+            ),
+            self._parse_category_page
+        )
+        METRICS.inc("idealo_pages_total", page_type="category_pages", status=status_code)
+        
+        return IdealoRequester._resolve(parsed)["category_name"]
+        
+    @classmethod
+    def _get_category_page_url (cls, category_id, page):
+        if page == 0:
+            return cls.CAT_START_FORMAT.format(category_id)
+        else:
+            return cls.CAT_CONT_FORMAT.format(category_id, page * cls.CAT_PAGE_SIZE)
+    
+    def _load_category_pages (self, category_id, page_indices, pages, max_age, min_date):
+        # Stores the listings of the existing pages in pages
+        # ({Page Index : (Products, Page Count, Category Name)}) and
+        # returns the indices of the pages behind the final page
+        page_indices = list(page_indices)
+        urls = [
+                IdealoRequester._get_category_page_url(category_id, page)
+                for page in page_indices
+            ]
+        responses = self._stream_pages(
+            "listing_pages",
+            urls,
+            [200, 301],
+            max_age,
+            min_date,
+            self._parse_listing_page
+        )
+        
+        missing = []
+        
+        for page, parsed, status_code in IdealoRequester._resolve_ahead(zip(page_indices, responses)):
+            if status_code == 301:
+                missing.append(page)
+            else:
+                pages[page] = (parsed["products"], parsed["page_count"], parsed["category_name"])
+                
+        return missing
+        
+    def get_listing_of_category (self, category_id, max_age=None, min_date=None):
+        # https://www.idealo.de/preisvergleich/ProductCategory/16073.html
+        # https://www.idealo.de/preisvergleich/ProductCategory/16073I16-15.html
+        # Index zu hoch -> 301 Moved Permanently, Verweis auf Anfangsseite
+        # Returns (Category Name or None, {Product ID : (Name, Product URL)}),
+        # the name is read from the first listing page
+        
+        # {Page Index : ({Product ID : (Name, Product URL)}, Page Count, Category Name)}
+        pages = {}
+        # Requests for pages behind the final page
+        wasted = 0
+        
+        missing = self._load_category_pages(category_id, [0], pages, max_age, min_date)
+        wasted += len(missing)
+        
+        if 0 in pages:
+            _, page_count, category_name = pages[0]
+        else:
+            page_count = None
+            category_name = None
+            
+        # Lowest page index known to not exist
+        first_missing = None
+        
+        if page_count is None:
+            if 0 in pages and len(pages[0][0]) < IdealoRequester.CAT_PAGE_SIZE:
+                first_missing = 1
+        else:
+            print("Loading {:d} listing pages of {:d}".format(page_count, category_id))
+            missing = self._load_category_pages(category_id, range(1, page_count),
+                                                pages, max_age, min_date)
+            wasted += len(missing)
+            
+            if len(missing) != 0:
+                first_missing = min(missing)
+            elif len(pages[page_count - 1][0]) < IdealoRequester.CAT_PAGE_SIZE:
+                # A page that is not full is the final page
+                first_missing = page_count
+                
+        if first_missing is None and len(pages) != 0:
+            # Page count unknown or possibly too low: exponential
+            # probing for a missing page, then bisection for the last
+            # existing one
+            print("Probing listing pages of {:d}".format(category_id))
+            last_existing = max(pages)
+            step = 1
+            
+            while first_missing is None:
+                probe = last_existing + step
+                
+                if len(self._load_category_pages(category_id, [probe], pages,
+                                                 max_age, min_date)) != 0:
+                    first_missing = probe
+                    wasted += 1
+                elif len(pages[probe][0]) < IdealoRequester.CAT_PAGE_SIZE:
+                    last_existing = probe
+                    first_missing = probe + 1
+                else:
+                    last_existing = probe
+                    step *= 2
+                    
+            while first_missing - last_existing > 1:
+                probe = (last_existing + first_missing) // 2
+                
+                if len(self._load_category_pages(category_id, [probe], pages,
+                                                 max_age, min_date)) != 0:
+                    first_missing = probe
+                    wasted += 1
+                elif len(pages[probe][0]) < IdealoRequester.CAT_PAGE_SIZE:
+                    last_existing = probe
+                    first_missing = probe + 1
+                else:
+                    last_existing = probe
+                    
+            remaining = [x for x in range(1, first_missing) if x not in pages]
+            wasted += len(self._load_category_pages(category_id, remaining, pages,
+                                                    max_age, min_date))
+        
+        self._counters.inc("wasted_listing_requests", wasted)
+        print("Category {:d}: {:d} listing pages, {:d} wasted requests".format(
+                category_id, len(pages), wasted
+            ))
+        
+        all_products = {}
+        
+        for page in sorted(pages):
+            all_products.update(pages[page][0])
+        
+        return category_name, all_products
+    
+    def get_products_of_category (self, category_id, max_age=None, min_date=None):
+        # Returns {Product ID : (Name, Product URL)}
+        return self.get_listing_of_category(category_id, max_age=max_age, min_date=min_date)[1]
+    
+    @classmethod
+    def scrape_variants_from_product_detail (cls, html):
+        return get_parser(url_base=cls.URL_BASE).parse_variants(html)
+    
+    def iter_product_variants_of_product_detail_page (self, pdp_dict, max_age=None, min_date=None):
+        # pdp_dict: {Product ID : Product Detail URL}
+        # Yields (Product ID, Variant Product ID, Variant URL, Details)
+        # per variant. A page without variants is its own variant and
+        # comes with its (Product Name, Datasheet), the other variants
+        # with None.
+        product_ids = list(pdp_dict.keys())
+        responses = self._stream_pages(
+                "product_detail_pages",
+                [pdp_dict[product_id] for product_id in product_ids],
+                200,
+                max_age,
+                min_date,
+                self._parse_product_detail_page
+            )
+        
+        for product_id, parsed, _ in IdealoRequester._resolve_ahead(zip(product_ids, responses)):
+            if parsed["variant_urls"] is None:
+                detail_url = pdp_dict[product_id]
+                variant_id = int(IdealoRequester.product_offer_url_to_id(detail_url))
+                yield product_id, variant_id, detail_url, IdealoRequester._to_product_details(parsed)
+            else:
+                for variant_url in parsed["variant_urls"]:
+                    variant_id = int(IdealoRequester.product_offer_url_to_id(variant_url))
+                    yield product_id, variant_id, variant_url, None
+    
+    def get_product_variants_of_product_detail_page (self, pdp_dict, max_age=None, min_date=None,
+                                                     details=None):
+        # pdp_dict: {Product ID : Product Detail URL}
+        # details: Optional dict, filled with
+        # {Variant Product ID : (Product Name, Datasheet)} for the
+        # pages without variants
+        # Returns {Product ID : set(Variant URLs)}
+        variant_urls = {}
+        
+        for product_id, variant_id, variant_url, variant_details in \
+                self.iter_product_variants_of_product_detail_page(pdp_dict, max_age=max_age,
+                                                                  min_date=min_date):
+            variant_urls.setdefault(product_id, set()).add(variant_url)
+            
+            if details is not None and variant_details is not None:
+                details[variant_id] = variant_details
+        
+        return variant_urls
+    
+    @classmethod
+    def _to_product_details (cls, parsed):
+        # Parsed Page -> (Product Name, Datasheet)
+        return parsed["product_name"], datasheet_from_rows(parsed["datasheet"])
+    
+    @classmethod
+    def scrape_product_details (cls, html):
+        return cls._to_product_details(
+                parse_variant_page(html, get_parser(url_base=cls.URL_BASE))
+            )
+    
+    def iter_details_from_variant_pages (self, variant_page_dict, max_age=None, min_date=None):
+        # variant_page_dict: {Product ID : Variant Page URL}
+        # Yields (Product ID, (Product Name, Datasheet))
+        product_ids = list(variant_page_dict.keys())
+        responses = self._stream_pages(
+                "variant_pages",
+                [variant_page_dict[product_id] for product_id in product_ids],
+                200,
+                max_age,
+                min_date,
+                self._parse_variant_page
+            )
+        
+        for product_id, parsed, _ in IdealoRequester._resolve_ahead(zip(product_ids, responses)):
+            yield product_id, IdealoRequester._to_product_details(parsed)
+            
+    def get_details_from_variant_pages (self, variant_page_dict, max_age=None, min_date=None):
+        # variant_page_dict: {Product ID : Variant Page URL}
+        # Returns {Product ID : (Product Name, Datasheet)}
+        return dict(self.iter_details_from_variant_pages(variant_page_dict, max_age=max_age,
+                                                         min_date=min_date))
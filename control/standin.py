@@ -0,0 +1,333 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import json
+import random
+import re
+import threading
+import time
+import datetime as dt
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StandInCatalog ():
+    '''
+    Synthetic idealo catalog. Every page is generated from the IDs on
+    request, so catalogs of any size need no memory. Categories are
+    numbered from first_category_id, the products of a category follow
+    each other and a share of them lists variants instead of being the
+    product itself.
+    '''
+    PAGE_SIZE = 15
+    PRODUCT_BASE = 1000000
+    VARIANT_BASE = 500000000
+    PERIOD_DAYS = {
+            "P2D" : 2,
+            "P1M" : 30,
+            "P3M" : 90,
+            "P6M" : 180,
+            "P1Y" : 365,
+            "P500D" : 500
+        }
+
+    def __init__ (self, categories=1, products_per_category=1000, first_category_id=1000,
+                  variant_share=0.2, variants=3, datasheet_rows=20, seed=0):
+        self.categories = categories
+        self.products_per_category = products_per_category
+        self.first_category_id = first_category_id
+        self.variant_share = variant_share
+        self.variants = variants
+        self.datasheet_rows = datasheet_rows
+        self.seed = seed
+
+    def _random (self, *key):
+        return random.Random("{:d}-{:s}".format(self.seed, "-".join(str(x) for x in key)))
+
+    def _category_index (self, category_id):
+        index = category_id - self.first_category_id
+
+        if index < 0 or index >= self.categories:
+            return None
+
+        return index
+
+    def get_products (self, category_id):
+        index = self._category_index(category_id)
+
+        if index is None:
+            return range(0)
+
+        start = StandInCatalog.PRODUCT_BASE + index * self.products_per_category
+        return range(start, start + self.products_per_category)
+
+    def _is_product (self, product_id):
+        return (StandInCatalog.PRODUCT_BASE <= product_id and
+                product_id < StandInCatalog.PRODUCT_BASE + self.categories * self.products_per_category)
+
+    def _is_variant (self, product_id):
+        parent_id = (product_id - StandInCatalog.VARIANT_BASE) // self.variants
+        return product_id >= StandInCatalog.VARIANT_BASE and self._is_product(parent_id)
+
+    def get_variants (self, product_id):
+        # Variant IDs of the product, None if it has no variants
+        if self._random(product_id, "variants").random() >= self.variant_share:
+            return None
+
+        start = StandInCatalog.VARIANT_BASE + product_id * self.variants
+        return range(start, start + self.variants)
+
+    @classmethod
+    def _product_url (cls, product_id):
+        return "/preisvergleich/OffersOfProduct/{:d}_-produkt-{:d}.html".format(product_id, product_id)
+
+    def listing_page (self, category_id, offset):
+        # None behind the final page
+        products = self.get_products(category_id)
+
+        if len(products) == 0 or offset >= len(products) or offset % StandInCatalog.PAGE_SIZE != 0:
+            return None
+
+        page_count = -(-len(products) // StandInCatalog.PAGE_SIZE)
+        items = "".join(
+                '<div class="offerList-item"><a class="offerList-itemWrapper" href="{:s}">'
+                '<div class="offerList-item-detailsWrapper">'
+                '<div class="offerList-item-description-title">Produkt {:d}</div>'
+                '</div></a></div>'.format(StandInCatalog._product_url(product_id), product_id)
+                for product_id in products[offset:offset+StandInCatalog.PAGE_SIZE]
+            )
+        pagination = "".join(
+                '<a class="pagination-item">{:d}</a>'.format(page)
+                for page in sorted(set([1, 2, 3, page_count]))
+                if page <= page_count
+            )
+
+        return ('<html><head><meta charset="utf-8"><title>Kategorie {:d}</title></head><body>'
+                '<div class="category-headline"><h1 class="offerList-title">Kategorie {:d}</h1>'
+                '<span>{:d} Produkte</span></div>'
+                '<div class="resultlist">{:s}</div>'
+                '<div class="pagination">{:s}</div>'
+                '</body></html>').format(category_id, category_id, len(products), items, pagination)
+
+    def _datasheet (self, product_id):
+        rng = self._random(product_id, "datasheet")
+        rows = []
+
+        for header in range(max(1, self.datasheet_rows // 5)):
+            rows.append('<li class="datasheet-listItem--category">\n\tGruppe {:d}\n</li><li><ul>'.format(header))
+
+            for row in range(5):
+                rows.append('<li><span>Merkmal {:d}-{:d}</span><span>{:d} GB</span></li>'.format(
+                        header, row, rng.randint(1, 4096)
+                    ))
+
+            rows.append('</ul></li>')
+
+        return '<div id="datasheet"><ul class="datasheet-list">{:s}</ul></div>'.format("".join(rows))
+
+    def detail_page (self, product_id):
+        # Product detail page or variant page, None for unknown IDs
+        if self._is_product(product_id):
+            variants = self.get_variants(product_id)
+            title = '<span>Produkt {:d}</span>'.format(product_id)
+        elif self._is_variant(product_id):
+            variants = None
+            parent_id = (product_id - StandInCatalog.VARIANT_BASE) // self.variants
+            title = '<span>Produkt {:d}</span><span>Variante {:d}</span>'.format(parent_id, product_id)
+        else:
+            return None
+
+        if variants is not None:
+            variants = '<div id="product-variants"><ul>{:s}</ul></div>'.format("".join(
+                    '<li><a class="productVariants-listItemWrapper" href="{:s}">Variante</a></li>'.format(
+                            StandInCatalog._product_url(variant_id)
+                        )
+                    for variant_id in variants
+                ))
+        else:
+            variants = ""
+
+        return ('<html><head><meta charset="utf-8"></head><body>'
+                '<h1 class="oopStage-title">{:s}</h1>{:s}{:s}'
+                '</body></html>').format(title, variants, self._datasheet(product_id))
+
+    def price_chart (self, product_id, period):
+        # Price chart JSON, None for unknown IDs or periods
+        if not (self._is_product(product_id) or self._is_variant(product_id)):
+            return None
+
+        days = StandInCatalog.PERIOD_DAYS.get(period, None)
+
+        if days is None:
+            return None
+
+        # The shorter periods are the end of the longest one, so the
+        # prices of a day do not depend on the period
+        rng = self._random(product_id, "prices")
+        today = dt.date.today()
+        price = rng.uniform(10, 1000)
+        data = []
+
+        for day in range(max(StandInCatalog.PERIOD_DAYS.values()), 0, -1):
+            price = max(1.0, price * rng.uniform(0.97, 1.03))
+
+            if day <= days:
+                data.append({
+                        "x" : (today - dt.timedelta(days=day)).strftime("%Y-%m-%d"),
+                        "y" : round(price, 2)
+                    })
+
+        return json.dumps({"data" : data})
+
+class _StandInHandler (BaseHTTPRequestHandler):
+    CATEGORY_PATTERN = re.compile(r"^/preisvergleich/ProductCategory/(\d+)(?:I16-(\d+))?\.html$")
+    PRODUCT_PATTERN = re.compile(r"^/preisvergleich/OffersOfProduct/(\d+)(?:_-[^/]*)?\.html$")
+    PRICE_CHART_PATTERN = re.compile(r"^/offerpage/pricechart/api/(\d+)\?period=(\w+)$")
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message (self, format, *args):
+        pass
+
+    def _send (self, status_code, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status_code)
+
+    def _route (self):
+        catalog = self.server.catalog
+
+        match = _StandInHandler.CATEGORY_PATTERN.match(self.path)
+
+        if match is not None:
+            category_id = int(match.group(1))
+            page = catalog.listing_page(category_id, int(match.group(2) or 0))
+
+            if page is None:
+                # idealo redirects behind the final page
+                location = "/preisvergleich/ProductCategory/{:d}.html".format(category_id)
+                return 301, b"", "text/html; charset=utf-8", {"Location" : location}
+
+            return 200, page.encode("utf-8"), "text/html; charset=utf-8", None
+
+        match = _StandInHandler.PRODUCT_PATTERN.match(self.path)
+
+        if match is not None:
+            page = catalog.detail_page(int(match.group(1)))
+
+            if page is not None:
+                return 200, page.encode("utf-8"), "text/html; charset=utf-8", None
+
+        match = _StandInHandler.PRICE_CHART_PATTERN.match(self.path)
+
+        if match is not None:
+            chart = catalog.price_chart(int(match.group(1)), match.group(2))
+
+            if chart is not None:
+                return 200, chart.encode("utf-8"), "application/json", None
+
+        return 404, b"", "text/html; charset=utf-8", None
+
+    def do_GET (self):
+        delay = self.server.get_delay()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.server.is_throttled():
+            self._send(429, headers={"Retry-After" : str(self.server.retry_after)})
+            return
+
+        status_code, body, content_type, headers = self._route()
+        self._send(status_code, body, content_type, headers)
+
+class StandInServer (ThreadingHTTPServer):
+    '''
+    Local HTTP server answering the URLs IdealoRequester builds from a
+    StandInCatalog. Every response is delayed by latency (+- jitter)
+    seconds. A share error_rate of the requests and every request above
+    max_rate requests per second is answered with 429 Too Many Requests,
+    asking to retry after retry_after seconds.
+    Point StandardRequestManager at it with
+    rewrite_hosts={IdealoRequester.URL_BASE : server.url_base}.
+    '''
+    daemon_threads = True
+
+    def __init__ (self, catalog, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                  error_rate=0.0, max_rate=None, retry_after=1, seed=0):
+        super().__init__((host, port), _StandInHandler)
+
+        self.catalog = catalog
+        self.retry_after = retry_after
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._max_rate = max_rate
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # Start of the current second and the requests within it
+        self._window = (0, 0)
+        # Status Code -> Responses
+        self.counters = Counter()
+
+        self._thread = None
+
+    @property
+    def url_base (self):
+        host, port = self.server_address[:2]
+        return "http://{:s}:{:d}".format(host, port)
+
+    def count (self, status_code):
+        with self._lock:
+            self.counters[status_code] += 1
+
+    def get_delay (self):
+        with self._lock:
+            return max(0.0, self._latency + self._random.uniform(-self._jitter, self._jitter))
+
+    def is_throttled (self):
+        with self._lock:
+            if self._random.random() < self._error_rate:
+                return True
+
+            if self._max_rate is None:
+                return False
+
+            second = int(time.monotonic())
+            window_second, requests = self._window
+
+            if window_second != second:
+                window_second, requests = second, 0
+
+            self._window = (window_second, requests + 1)
+            return requests >= self._max_rate
+
+    def start (self):
+        # Serves in a background thread
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop (self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self.server_close()
+
+    def __enter__ (self):
+        return self.start()
+
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,107 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Checks that all installed parser backends extract the same fields
+from saved idealo pages and measures their throughput.
+
+Usage: python -m mains.benchmark_parsing <directory> [repetitions]
+
+The directory holds pages saved as listing_*.html (category listing
+pages), detail_*.html (product detail pages) and variant_*.html
+(variant pages), e.g. tests/pages.
+'''
+import sys
+import os.path as osp
+import glob
+import time
+import tracemalloc
+from control.parsing import get_parser, get_available_parsers
+
+PAGE_TYPES = {
+        "listing" : lambda parser, html: parser.parse_listing(html),
+        "detail" : lambda parser, html: parser.parse_product_detail_page(html),
+        "variant" : lambda parser, html: parser.parse_details(html)
+    }
+
+def load_pages (directory):
+    # [(Page Type, Path, Content), ...]
+    pages = []
+
+    for page_type in PAGE_TYPES:
+        for path in sorted(glob.glob(osp.join(directory, page_type+"_*.html"))):
+            with open(path, "rb") as f:
+                pages.append((page_type, path, f.read()))
+
+    return pages
+
+def parse_page (parser, page_type, html):
+    try:
+        return PAGE_TYPES[page_type](parser, html)
+    except Exception as e:
+        return "Failed: {:s}".format(repr(e))
+
+def check_equivalence (pages, reference, parser):
+    # Returns the paths of the pages parsed differently than
+    # by the reference parser
+    return [
+            path
+            for page_type, path, html in pages
+            if parse_page(parser, page_type, html) != parse_page(reference, page_type, html)
+        ]
+
+def benchmark (pages, parser, repetitions):
+    # Returns the parsed pages per second
+    start = time.perf_counter()
+
+    for _ in range(repetitions):
+        for page_type, _, html in pages:
+            parse_page(parser, page_type, html)
+
+    return len(pages) * repetitions / (time.perf_counter() - start)
+
+def peak_allocation (pages, parser):
+    # Returns the mean peak of allocated bytes while parsing one page
+    peaks = []
+
+    for page_type, _, html in pages:
+        tracemalloc.start()
+        parse_page(parser, page_type, html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        peaks.append(peak)
+
+    return sum(peaks) / len(peaks)
+
+def main ():
+    directory = sys.argv[1]
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    pages = load_pages(directory)
+    print("Pages: {:d}".format(len(pages)))
+
+    if len(pages) == 0:
+        return
+
+    reference = get_parser("html.parser", partial=False)
+
+    for name in get_available_parsers():
+        for partial in (False, True):
+            parser = get_parser(name, partial=partial)
+            mismatches = check_equivalence(pages, reference, parser)
+            pages_per_second = benchmark(pages, parser, repetitions)
+            peak = peak_allocation(pages, parser)
+
+            print("{:12s} {:7s} {:8.1f} pages/s, {:8.1f} ms/page, {:8.0f} KiB peak, {:d} mismatches".format(
+                    name, "partial" if partial else "full",
+                    pages_per_second, 1000 / pages_per_second,
+                    peak / 1024, len(mismatches)
+                ))
+
+            for path in mismatches:
+                print("    "+path)
+
+if __name__ == '__main__':
+    main()
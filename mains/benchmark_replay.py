@@ -0,0 +1,117 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Runs Loader.load_full_category and Loader.update_prices against a
+recorded category and an SQLite database and reports per stage the wall
+time, requests per second and the time spent parsing pages and in the
+database.
+
+Usage:
+    python -m mains.benchmark_replay record <archive> <category id>
+    python -m mains.benchmark_replay replay <archive> <category id> [latency] [jitter]
+    python -m mains.benchmark_replay standin <URL base> <category id>
+
+record fetches the category from idealo.de and writes every response to
+the archive, replay serves them back with the given latency and jitter
+in seconds. standin fetches the category from a stand-in server (see
+mains.standin_server), e.g. http://127.0.0.1:8080. Replay shortly after recording: update_prices chooses the
+price chart periods by the age of the stored prices.
+'''
+import sys
+import os.path as osp
+import tempfile
+import time
+import datetime as dt
+from collections import Counter
+from control.scraping import IdealoRequester, StandardRequestManager,\
+    SingleFlightRequestManager
+from control.replay import RecordingRequestManager, ReplayRequestManager
+from control.parsing import get_parser
+from control.loader import Loader
+from model.storage import SQLiteStorage
+
+
+class TimingProxy ():
+    # Forwards to target and adds the time spent in its methods to
+    # timings[stage]
+    def __init__ (self, target, timings, stage):
+        self._target = target
+        self._timings = timings
+        self._stage = stage
+
+    def __getattr__ (self, name):
+        value = getattr(self._target, name)
+
+        if not callable(value):
+            return value
+
+        def timed (*args, **kwargs):
+            start = time.perf_counter()
+
+            try:
+                return value(*args, **kwargs)
+            finally:
+                self._timings[self._stage] += time.perf_counter() - start
+
+        return timed
+
+def run_stages (loader, request_manager, timings, category_id):
+    stages = [
+            ("load_full_category", lambda: loader.load_full_category(category_id)),
+            ("update_prices", lambda: loader.update_prices(dt.timedelta(seconds=0)))
+        ]
+
+    for name, stage in stages:
+        timings_before = Counter(timings)
+        requests_before = request_manager.counters["requests"]
+
+        start = time.perf_counter()
+        stage()
+        wall = time.perf_counter() - start
+
+        requests = request_manager.counters["requests"] - requests_before
+        stage_timings = timings - timings_before
+
+        print("{:20s} {:8.2f} s wall, {:6d} requests, {:8.1f} requests/s, {:8.2f} s parse, {:8.2f} s db".format(
+                name, wall, requests, requests / wall if wall > 0 else 0.0,
+                stage_timings["parse"], stage_timings["db"]
+            ))
+
+def main ():
+    mode, source, category_id = sys.argv[1], sys.argv[2], int(sys.argv[3])
+
+    if mode == "record":
+        request_manager = RecordingRequestManager(StandardRequestManager(), source)
+    elif mode == "replay":
+        latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+        jitter = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+        request_manager = ReplayRequestManager(source, latency=latency, jitter=jitter)
+    elif mode == "standin":
+        request_manager = StandardRequestManager(
+                rewrite_hosts={IdealoRequester.URL_BASE : source}
+            )
+    else:
+        raise ValueError("Unknown mode: {:s}".format(mode))
+
+    timings = Counter()
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SQLiteStorage(osp.join(directory, "benchmark.sqlite"))
+
+        parser = TimingProxy(get_parser(url_base=IdealoRequester.URL_BASE), timings, "parse")
+        requester = IdealoRequester(SingleFlightRequestManager(request_manager), parser=parser)
+
+        loader = Loader(TimingProxy(storage, timings, "db"), requester)
+
+        try:
+            run_stages(loader, request_manager, timings, category_id)
+        finally:
+            storage.close()
+
+            if mode == "record":
+                request_manager.close()
+
+if __name__ == '__main__':
+    main()
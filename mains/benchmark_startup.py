@@ -0,0 +1,77 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Measures how fast the command line of mains.main starts: the wall time
+of --help and of the --help of every command in a new interpreter, and
+the heavy modules each of them imported.
+
+Usage: python -m mains.benchmark_startup [repetitions]
+'''
+import sys
+import subprocess
+import statistics
+import time
+
+
+COMMANDS = [
+        [],
+        ["run"],
+        ["update-prices"],
+        ["update-categories"],
+        ["load-category"],
+        ["analyse"],
+        ["export"]
+    ]
+# Modules the commands should only import when they run
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "bs4", "mysql.connector", "requests",
+                 "webrequestmanager"]
+# Runs mains.main with argv and prints the heavy modules imported
+PROBE = """
+import sys
+import mains.main
+try:
+    mains.main.main(sys.argv[1:])
+except SystemExit:
+    pass
+print(",".join(m for m in {:s} if m in sys.modules), file=sys.stderr)
+""".format(repr(HEAVY_MODULES))
+
+def measure (argv, repetitions):
+    # Returns (Median Seconds, Heavy Modules Imported)
+    timings = []
+
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", PROBE] + argv + ["--help"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                universal_newlines=True, check=True)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), result.stderr.strip()
+
+def measure_interpreter (repetitions):
+    # Median seconds of a bare interpreter for comparison
+    timings = []
+
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+def main ():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    baseline = measure_interpreter(repetitions)
+    print("{:30s} {:8.3f} s".format("python -c pass", baseline))
+
+    for argv in COMMANDS:
+        seconds, imported = measure(argv, repetitions)
+        print("{:30s} {:8.3f} s  heavy imports: {:s}".format(
+                " ".join(argv + ["--help"]), seconds, imported or "none"
+            ))
+
+if __name__ == '__main__':
+    main()
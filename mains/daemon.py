@@ -0,0 +1,76 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Runs the category and price updates of main continuously at a steady
+request rate. SIGTERM or Ctrl+C finishes the work in progress and exits.
+
+The metrics are served at http://127.0.0.1:<metrics port>/metrics and
+written to metrics.json on exit. Set IDEALO_PROFILE to profile the
+stages, see StageProfiler.from_environ. The pages are parsed in worker
+processes, which are not profiled, see Loader.
+
+Usage: python -m mains.daemon [requests per second] [metrics port]
+'''
+import sys
+import json
+import signal
+import datetime as dt
+from contextlib import nullcontext
+from control.scraping import IdealoRequester, WebRequestManager,\
+    SingleFlightRequestManager, RateLimitedRequestManager, RateLimiter
+from control.loader import Loader
+from control.daemon import UpdateDaemon
+from control.parsing import ParseStage
+from control.metrics import METRICS, MetricsServer
+from control.profiling import StageProfiler
+from model.storage import MySQLStorage
+from webrequestmanager.control.api import WebRequestAPIClient
+
+
+def main ():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    metrics_port = int(sys.argv[2]) if len(sys.argv) > 2 else 9464
+
+    with open("credentials.json", "r") as f:
+        credentials = json.load(f)
+
+    storage = MySQLStorage("192.168.188.23", credentials["user"], credentials["password"],
+                           persistent=True)
+    api = WebRequestAPIClient("http://172.25.0.2", 35353)
+    # Bursts of one second keep the rate flat, see RateLimiter.for_rate
+    request_manager = SingleFlightRequestManager(
+            RateLimitedRequestManager(
+                WebRequestManager(api, dt.timedelta(weeks=54)),
+                rate_limiter=RateLimiter.for_rate(rate)
+            )
+        )
+
+    parse_stage = ParseStage()
+    requester = IdealoRequester(request_manager, parse_stage=parse_stage)
+    profiler = StageProfiler.from_environ()
+    loader = Loader(storage, requester, profiler=profiler)
+
+    daemon = UpdateDaemon(loader, dt.timedelta(days=31*9), dt.timedelta(days=7))
+
+    def stop (signum, frame):
+        print("Received signal {:d}, finishing the work in progress.".format(signum))
+        daemon.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    with parse_stage, MetricsServer(port=metrics_port), \
+            (nullcontext() if profiler is None else profiler):
+        daemon.run()
+
+    storage.close()
+    print("Requests: {:d}, coalesced: {:d}".format(
+            request_manager.counters["requests"],
+            request_manager.counters["coalesced"]
+        ))
+    METRICS.write_summary("metrics.json")
+
+if __name__ == '__main__':
+    main()
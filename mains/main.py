@@ -1,269 +1,284 @@
-# coding=iso-8859-1
-'''
-Created on 05.01.2022
-
-@author: larsw
-'''
-from pprint import pprint
-from control.scraping import IdealoRequester, WebRequestManager
-from control.loader import Loader
-from model.storage import MySQLStorage
-from webrequestmanager.control.api import WebRequestAPIClient
-import json
-import datetime as dt
-import matplotlib.pyplot as plt
-import pandas as pd
-from collections import defaultdict
-from control.datasheet import Datasheet
-
-# 7712
-
-def main ():
-    with open("credentials.json", "r") as f:
-        credentials = json.load(f)
-    
-    user = credentials["user"]
-    password = credentials["password"]
-    
-
-    print("Opened the credentials. Connecting to database.")
-    storage = MySQLStorage("192.168.188.23", user, password)
-    api = WebRequestAPIClient("http://172.25.0.2", 35353)
-    request_manager = WebRequestManager(api, dt.timedelta(weeks=54))
-
-    requester = IdealoRequester(request_manager)
-    
-    loader = Loader(storage, requester)
-    print("Required connections built. Executing updates.")
-
-    loader.update_categories(dt.timedelta(days=31*9))
-    print("Done updating categories.")
-    loader.update_prices(dt.timedelta(days=7))
-    print("Done updating prices.")
-    # Externe Festplatten
-    # loader.load_full_category(7712)
-    # Grafikkarten
-    # loader.load_full_category(16073)
-    # Festplatten 3011
-    # loader.load_full_category(3011)
-    # Monitore
-    # loader.load_full_category(3832)
-    # Tastaturen
-    # loader.load_full_category(3047)
-    # Maeuse
-    # loader.load_full_category(3046)
-    # Einplatinencomputer
-    # loader.load_full_category(31123)
-    # USB-Sticks
-    # loader.load_full_category(4312)
-    
-    # Handys & Smartphones 
-    # loader.load_full_category(19116)
-    # SSD-Festplatten 
-    # loader.load_full_category(14613)
-    # Isolierkannen 13593
-    # loader.load_full_category(13593)
-    
-    # Gaming Headsets 5172
-    # loader.load_full_category(5172)
-    # Prozessoren 3019
-    # loader.load_full_category(3019)
-    # Mainboards 3018
-    # loader.load_full_category(3018)
-    # RAM 4552
-    # loader.load_full_category(4552)
-    
-    # Tastaturen 3047
-    # loader.load_full_category(3047)
-    # Mauspads 10472
-    # loader.load_full_category(10472)
-    
-    # Zelte 9174
-    # loader.load_full_category(9174)
-    # Schlafsaecke 9175
-    # loader.load_full_category(9175)
-    # Matten 9292
-    # loader.load_full_category(9292)
-    
-    # VR Headset 29550
-    # loader.load_full_category(29550)
-    # Laptops 3751
-    # loader.load_full_category(3751)
-    # PC-Systeme 3020
-    # loader.load_full_category(3020)
-    # WLAN Sticks 16935
-    # loader.load_full_category(16935)
-    # Netzwerkkarten
-    # loader.load_full_category(3089)
-    
-    # Muesli
-    # loader.load_full_category(25436)
-    # Speiseoel
-    # loader.load_full_category(25269)
-    
-    # Hundefutter 11153
-    # loader.load_full_category(11153)
-    # Katenzfutter 11152
-    # loader.load_full_category(11152)
-    # Tiertransportbox 18330
-    # loader.load_full_category(18330)
-    # Hundegeschirr 11372
-    # loader.load_full_category(11372)
-    # Hundespielzeug 29713
-    # loader.load_full_category(29713)
-    # Hundeleine 32487
-    # loader.load_full_category(32487)
-    # Hundesport 32519
-    # loader.load_full_category(32519)
-    # Outdoor-Hundezubehoer 32520
-    # loader.load_full_category(32520)
-    # Tierbetten 13654
-    # loader.load_full_category(13654)
-    # Fellpflege 13652
-    # loader.load_full_category(13652)
-    # Futternaepfe 32413
-    # loader.load_full_category(32413)
-    # Hundebekleidung 18721
-    # loader.load_full_category(18721)
-    
-    # SD-Karten 4734
-    # loader.load_full_category(4734)
-    
-    # Laufschuhe 22875
-    # loader.load_full_category(22875)
-    # Sneaker 18817
-    # loader.load_full_category(18817)
-    
-    # Outdoor-Schuhe 18854
-    # loader.load_full_category(18854)
-        
-def graphics_card_performance (storage):
-    cid = 16073
-    
-    product = storage.get_product_info(category_id=cid)
-    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
-    print(product)
-    attributes, values = Datasheet.get_attribute_value_pairs(datasheets)
-    
-    pprint(attributes)
-    pprint(values)
-    
-    continuous_categories = [('Grafikchip', 'Chiptakt base'),
-                             ('Grafikchip', 'Chiptakt boost'),
-                             ('Grafikspeicher', 'Speichergrߟe'),
-                             ('Grafikchip', 'Stream Processing Units'),
-                             ('Grafikspeicher', 'Speichertakt'),
-                             ('Grafikspeicher', 'Speicherbandbreite')]
-    
-    index_translation, df = Datasheet.interpret(datasheets, continuous_categories)    
-    prices = storage.get_prices_of_product(list(df.index.values)).median(level=0)
-    
-    performance_df = Datasheet.analyse(df, prices)
-    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
-    print(performance_df)
-    performance_df.to_csv("Performance.csv", sep=";")
-    
-def singleboard_computer_performance (storage):
-    cid = 31123
-    
-    product = storage.get_product_info(category_id=cid)
-    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
-    print(product)
-    attributes, values = Datasheet.get_attribute_value_pairs(datasheets)
-    
-    pprint(attributes)
-    pprint(values)
-    
-    continuous_categories = [('Spezifikationen', 'RAM'),
-                             ('Spezifikationen', 'Taktfrequenz'),
-                             ('Spezifikationen', 'Anzahl Prozessorkerne')]
-    
-    index_translation, df = Datasheet.interpret(datasheets, continuous_categories)    
-    prices = storage.get_prices_of_product(list(df.index.values)).max(level=0)
-    
-    performance_df = Datasheet.analyse(df, prices)
-    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
-    print(performance_df)
-    performance_df.to_csv("Performance.csv", sep=";")
-    
-def flashdrive_performance (storage):
-    cid = 4312
-    
-    product = storage.get_product_info(category_id=cid)
-    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
-    print(product)
-    attributes, values = Datasheet.get_attribute_value_pairs(datasheets)
-    
-    pprint(attributes)
-    pprint(values)
-    
-    continuous_categories = [('Eigenschaften', 'Speichergrߟe'),
-                             ('Leistungsmerkmale', 'bertragungsrate')]
-    
-    index_translation, df = Datasheet.interpret(datasheets, continuous_categories)    
-    prices = storage.get_prices_of_product(list(df.index.values)).max(level=0)
-    
-    performance_df = Datasheet.analyse(df, prices)
-    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
-    print(performance_df)
-    performance_df.to_csv("Performance.csv", sep=";")
-    
-def mouse_performance (storage):
-    cid = 3046
-    
-    product = storage.get_product_info(category_id=cid)
-    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
-    print(product)
-    attributes, values = Datasheet.get_attribute_value_pairs(datasheets)
-    
-    pprint(attributes)
-    pprint(values)
-    
-    continuous_categories = [('Tasten', 'Tastenanzahl'),
-                             ('Sensor', 'Max. Auflösung'),
-                             ('Leistungsmerkmale', 'max. Signalrate')]
-    
-    index_translation, df = Datasheet.interpret(datasheets, continuous_categories)    
-    prices = storage.get_prices_of_product(list(df.index.values)).max(level=0)
-    
-    performance_df = Datasheet.analyse(df, prices)
-    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
-    print(performance_df)
-    performance_df.to_csv("Performance.csv", sep=";")
-    
-def external_hdd_performance (storage):
-    cid = 7712
-    
-    product = storage.get_product_info(category_id=cid)
-    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
-    print(product)
-    attributes, values = Datasheet.get_attribute_value_pairs(datasheets)
-    
-    pprint(attributes)
-    pprint(values)
-    
-    continuous_categories = [('General', 'Speicherkapazität'),
-                             ('Konnektivität', '\x9cbertragungsrate')]
-    
-    index_translation, df = Datasheet.interpret(datasheets, continuous_categories)    
-    prices = storage.get_prices_of_product(list(df.index.values)).max(level=0)
-    
-    performance_df = Datasheet.analyse(df, prices)
-    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
-    print(performance_df)
-    performance_df.to_csv("Performance.csv", sep=";")
-    
-def read_data ():
-    with open("../credentials.json", "r") as f:
-        credentials = json.load(f)
-    
-    user = credentials["user"]
-    password = credentials["password"]
-    
-    storage = MySQLStorage("localhost", user, password)
-    
-    external_hdd_performance(storage)
-    
-    
-if __name__ == '__main__':
-    main()
+# coding=iso-8859-1
+'''
+Created on 05.01.2022
+
+@author: larsw
+
+Command line of the scraper:
+
+    python -m mains.main run
+    python -m mains.main update-prices [--min-age DAYS] [--budget REQUESTS]
+    python -m mains.main update-categories [--min-age DAYS]
+    python -m mains.main load-category <category id> [--refresh]
+    python -m mains.main analyse <category id> --configs <folder>
+    python -m mains.main export [category id ...] [--output FILE]
+
+See --help of the commands for their options. The commands import the
+scraping, storage and analysis modules only when they run, so --help
+starts without loading pandas, bs4 or mysql.connector, see
+mains.benchmark_startup.
+'''
+import sys
+import argparse
+import json
+import datetime as dt
+from contextlib import nullcontext
+
+DB_HOST = "192.168.188.23"
+API_URL = "http://172.25.0.2"
+API_PORT = 35353
+
+# Categories loaded so far, Category ID -> Name
+CATEGORIES = {
+        7712 : "Externe Festplatten",
+        16073 : "Grafikkarten",
+        3011 : "Festplatten",
+        3832 : "Monitore",
+        3047 : "Tastaturen",
+        3046 : "Maeuse",
+        31123 : "Einplatinencomputer",
+        4312 : "USB-Sticks",
+        19116 : "Handys & Smartphones",
+        14613 : "SSD-Festplatten",
+        13593 : "Isolierkannen",
+        5172 : "Gaming Headsets",
+        3019 : "Prozessoren",
+        3018 : "Mainboards",
+        4552 : "RAM",
+        10472 : "Mauspads",
+        9174 : "Zelte",
+        9175 : "Schlafsaecke",
+        9292 : "Matten",
+        29550 : "VR Headset",
+        3751 : "Laptops",
+        3020 : "PC-Systeme",
+        16935 : "WLAN Sticks",
+        3089 : "Netzwerkkarten",
+        25436 : "Muesli",
+        25269 : "Speiseoel",
+        11153 : "Hundefutter",
+        11152 : "Katzenfutter",
+        18330 : "Tiertransportbox",
+        11372 : "Hundegeschirr",
+        29713 : "Hundespielzeug",
+        32487 : "Hundeleine",
+        32519 : "Hundesport",
+        32520 : "Outdoor-Hundezubehoer",
+        13654 : "Tierbetten",
+        13652 : "Fellpflege",
+        32413 : "Futternaepfe",
+        18721 : "Hundebekleidung",
+        4734 : "SD-Karten",
+        22875 : "Laufschuhe",
+        18817 : "Sneaker",
+        18854 : "Outdoor-Schuhe"
+    }
+
+def open_storage (args):
+    from model.storage import MySQLStorage
+
+    with open(args.credentials, "r") as f:
+        credentials = json.load(f)
+
+    print("Opened the credentials. Connecting to database.")
+    return MySQLStorage(args.db_host, credentials["user"], credentials["password"])
+
+def run_loader (args, work):
+    # Builds the loader with a shared request manager and calls
+    # work(loader) with the parse stage, the metrics server and the
+    # optional profiler running
+    from control.scraping import IdealoRequester, WebRequestManager,\
+        SingleFlightRequestManager, RateLimitedRequestManager, RateLimiter
+    from control.loader import Loader
+    from control.parsing import ParseStage
+    from control.metrics import METRICS, MetricsServer
+    from control.profiling import StageProfiler
+    from webrequestmanager.control.api import WebRequestAPIClient
+
+    storage = open_storage(args)
+    api = WebRequestAPIClient(API_URL, API_PORT)
+    # Shared by all category and price updates
+    request_manager = SingleFlightRequestManager(
+            RateLimitedRequestManager(
+                WebRequestManager(api, dt.timedelta(weeks=54)),
+                rate_limiter=RateLimiter.for_rate(args.rate),
+                budget=args.max_requests
+            )
+        )
+
+    parse_stage = ParseStage()
+    requester = IdealoRequester(request_manager, parse_stage=parse_stage)
+
+    # Opt-in, e.g. IDEALO_PROFILE=profiles IDEALO_PROFILE_RATE=0.1,
+    # see StageProfiler.from_environ. The parsing in the parse stage
+    # is not profiled, see Loader.
+    profiler = StageProfiler.from_environ()
+    loader = Loader(storage, requester, profiler=profiler)
+    print("Required connections built. Executing updates.")
+
+    metrics_server = nullcontext() if args.metrics_port == 0 else MetricsServer(port=args.metrics_port)
+
+    with parse_stage, metrics_server, (nullcontext() if profiler is None else profiler):
+        work(loader)
+
+    print("Requests: {:d}, coalesced: {:d}".format(
+            request_manager.counters["requests"],
+            request_manager.counters["coalesced"]
+        ))
+    METRICS.write_summary(args.metrics_summary)
+
+def get_scheduler (args):
+    if args.daily_budget is None:
+        return None
+
+    from control.scheduling import RefreshScheduler
+    return RefreshScheduler(args.daily_budget)
+
+def command_run (args):
+    run_loader(args, lambda loader: loader.run_updates(
+            dt.timedelta(days=args.category_age), dt.timedelta(days=args.price_age),
+            workers=args.workers, scheduler=get_scheduler(args)
+        ))
+
+def command_update_prices (args):
+    run_loader(args, lambda loader: loader.update_prices(
+            dt.timedelta(days=args.min_age), chunk_size=args.chunk_size,
+            scheduler=get_scheduler(args), budget=args.budget
+        ))
+
+def command_update_categories (args):
+    run_loader(args, lambda loader: loader.update_categories(
+            dt.timedelta(days=args.min_age), workers=args.workers
+        ))
+
+def command_load_category (args):
+    run_loader(args, lambda loader: loader.load_full_category(
+            args.category_id, refresh=args.refresh, budget=args.budget
+        ))
+
+def command_analyse (args):
+    # Performance per price of the products of a category, see
+    # Datasheet.analyse. The datasheets are interpreted with the
+    # config <category id>.json in the configs folder.
+    from control.datasheet import Datasheet, InterpretationManager
+
+    storage = open_storage(args)
+    product = storage.get_product_info(category_id=args.category_id)
+    datasheets = Datasheet.collapse_product_info_to_datasheets(product)
+
+    _, df = InterpretationManager(args.configs).interpret(args.category_id, datasheets)
+    prices = storage.get_prices_of_product(list(df.index.values))
+    prices = prices.groupby(level=0).agg(args.aggregate)
+
+    performance_df = Datasheet.analyse(df, prices)
+    performance_df = performance_df.join(product[["ProductName"]]).join(df).join(prices)
+    print(performance_df)
+    performance_df.to_csv(args.output, sep=";")
+
+def command_export (args):
+    # Prices of the categories as CSV, all categories by default
+    storage = open_storage(args)
+    category_ids = args.category_ids
+
+    if len(category_ids) == 0:
+        category_ids = [int(x) for x in storage.get_category().index]
+
+    prices = storage.get_prices_of_category(list(category_ids))
+    prices.to_csv(args.output, sep=";")
+    print("Exported {:d} prices of {:d} categories to {:s}".format(
+            len(prices), len(category_ids), args.output
+        ))
+
+def build_parser ():
+    parser = argparse.ArgumentParser(prog="python -m mains.main",
+                                     description="Scrapes idealo.de categories and prices.")
+    subparsers = parser.add_subparsers(title="commands", metavar="<command>")
+
+    storage_options = argparse.ArgumentParser(add_help=False)
+    storage_options.add_argument("--credentials", default="credentials.json",
+                                 help="JSON file with user and password of the database")
+    storage_options.add_argument("--db-host", default=DB_HOST)
+
+    loader_options = argparse.ArgumentParser(add_help=False, parents=[storage_options])
+    loader_options.add_argument("--rate", type=float, default=20.0,
+                                help="requests per second (default: %(default)s)")
+    loader_options.add_argument("--max-requests", type=int, default=None,
+                                help="stop with BudgetExhaustedError after this many requests")
+    loader_options.add_argument("--metrics-port", type=int, default=9464,
+                                help="port of the /metrics endpoint, 0 disables it (default: %(default)s)")
+    loader_options.add_argument("--metrics-summary", default="metrics.json",
+                                help="JSON summary of the metrics written at the end")
+
+    scheduler_options = argparse.ArgumentParser(add_help=False)
+    scheduler_options.add_argument("--daily-budget", type=int, default=None,
+                                   help="update the most volatile prices within this many requests per day")
+
+    command = subparsers.add_parser("run", parents=[loader_options, scheduler_options],
+                                    help="update categories and prices")
+    command.add_argument("--category-age", type=float, default=31*9,
+                         help="days after which a category is updated (default: %(default)s)")
+    command.add_argument("--price-age", type=float, default=7,
+                         help="days after which prices are updated (default: %(default)s)")
+    command.add_argument("--workers", type=int, default=4,
+                         help="categories updated at once (default: %(default)s)")
+    command.set_defaults(function=command_run)
+
+    command = subparsers.add_parser("update-prices", parents=[loader_options, scheduler_options],
+                                    help="update the prices older than --min-age")
+    command.add_argument("--min-age", type=float, default=7, help="days (default: %(default)s)")
+    command.add_argument("--chunk-size", type=int, default=1000)
+    command.add_argument("--budget", type=int, default=None,
+                         help="complete at most this many update runs, the others are left for the next call")
+    command.set_defaults(function=command_update_prices)
+
+    command = subparsers.add_parser("update-categories", parents=[loader_options],
+                                    help="update the categories older than --min-age")
+    command.add_argument("--min-age", type=float, default=31*9, help="days (default: %(default)s)")
+    command.add_argument("--workers", type=int, default=4)
+    command.set_defaults(function=command_update_categories)
+
+    command = subparsers.add_parser(
+            "load-category", parents=[loader_options],
+            help="load all products and prices of a category",
+            epilog="Categories loaded so far: "+", ".join(
+                    "{:d} {:s}".format(category_id, name) for category_id, name in CATEGORIES.items()
+                )
+        )
+    command.add_argument("category_id", type=int)
+    command.add_argument("--refresh", action="store_true",
+                         help="load only the products new in the listing completely")
+    command.add_argument("--budget", type=int, default=None,
+                         help="planned requests, the category continues from its checkpoint next time")
+    command.set_defaults(function=command_load_category)
+
+    command = subparsers.add_parser("analyse", parents=[storage_options],
+                                    help="rate the products of a category by performance per price")
+    command.add_argument("category_id", type=int)
+    command.add_argument("--configs", required=True,
+                         help="folder of the interpretation configs, <category id>.json")
+    command.add_argument("--aggregate", choices=["median", "min", "max", "mean"], default="median",
+                         help="price of a product over time (default: %(default)s)")
+    command.add_argument("--output", default="Performance.csv")
+    command.set_defaults(function=command_analyse)
+
+    command = subparsers.add_parser("export", parents=[storage_options],
+                                    help="write the prices of categories as CSV")
+    command.add_argument("category_ids", type=int, nargs="*", help="all categories if none are given")
+    command.add_argument("--output", default="prices.csv")
+    command.set_defaults(function=command_export)
+
+    return parser
+
+def main (argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not hasattr(args, "function"):
+        parser.print_help()
+        return 2
+
+    args.function(args)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Dry run of the category and price updates of main: prints the requests
+and price rows they need from the storage, without requesting anything.
+With a budget, the plan is split into runs of at most budget requests.
+
+Usage: python -m mains.plan [requests per run]
+'''
+import sys
+import json
+import datetime as dt
+import pandas as pd
+from control.loader import Loader
+from control.planning import RequestPlanner
+from model.storage import MySQLStorage
+
+
+def main ():
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    with open("credentials.json", "r") as f:
+        credentials = json.load(f)
+
+    storage = MySQLStorage("192.168.188.23", credentials["user"], credentials["password"])
+    # The planner does not request anything
+    loader = Loader(storage, None)
+
+    plan = loader.plan_updates(dt.timedelta(days=31*9), dt.timedelta(days=7))
+
+    with pd.option_context("display.max_rows", 50, "display.width", 160):
+        print(plan[plan["Operation"] == RequestPlanner.OPERATION_CATEGORY])
+        print(plan.groupby("Operation")[RequestPlanner.REQUEST_COLUMNS + ["Requests", "Rows"]].sum())
+
+        if budget is not None:
+            summary = RequestPlanner.summarize(RequestPlanner.split(plan, budget))
+            print("Runs of {:d} requests: {:d}".format(budget, len(summary)))
+            print(summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+
+Serves a synthetic idealo catalog for load tests without network
+access.
+
+Usage: python -m mains.standin_server <port> [categories] [products per category] [latency] [error rate] [max rate]
+
+The categories are numbered from 1000. latency is given in seconds,
+error rate is the share of requests answered with 429 and max rate
+the requests per second above which all requests are answered with 429.
+'''
+import sys
+from control.standin import StandInCatalog, StandInServer
+
+
+def main ():
+    port = int(sys.argv[1])
+    categories = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    products = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    error_rate = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+    max_rate = int(sys.argv[6]) if len(sys.argv) > 6 else None
+
+    catalog = StandInCatalog(categories=categories, products_per_category=products)
+    server = StandInServer(catalog, port=port, latency=latency,
+                           error_rate=error_rate, max_rate=max_rate)
+
+    print("Serving categories {:d} to {:d} with {:d} products each at {:s}".format(
+            catalog.first_category_id, catalog.first_category_id + categories - 1,
+            products, server.url_base
+        ))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Responses: "+str(dict(server.counters)))
+
+if __name__ == '__main__':
+    main()
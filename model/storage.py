@@ -1,831 +1,1902 @@
-'''
-Created on 05.01.2022
-
-@author: larsw
-'''
-from abc import ABC, abstractmethod
-import sqlite3
-
-import mysql.connector
-import mysql.connector.errors as mysqlerrors
-import time
-import numpy as np
-import pandas as pd
-import datetime as dt
-from io import BytesIO, StringIO
-import gzip
-
-
-def _escape_string (string):
-    string = string.replace("\"", "\\\"")
-    string = string.replace("'", "\\'")
-    return string
-
-class StorageInsertError(Exception):
-    MESSAGE_BASE = "Storing data failed with the following info:\n{:s}"
-
-    def __init__(self, msg):
-        super().__init__(StorageInsertError.MESSAGE_BASE.format(msg))
-
-class Storage(ABC):
-
-    def __init__(self):
-        pass
-    
-    @abstractmethod    
-    def store_product (self, product_id, name, category_id):
-        pass
-    
-    @abstractmethod
-    def store_category (self, category_id, category_name):
-        pass
-    
-    @abstractmethod
-    def store_prices (self, product_id, df):
-        pass
-        
-class SQLiteStorage (Storage):
-    CREATE_CATEGORY_SQL = """
-    CREATE TABLE IF NOT EXISTS category (
-        cid INTEGER PRIMARY KEY,
-        name TEXT NOT NULL    
-    );"""
-    CREATE_PRODUCT_SQL = """
-    CREATE TABLE IF NOT EXISTS product (
-        pid INTEGER PRIMARY KEY,
-        name TEXT NOT NULL,
-        cid INTEGER,
-        
-        FOREIGN KEY (cid)
-            REFERENCES category (cit)
-                ON DELETE CASCADE
-                ON UPDATE NO ACTION
-    );"""
-    CREATE_PRICE_SQL = """
-    CREATE TABLE IF NOT EXISTS price (
-        pid INTEGER,
-        date TEXT,
-        price REAL,
-        PRIMARY KEY (pid, date),
-        FOREIGN KEY (pid)
-            REFERENCES product (pid)
-                ON DELETE CASCADE
-                ON UPDATE NO ACTION
-    );"""
-        
-    INSERT_CATEGORY_SQL = """
-    INSERT OR IGNORE INTO category (cid, name) VALUES ({:s}, \"{:s}\");
-    """
-    INSERT_PRODUCT_SQL = """
-    INSERT OR IGNORE INTO product (pid, name, cid) VALUES ({:s}, \"{:s}\", {:s}); 
-    """
-    
-    def __init__ (self, path):
-        self._con = sqlite3.connect(path)
-        self._cur = self._con.cursor()
-        self._initialize()
-        
-    def _initialize (self):
-        self._cur.execute(SQLiteStorage.CREATE_CATEGORY_SQL)
-        self._cur.execute(SQLiteStorage.CREATE_PRODUCT_SQL)
-        self._cur.execute(SQLiteStorage.CREATE_PRICE_SQL)
-        self._con.commit()
-        
-    def __del__ (self):
-        self._cur.close()
-        self._con.close()    
-        
-    def store_product (self, product_id, name, category_id):
-        sql = SQLiteStorage.INSERT_PRODUCT_SQL.format(
-                product_id, name, category_id
-            )
-        self._cur.execute(sql)
-        self._con.commit()
-    
-    def store_category (self, category_id, category_name):
-        sql = SQLiteStorage.INSERT_CATEGORY_SQL.format(
-                category_id, category_name
-            )
-        self._cur.execute(sql)
-        self._con.commit()
-        
-    def store_prices (self, product_id, df):
-        sql = "INSERT OR IGNORE INTO price (pid, date, price) VALUES {:s};"
-        
-        fmt = "("+product_id+",\"{:s}\", {:f})"
-        
-        values = []
-        
-        for ind in df.index:
-            value = df[ind]
-            
-            ind = ind.strftime("%Y-%m-%d")
-            value = fmt.format(ind, value)
-            values.append(value)
-
-        values = ",".join(values)
-        sql = sql.format(values)
-        
-        self._cur.execute(sql)
-        self._con.commit()
-        
-    @classmethod
-    def _get_product_selector (cls, product_id, category_id):
-        selectors = []
-        
-        if isinstance(product_id, (list, tuple)):
-            sel = "pid IN ({:s})".format(
-                    ", ".join(
-                            "{:d}".format(int(x))
-                            for x in product_id
-                        )
-                )
-            selectors.append(sel)
-        elif product_id is not None:
-            sel = "pid = \"{:s}\"".format(
-                    product_id
-                )
-            selectors.append(sel)
-            
-        if isinstance(category_id, (list, tuple)):
-            sel = "cid IN ({:s})".format(
-                    ", ".join(
-                            "{:d}".format(int(x))
-                            for x in category_id
-                        )
-                )
-            selectors.append(sel)
-        elif category_id is not None:
-            sel = "cid = {:d}".format(int(category_id))
-            selectors.append(sel)
-            
-        if len(selectors) != 0:
-            sql = "WHERE {:s}".format(
-                    " AND ".join(selectors)
-                )
-        else:
-            sql = ""
-            
-        return sql
-            
-        
-    def get_products (self, product_id=None, category_id=None):
-        sql = "SELECT * FROM product {:s};".format(
-                SQLiteStorage._get_product_selector(product_id, category_id)
-            )
-        print(sql)
-        self._cur.execute(sql)
-        
-        rows = self._cur.fetchall()
-        
-        df = pd.DataFrame(rows, columns=["ProdId", "Name", "CatId"])
-        df = df.set_index("ProdId")
-        return df
-        
-class _DBCon ():
-    def __init__ (self, host, user, passwd, db_name):
-        self._host = host
-        self._user = user
-        self._passwd = passwd
-        self._db_name = db_name
-        
-        self._con = None
-        
-    def __enter__ (self):
-        attempts = 1000
-        last_attempt = attempts - 1
-        
-        for attempt in range(attempts):
-            try:
-                self._con = mysql.connector.connect(
-                        host=self._host,
-                        user=self._user,
-                        password=self._passwd,
-                        database=self._db_name
-                    )
-                return self._con.cursor()
-            except Exception as e:
-                if attempt != last_attempt:
-                    if attempt % 100 == 0:
-                        print("Failed to connect - {:d}: {:s}".format(
-                                attempt, str(e)
-                            ))
-                        
-                    time.sleep(1)
-                else:
-                    raise e
-    
-    def __exit__ (self, exc_type, exc_val, exc_tb):
-        self._con.commit()
-        self._con.close()
-        
-class MySQLStorage (Storage):
-    V_CATEGORY_ID = "CategoryId"
-    V_CATEGORY_NAME = "CategoryName"
-    V_PRODUCT_ID = "ProductId"
-    V_PRODUCT_NAME = "ProductName"
-    V_DATE = "Date"
-    V_TIMESTAMP = "Timestamp"
-    V_PRICE = "Price"
-    V_DATASHEET = "Datasheet"
-    V_AGE = "Age"
-    V_PERIOD = "Period"
-
-    CATEGORY_COLUMNS = [V_CATEGORY_ID, V_CATEGORY_NAME]
-    CATEGORY_INDEX = V_CATEGORY_ID
-
-    CATEGORY_UPDATE_COLUMNS = [V_CATEGORY_ID, V_TIMESTAMP]
-    CATEGORY_UPDATE_INDEX = V_CATEGORY_ID
-    
-    PRODUCT_COLUMNS = [V_PRODUCT_ID, V_PRODUCT_NAME, V_CATEGORY_ID, V_DATASHEET]
-    PRODUCT_INDEX = V_PRODUCT_ID
-    
-    PRODUCT_PRICE_COLUMNS = [V_PRODUCT_ID, V_DATE, V_PRICE]
-    PRODUCT_PRICE_INDEX = [V_PRODUCT_ID, V_DATE]
-    
-    CATEGORY_PRODUCT_PRICE_COLUMNS = [V_CATEGORY_ID, V_PRODUCT_ID, V_DATE, V_PRICE]
-    CATEGORY_PRODUCT_PRICE_INDEX = [V_CATEGORY_ID, V_PRODUCT_ID, V_DATE]
-    
-    LAST_PRICE_DATE_COLUMNS = [V_PRODUCT_ID, V_DATE]
-    LAST_PRICE_DATE_INDEX = V_PRODUCT_ID
-    
-    LAST_PRICE_AGE_COLUMNS = [V_PRODUCT_ID, V_AGE]
-    LAST_PRICE_AGE_INDEX = V_PRODUCT_ID
-    
-    UPDATE_RUN_COLUMNS = [V_DATE, V_PRODUCT_ID, V_PERIOD]
-    UPDATE_RUN_INDEX = [V_DATE, V_PRODUCT_ID]
-    
-    CATEGORY_UPDATE_RUN_COLUMNS = [V_TIMESTAMP, V_CATEGORY_ID]
-    CATEGORY_UPDATE_RUN_INDEX = V_CATEGORY_ID
-    
-    def __init__(self, host, user, passwd, db_name="idealo_data"):
-        self._host = host
-        self._user = user
-        self._passwd = passwd
-        self._db_name = db_name
-        
-        self._initialize()
-    
-    
-    def _create_database(self):
-        self._con = _DBCon(self._host, self._user, self._passwd, None)
-        
-        with self._con as cur:
-            sql = "CREATE DATABASE IF NOT EXISTS {:s};".format(
-                    self._db_name
-                )
-            cur.execute(sql)
-            
-        self._con = _DBCon(self._host, self._user, self._passwd, self._db_name)
-        
-    def _create_category_table(self, cur):
-        sql = """CREATE TABLE IF NOT EXISTS category (
-            cid INTEGER UNSIGNED PRIMARY KEY,
-            name TEXT NOT NULL
-        );"""
-        cur.execute(sql)
-
-    def _create_last_category_update_table(self, cur):
-        sql = """CREATE TABLE IF NOT EXISTS last_category_update (
-            cid INTEGER UNSIGNED PRIMARY KEY,
-            ts DATETIME NOT NULL,
-
-            FOREIGN KEY(cid)
-                REFERENCES category (cid)
-                    ON DELETE CASCADE
-                    ON UPDATE NO ACTION
-        );"""
-        cur.execute(sql)
-        
-    def _create_category_update_run_table(self, cur):
-        sql = """
-        CREATE TABLE IF NOT EXISTS category_update_run (
-            ts DATETIME,
-            cid INTEGER UNSIGNED PRIMARY KEY,
-
-            FOREIGN KEY (cid)
-                REFERENCES category (cid)
-                    ON DELETE CASCADE
-                    ON UPDATE NO ACTION
-        );"""
-        cur.execute(sql)
-
-    def _create_product_table(self, cur):
-        sql = """CREATE TABLE IF NOT EXISTS product (
-            pid INTEGER UNSIGNED PRIMARY KEY,
-            name TEXT NOT NULL,
-            cid INTEGER UNSIGNED NOT NULL,
-            datasheet BLOB NULL,
-            
-            FOREIGN KEY (cid)
-                REFERENCES category(cid)
-                    ON DELETE CASCADE
-                    ON UPDATE CASCADE
-        );"""
-        cur.execute(sql)
-        
-    def _create_price_table(self, cur):
-        sql = """
-        CREATE TABLE IF NOT EXISTS price (
-            pid INTEGER UNSIGNED,
-            date DATE NOT NULL,
-            price DOUBLE UNSIGNED NOT NULL,
-            PRIMARY KEY (pid, date),
-            FOREIGN KEY (pid)
-                REFERENCES product (pid)
-                    ON DELETE CASCADE
-                    ON UPDATE NO ACTION
-        );"""
-        cur.execute(sql)
-        
-    def _create_last_price_date_table(self, cur):
-        sql = """
-        CREATE TABLE IF NOT EXISTS last_price_date (
-            pid INTEGER UNSIGNED PRIMARY KEY,
-            date DATE NOT NULL,
-            
-            FOREIGN KEY (pid)
-                REFERENCES product (pid)
-                    ON DELETE CASCADE
-                    ON UPDATE NO ACTION
-        );"""
-        cur.execute(sql)
-        
-    def _create_update_run_table(self, cur):
-        sql = """
-        CREATE TABLE IF NOT EXISTS update_run (
-            date DATETIME,
-            pid INTEGER UNSIGNED,
-            period VARCHAR(5),
-            
-            PRIMARY KEY (date, pid),
-            FOREIGN KEY (pid)
-                REFERENCES product (pid)
-                    ON DELETE CASCADE
-                    ON UPDATE NO ACTION
-        );"""
-        cur.execute(sql)
-
-    def _create_category_update_run_delete_trigger(self, cur):
-        sql = "DROP TRIGGER IF EXISTS delete_category_update_run_trigger;"
-        cur.execute(sql)
-
-        sql = """
-        CREATE TRIGGER delete_category_update_run_trigger
-        AFTER DELETE
-        ON category_update_run
-        FOR EACH ROW
-        INSERT INTO last_category_update (cid, ts)
-        VALUES (OLD.cid, UTC_TIMESTAMP())
-        ON DUPLICATE KEY UPDATE
-        ts = UTC_TIMESTAMP()
-        """
-        cur.execute(sql)
-    
-    def _create_category_insert_trigger(self, cur):
-        sql = "DROP TRIGGER IF EXISTS insert_category_trigger;"
-        cur.execute(sql)
-
-        sql = """
-        CREATE TRIGGER insert_category_trigger
-        AFTER INSERT
-        ON category
-        FOR EACH ROW
-        INSERT IGNORE INTO last_category_update (cid, ts)
-        VALUES (NEW.cid, UTC_TIMESTAMP());
-        """
-        cur.execute(sql)
-
-    def _create_price_insert_trigger(self, cur):
-        sql = "DROP TRIGGER IF EXISTS insert_price_trigger;"
-        cur.execute(sql)
-
-        sql = """
-        CREATE TRIGGER insert_price_trigger
-        AFTER INSERT
-        ON price
-        FOR EACH ROW
-        INSERT INTO last_price_date (pid, date)
-        VALUES (NEW.pid, NEW.date)
-        ON DUPLICATE KEY UPDATE date = GREATEST(date, VALUES(date));
-        """
-        cur.execute(sql)
-        
-    def _initialize(self):
-        self._create_database()
-        
-        with self._con as cur:
-            self._create_category_table(cur)
-            self._create_last_category_update_table(cur) 
-            self._create_category_update_run_table(cur)
-            self._create_product_table(cur)
-            self._create_price_table(cur)
-            self._create_last_price_date_table(cur)
-            self._create_update_run_table(cur)
-            
-            self._create_category_update_run_delete_trigger(cur)
-            self._create_category_insert_trigger(cur)
-            self._create_price_insert_trigger(cur)
-            
-    def get_category(self, category_id=None):
-        if category_id is not None:
-            sql = "SELECT cid, name FROM category WHERE cid {:s};"
-            
-            if isinstance(category_id, (list, tuple)):
-                subsql = ",".join(str(x) for x in category_id)
-                sql = sql.format("IN ({:s})".format(subsql))
-            else:
-                subsql = str(category_id)
-                sql = sql.format("= {:s}".format(subsql))
-        else:
-            sql = "SELECT cid, name FROM category;"
-            
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-                
-        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_COLUMNS)
-        s = s.set_index(MySQLStorage.CATEGORY_INDEX)
-        return s
-                
-    def get_last_category_update(self, category_id=None):
-        if category_id is not None:
-            sql = "SELECT cid, ts FROM last_category_update WHERE cid {:s};"
-
-            if isinstance(category_id, (list, tuple)):
-                subsql = ",".join(str(x) for x in category_id)
-                sql = sql.format(f"IN ({subsql})")
-            else:
-                sql = sql.format(f"= {category_id}")
-        else:
-            sql = "SELECT cid, ts FROM last_category_update;"
-
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-
-        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_UPDATE_COLUMNS)
-        s = s.set_index(MySQLStorage.CATEGORY_UPDATE_INDEX)
-        return s
-    
-    def get_category_update_run(self, category_id=None):
-        if category_id is not None:
-            sql = "SELECT ts, cid FROM category_update_run WHERE cid {:s};"
-
-            if isinstance(category_id, (list, tuple)):
-                subsql = ",".join(str(x) for x in category_id)
-                sql = sql.format(f"IN ({subsql})")
-            else:
-                sql = sql.format(f"= {category_id}")
-        else:
-            sql = "SELECT ts, cid FROM category_update_run;"
-
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-
-        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_UPDATE_RUN_COLUMNS)
-        s = s.set_index(MySQLStorage.CATEGORY_UPDATE_RUN_INDEX)
-        return s
-
-    def store_last_category_update(self, category_id, timestamp):
-        timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-        sql = f"""INSERT INTO last_category_update (cid, ts)
-        VALUES ({category_id}, \"{timestamp}\")
-        ON DUPLICATE KEY UPDATE
-            ts = VALUES(last);"""
-
-        with self._con as cur:
-            cur.execute(sql)
-
-    def store_category_update_run(self, category_id, timestamp):
-        timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-        sql = f"""INSERT INTO category_update_run (ts, cid)
-        VALUES (\"{timestamp}\", {category_id})
-        ON DUPLICATE KEY UPDATE
-            ts = VALUES(ts);"""
-
-        with self._con as cur:
-            cur.execute(sql)
-            
-    def store_category (self, category_id, category_name):
-        sql = """INSERT INTO category (cid, name) 
-        VALUES ({:d}, \"{:s}\")
-        ON DUPLICATE KEY UPDATE
-            name = VALUES(name)
-        ;"""
-        sql = sql.format(category_id, _escape_string(category_name))
-        
-        with self._con as cur:
-            cur.execute(sql)
-            
-    def store_product (self, product_id, name, category_id, datasheet):
-        if datasheet is not None:
-            bytesio = BytesIO()
-            
-            with gzip.open(bytesio, "wb") as f:
-                stringio = StringIO()
-                datasheet.to_csv(stringio, sep=";", line_terminator="\n")
-                
-                stringio = stringio.getvalue().encode("utf-8")
-                
-                f.write(stringio)
-                
-            datasheet = bytesio.getvalue().hex()
-            datasheet = "X'{:s}'".format(datasheet)
-        else:
-            datasheet = "NULL"
-        
-        
-        sql = """INSERT INTO product (pid, name, cid, datasheet)
-        VALUES ({:d}, \"{:s}\", {:d}, {:s})
-        ON DUPLICATE KEY UPDATE
-            name = VALUES(NAME),
-            cid = VALUES(cid),
-            datasheet = VALUES(datasheet);""".format(
-                product_id, _escape_string(name),
-                category_id,
-                datasheet
-            )
-        try: 
-            with self._con as cur:
-                cur.execute(sql)
-        except mysqlerrors.DatabaseError as e:
-            msg = f"Product {product_id} {name} {category_id}"
-            raise StorageInsertError(msg)
-
-
-    def store_prices (self, product_id, df):
-        sql = """INSERT INTO price (pid, date, price)
-        VALUES {:s}
-        ON DUPLICATE KEY UPDATE
-            price = VALUES(price);"""
-        
-        fmt = "({:d},\"{:s}\", {:f})"
-        
-        values = []
-        
-        for ind in df.index:
-            value = df[ind]
-            
-            ind = ind.strftime("%Y-%m-%d")
-            value = fmt.format(product_id, ind, value)
-            values.append(value)
-
-        values = ",".join(values)
-        sql = sql.format(values)
-        
-        try:
-            with self._con as cur:
-                cur.execute(sql)
-        except mysqlerrors.DatabaseError as e:
-            msg = f"Prices for {product_id}"
-            raise StorageInsertError(msg)
-
-
-    def store_update_runs (self, update_df):
-        # update_df:
-        # Index: ProductId
-        # Columns: Period (e.g. P3M), Date (datetime)
-        
-        sql = """INSERT INTO update_run (date, pid, period)
-        VALUES {:s}
-        ON DUPLICATE KEY UPDATE 
-            date = VALUES(date), pid = VALUES(pid), period = VALUES(period);"""
-        
-        fmt = "(\"{:s}\",{:d},\"{:s}\")"
-        lines = []
-        
-        for product_id in update_df.index:
-            v = update_df.loc[product_id]
-            period = v[MySQLStorage.V_PERIOD]
-            date = v[MySQLStorage.V_DATE].to_pydatetime()
-            date = date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            lines.append(fmt.format(date, product_id, period))
-            
-            if len(lines) >= 1000:
-                subsql = sql.format(",".join(lines))
-                lines.clear()
-                
-                with self._con as cur:
-                    cur.execute(subsql)
-            
-        if len(lines) != 0:
-            sql = sql.format(",".join(lines))
-            
-            with self._con as cur:
-                cur.execute(sql)
-    
-    def delete_category_update_run(self, category_id):
-        sql = f"DELETE FROM category_update_run WHERE cid = {category_id};"
-
-        with self._con as cur:
-            cur.execute(sql)
-
-    @classmethod
-    def _get_product_info_selector (cls, product_id, category_id):
-        selectors = []
-        
-        if product_id is not None:
-            if isinstance(product_id, (list, tuple, np.ndarray)):
-                sel = "p.pid IN({:s})".format(
-                        ",".join(str(x) for x in product_id)
-                    )
-            else:
-                sel = "p.pid = {:d}".format(product_id)
-                
-            selectors.append(sel)
-        
-        if category_id is not None:
-            if isinstance(category_id, (list, tuple, np.ndarray)):
-                sel = "p.cid IN({:s})".format(
-                        ",".join(str(x) for x in category_id)
-                    )
-            else:
-                sel = "p.cid = {:d}".format(category_id)
-                
-            selectors.append(sel)
-            
-        if len(selectors) != 0:
-            selectors = " AND ".join(selectors)
-            selectors = " WHERE {:s}".format(selectors)
-        else:
-            selectors = ""
-            
-        return selectors
-        
-            
-    @classmethod
-    def _process_byte_string (cls, string):
-        string = string.replace(b"\xa0", b" ")
-        string = string.replace(b"\xc2", b"")
-        string = string.replace(b"\xb0", b"deg")
-        
-        string = string.decode("iso-8859-1")
-        return string
-            
-    def get_product_info (self, product_id=None, category_id=None):
-        sql = """SELECT p.pid, p.name, p.cid, p.datasheet
-            FROM product AS p
-            {:s};""".format(
-                    MySQLStorage._get_product_info_selector(product_id,
-                                                            category_id)
-                )
-                
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            
-                
-        new_rows = []
-        
-        for pid, name, cid, datasheet in rows:
-            bytesio = BytesIO(datasheet)
-            
-            with gzip.open(bytesio, "rb") as f:
-                datasheet = f.read()
-                
-            datasheet = MySQLStorage._process_byte_string(datasheet)
-                
-            datasheet = StringIO(datasheet)
-
-            try:
-                datasheet = pd.read_csv(datasheet, sep=";", lineterminator="\n",
-                                        index_col=[0, 1])["0"]
-                new_rows.append((pid, name, cid, datasheet))
-            except pd.errors.EmptyDataError:
-                continue
-            
-        s = pd.DataFrame(new_rows, columns=MySQLStorage.PRODUCT_COLUMNS)
-        s = s.set_index(MySQLStorage.PRODUCT_INDEX)
-        return s
-    
-    
-            
-    def get_prices_of_product (self, product_id):
-        sql = """SELECT p.pid, pr.date, pr.price
-        FROM product AS p
-        INNER JOIN price AS pr
-            ON p.pid = pr.pid
-        WHERE p.pid {:s};"""
-        
-        multi = isinstance(product_id, (list, tuple))
-        
-        if multi:
-            subsql = ",".join(str(x) for x in product_id)
-            sql = sql.format("IN ({:s})".format(subsql))
-            
-            with self._con as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-            
-            df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_PRICE_COLUMNS)
-            df = df.set_index(MySQLStorage.PRODUCT_PRICE_INDEX)
-        else:
-            subsql = str(product_id)
-            sql = sql.format("= {:s}".format(subsql))
-            
-            with self._con as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                
-            df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_PRICE_COLUMNS)
-            df = df.drop(MySQLStorage.PRODUCT_PRICE_INDEX[0], axis=1)
-            df = df.set_index(MySQLStorage.PRODUCT_PRICE_INDEX[1])
-            
-        df = df.sort_index()
-        return df
-            
-    def get_prices_of_category (self, category_id):
-        sql = """SELECT c.cid, p.pid, pr.date, pr.price
-        FROM category AS c
-        INNER JOIN product AS p
-            ON c.cid = p.cid
-        INNER JOIN price AS pr
-            ON p.pid = pr.pid
-        WHERE c.cid {:s};"""
-            
-        multi = isinstance(category_id, (list, tuple))
-        
-        if multi:
-            subsql = ",".join(str(x) for x in category_id)
-            sql = sql.format("IN ({:s})".format(subsql))
-            
-            with self._con as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-            
-            df = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_PRODUCT_PRICE_COLUMNS)
-            df = df.set_index(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX)
-        else:
-            subsql = str(category_id)
-            sql = sql.format("= {:s}".format(subsql))
-            
-            with self._con as cur:
-                cur.execute(sql)
-                rows = cur.fetchall()
-                
-            df = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_PRODUCT_PRICE_COLUMNS)
-            df = df.drop(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX[0], axis=1)
-            df = df.set_index(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX[1:])
-            
-        df = df.sort_index()
-        return df
-    
-    def get_last_price_dates (self):
-        sql = """
-        SELECT pid, date
-        FROM last_price_date
-        ORDER BY date ASC;"""
-        
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            
-        df = pd.DataFrame(rows, columns=MySQLStorage.LAST_PRICE_DATE_COLUMNS)
-        df = df.set_index(MySQLStorage.LAST_PRICE_DATE_INDEX)
-        return df
-    
-    def get_last_price_ages (self, reference_datetime):
-        sql = """
-        SELECT pid, TIMESTAMPDIFF(SECOND, date, \"{:s}\") "age"
-        FROM last_price_date
-        ORDER BY date ASC;
-        """.format(str(reference_datetime))
-        
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            
-        df = pd.DataFrame(rows, columns=MySQLStorage.LAST_PRICE_AGE_COLUMNS)
-        df = df.set_index(MySQLStorage.LAST_PRICE_AGE_INDEX)
-        df[MySQLStorage.V_AGE] = pd.to_timedelta(df[MySQLStorage.V_AGE], unit="S")
-        return df
-    
-    def get_update_runs (self):
-        sql = """
-        SELECT date, pid, period
-        FROM update_run;"""
-        
-        with self._con as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            
-        df = pd.DataFrame(rows, columns=MySQLStorage.UPDATE_RUN_COLUMNS)
-        df = df.set_index(MySQLStorage.UPDATE_RUN_INDEX)
-        return df
-        
-    def delete_update_run (self, date, product_id):
-        sql = """DELETE FROM update_run
-        WHERE date = \"{:s}\" AND pid = {:d};
-        """.format(
-                date.strftime("%Y-%m-%d %H:%M:%S"),
-                product_id
-            )
-        
-        with self._con as cur:
-            cur.execute(sql)
-        
+'''
+Created on 05.01.2022
+
+@author: larsw
+'''
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+
+import mysql.connector
+import mysql.connector.errors as mysqlerrors
+import time
+import numpy as np
+import pandas as pd
+import datetime as dt
+from io import BytesIO, StringIO
+import gzip
+from control.metrics import METRICS
+
+
+def _escape_string (string):
+    string = string.replace("\"", "\\\"")
+    string = string.replace("'", "\\'")
+    return string
+
+def _compress_datasheet (datasheet):
+    # Datasheet -> gzipped CSV
+    bytesio = BytesIO()
+    
+    with gzip.open(bytesio, "wb") as f:
+        stringio = StringIO()
+        datasheet.to_csv(stringio, sep=";", line_terminator="\n")
+        
+        stringio = stringio.getvalue().encode("utf-8")
+        
+        f.write(stringio)
+        
+    return bytesio.getvalue()
+
+class StorageInsertError(Exception):
+    MESSAGE_BASE = "Storing data failed with the following info:\n{:s}"
+
+    def __init__(self, msg):
+        super().__init__(StorageInsertError.MESSAGE_BASE.format(msg))
+
+class Storage(ABC):
+    # Stages of a variant in the checkpoint of a category update
+    CHECKPOINT_DISCOVERED = 0
+    CHECKPOINT_STORED = 1
+    CHECKPOINT_PRICED = 2
+
+    def __init__(self):
+        pass
+    
+    @abstractmethod    
+    def store_product (self, product_id, name, category_id):
+        pass
+    
+    @abstractmethod
+    def store_category (self, category_id, category_name):
+        pass
+    
+    @abstractmethod
+    def store_prices (self, product_id, df):
+        pass
+    
+    def store_prices_frame (self, frame):
+        # frame: long price frame
+        # Columns: ProductId, Date, Price
+        for product_id, group in frame.groupby("ProductId", sort=False):
+            series = pd.Series(group["Price"].values, index=pd.Index(group["Date"].values))
+            self.store_prices(int(product_id), series)
+            
+    def merge_prices_frame (self, frame):
+        # Stores only the points of the long price frame that are not
+        # stored yet. The points already stored are compared instead of
+        # rewritten.
+        # Returns (New Points, Stored Points with another Price)
+        if len(frame) == 0:
+            return 0, 0
+        
+        stored = self.get_prices_frame(frame["ProductId"].unique().tolist(), frame["Date"].min())
+        merged = frame.merge(stored, how="left", on=["ProductId", "Date"], suffixes=("", "Stored"))
+        
+        new = merged["PriceStored"].isna().values
+        inconsistent = ~new & ~np.isclose(merged["Price"].values, merged["PriceStored"].values)
+        
+        self.store_prices_frame(frame[new])
+        return int(new.sum()), int(inconsistent.sum())
+        
+class _SQLiteCon ():
+    # Counterpart of _DBCon: yields a cursor and commits on exit. The
+    # connection is shared, so the operations are serialized.
+    def __init__ (self, path):
+        # Other processes may hold the write lock while claiming runs
+        self._con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._start = None
+        
+    def __enter__ (self):
+        self._lock.acquire()
+        self._start = time.perf_counter()
+        return self._con.cursor()
+    
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self._con.commit()
+            else:
+                self._con.rollback()
+        finally:
+            METRICS.observe("storage_round_trip_seconds", time.perf_counter() - self._start,
+                            backend="sqlite")
+            self._lock.release()
+            
+    def close (self):
+        self._con.close()
+        
+class SQLiteStorage (Storage):
+    # Single-file storage with the tables and views of MySQLStorage,
+    # e.g. for benchmarks and tests. Dates are stored as text.
+    DATE_FORMAT = "%Y-%m-%d"
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+    
+    CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS category (
+        cid INTEGER PRIMARY KEY,
+        name TEXT NOT NULL    
+    );
+    CREATE TABLE IF NOT EXISTS last_category_update (
+        cid INTEGER PRIMARY KEY,
+        ts TEXT NOT NULL,
+        
+        FOREIGN KEY (cid)
+            REFERENCES category (cid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TABLE IF NOT EXISTS category_update_run (
+        ts TEXT,
+        cid INTEGER PRIMARY KEY,
+        owner TEXT NULL,
+        lease_until TEXT NULL,
+        
+        FOREIGN KEY (cid)
+            REFERENCES category (cid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TABLE IF NOT EXISTS product (
+        pid INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        cid INTEGER NOT NULL,
+        datasheet BLOB NULL,
+        
+        FOREIGN KEY (cid)
+            REFERENCES category (cid)
+                ON DELETE CASCADE
+                ON UPDATE CASCADE
+    );
+    CREATE TABLE IF NOT EXISTS price (
+        pid INTEGER,
+        date TEXT NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (pid, date),
+        FOREIGN KEY (pid)
+            REFERENCES product (pid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TABLE IF NOT EXISTS last_price_date (
+        pid INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        
+        FOREIGN KEY (pid)
+            REFERENCES product (pid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TABLE IF NOT EXISTS update_run (
+        date TEXT,
+        pid INTEGER,
+        period TEXT,
+        owner TEXT NULL,
+        lease_until TEXT NULL,
+        
+        PRIMARY KEY (date, pid),
+        FOREIGN KEY (pid)
+            REFERENCES product (pid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TABLE IF NOT EXISTS category_checkpoint (
+        cid INTEGER PRIMARY KEY,
+        ts TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_product (
+        cid INTEGER,
+        pid INTEGER,
+        url TEXT NOT NULL,
+        resolved INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (cid, pid)
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_variant (
+        cid INTEGER,
+        vid INTEGER,
+        url TEXT NOT NULL,
+        stage INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (cid, vid)
+    );
+    CREATE TABLE IF NOT EXISTS product_variant (
+        pid INTEGER,
+        vid INTEGER,
+        url TEXT NOT NULL,
+        PRIMARY KEY (pid, vid)
+    );
+    CREATE TABLE IF NOT EXISTS price_check (
+        pid INTEGER PRIMARY KEY,
+        ts TEXT NOT NULL,
+        
+        FOREIGN KEY (pid)
+            REFERENCES product (pid)
+                ON DELETE CASCADE
+                ON UPDATE NO ACTION
+    );
+    CREATE TRIGGER IF NOT EXISTS delete_category_update_run_trigger
+    AFTER DELETE
+    ON category_update_run
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO last_category_update (cid, ts)
+        VALUES (OLD.cid, DATETIME('now'))
+        ON CONFLICT (cid) DO UPDATE SET
+            ts = excluded.ts;
+    END;
+    CREATE TRIGGER IF NOT EXISTS insert_category_trigger
+    AFTER INSERT
+    ON category
+    FOR EACH ROW
+    BEGIN
+        INSERT OR IGNORE INTO last_category_update (cid, ts)
+        VALUES (NEW.cid, DATETIME('now'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS insert_price_trigger
+    AFTER INSERT
+    ON price
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO last_price_date (pid, date)
+        VALUES (NEW.pid, NEW.date)
+        ON CONFLICT (pid) DO UPDATE SET
+            date = MAX(date, excluded.date);
+    END;
+    """
+    
+    INSERT_PRICE_SQL = """INSERT INTO price (pid, date, price)
+    VALUES (?, ?, ?)
+    ON CONFLICT (pid, date) DO UPDATE SET
+        price = excluded.price;"""
+    
+    def __init__ (self, path):
+        self._con = _SQLiteCon(path)
+        self._initialize()
+        
+    def _initialize (self):
+        with self._con as cur:
+            cur.executescript(SQLiteStorage.CREATE_SQL)
+        
+    def close (self):
+        self._con.close()
+        
+    @classmethod
+    def _to_frame (cls, rows, columns, index, date_columns=()):
+        df = pd.DataFrame(rows, columns=columns)
+        
+        for column in date_columns:
+            df[column] = pd.to_datetime(df[column])
+            
+        return df.set_index(index)
+        
+    def store_product (self, product_id, name, category_id, datasheet):
+        if datasheet is not None:
+            datasheet = _compress_datasheet(datasheet)
+        
+        sql = """INSERT INTO product (pid, name, cid, datasheet)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (pid) DO UPDATE SET
+            name = excluded.name,
+            cid = excluded.cid,
+            datasheet = excluded.datasheet;"""
+        
+        try:
+            with self._con as cur:
+                cur.execute(sql, (int(product_id), name, int(category_id), datasheet))
+        except sqlite3.DatabaseError as e:
+            msg = f"Product {product_id} {name} {category_id}"
+            raise StorageInsertError(msg)
+        
+        METRICS.inc("storage_rows_written_total", table="product")
+    
+    def store_category (self, category_id, category_name):
+        sql = """INSERT INTO category (cid, name)
+        VALUES (?, ?)
+        ON CONFLICT (cid) DO UPDATE SET
+            name = excluded.name;"""
+        
+        with self._con as cur:
+            cur.execute(sql, (int(category_id), category_name))
+        
+    def store_prices (self, product_id, df):
+        rows = [
+                (int(product_id), ind.strftime(SQLiteStorage.DATE_FORMAT), float(df[ind]))
+                for ind in df.index
+            ]
+        
+        try:
+            with self._con as cur:
+                cur.executemany(SQLiteStorage.INSERT_PRICE_SQL, rows)
+        except sqlite3.DatabaseError as e:
+            msg = f"Prices for {product_id}"
+            raise StorageInsertError(msg)
+        
+        METRICS.inc("storage_rows_written_total", len(rows), table="price")
+            
+    def store_prices_frame (self, frame):
+        # frame: long price frame
+        # Columns: ProductId, Date, Price
+        rows = zip(
+                frame[MySQLStorage.V_PRODUCT_ID].values.astype(np.int64).tolist(),
+                frame[MySQLStorage.V_DATE].dt.strftime(SQLiteStorage.DATE_FORMAT).values,
+                frame[MySQLStorage.V_PRICE].values.astype(np.float64).tolist()
+            )
+        
+        try:
+            with self._con as cur:
+                cur.executemany(SQLiteStorage.INSERT_PRICE_SQL, rows)
+        except sqlite3.DatabaseError as e:
+            msg = "Prices of {:d} rows".format(len(frame))
+            raise StorageInsertError(msg)
+        
+        METRICS.inc("storage_rows_written_total", len(frame), table="price")
+        
+    def get_last_category_update (self):
+        with self._con as cur:
+            cur.execute("SELECT cid, ts FROM last_category_update;")
+            rows = cur.fetchall()
+            
+        return SQLiteStorage._to_frame(rows, MySQLStorage.CATEGORY_UPDATE_COLUMNS,
+                                       MySQLStorage.CATEGORY_UPDATE_INDEX,
+                                       [MySQLStorage.V_TIMESTAMP])
+        
+    def get_category_update_run (self):
+        with self._con as cur:
+            cur.execute("SELECT ts, cid FROM category_update_run;")
+            rows = cur.fetchall()
+            
+        return SQLiteStorage._to_frame(rows, MySQLStorage.CATEGORY_UPDATE_RUN_COLUMNS,
+                                       MySQLStorage.CATEGORY_UPDATE_RUN_INDEX,
+                                       [MySQLStorage.V_TIMESTAMP])
+        
+    def store_category_update_run (self, category_id, timestamp):
+        sql = """INSERT INTO category_update_run (ts, cid)
+        VALUES (?, ?)
+        ON CONFLICT (cid) DO UPDATE SET
+            ts = excluded.ts;"""
+        
+        with self._con as cur:
+            cur.execute(sql, (timestamp.strftime(SQLiteStorage.TIMESTAMP_FORMAT), 
+                              int(category_id)))
+            
+    def delete_category_update_run (self, category_id):
+        with self._con as cur:
+            cur.execute("DELETE FROM category_update_run WHERE cid = ?;", 
+                        (int(category_id),))
+            
+    def get_last_price_ages (self, reference_datetime, product_ids=None):
+        # Ages of the last prices of product_ids, of all products for None
+        if product_ids is None:
+            selector = ""
+        else:
+            selector = "WHERE pid IN ({:s})".format(",".join(str(int(x)) for x in product_ids) or "NULL")
+            
+        sql = """
+        SELECT pid, CAST(ROUND((JULIANDAY(?) - JULIANDAY(date)) * 86400) AS INTEGER)
+        FROM last_price_date
+        {:s}
+        ORDER BY date ASC;""".format(selector)
+        
+        with self._con as cur:
+            cur.execute(sql, (reference_datetime.strftime(SQLiteStorage.TIMESTAMP_FORMAT),))
+            rows = cur.fetchall()
+            
+        df = SQLiteStorage._to_frame(rows, MySQLStorage.LAST_PRICE_AGE_COLUMNS,
+                                     MySQLStorage.LAST_PRICE_AGE_INDEX)
+        df[MySQLStorage.V_AGE] = pd.to_timedelta(df[MySQLStorage.V_AGE], unit="S")
+        return df
+    
+    def get_update_runs (self):
+        with self._con as cur:
+            cur.execute("SELECT date, pid, period FROM update_run;")
+            rows = cur.fetchall()
+            
+        return SQLiteStorage._to_frame(rows, MySQLStorage.UPDATE_RUN_COLUMNS,
+                                       MySQLStorage.UPDATE_RUN_INDEX,
+                                       [MySQLStorage.V_DATE])
+    
+    def get_update_run_count (self):
+        with self._con as cur:
+            cur.execute("SELECT COUNT(*) FROM update_run;")
+            return cur.fetchone()[0]
+    
+    def store_update_runs (self, update_df):
+        # update_df:
+        # Index: ProductId
+        # Columns: Period (e.g. P3M), Date (datetime)
+        sql = """INSERT INTO update_run (date, pid, period)
+        VALUES (?, ?, ?)
+        ON CONFLICT (date, pid) DO UPDATE SET
+            period = excluded.period;"""
+        
+        rows = [
+                (date.strftime(SQLiteStorage.TIMESTAMP_FORMAT), int(product_id), period)
+                for product_id, date, period in zip(
+                        update_df.index,
+                        pd.to_datetime(update_df[MySQLStorage.V_DATE]),
+                        update_df[MySQLStorage.V_PERIOD]
+                    )
+            ]
+        
+        with self._con as cur:
+            cur.executemany(sql, rows)
+            
+        METRICS.inc("storage_rows_written_total", len(rows), table="update_run")
+            
+    def delete_update_run (self, date, product_id):
+        with self._con as cur:
+            cur.execute("DELETE FROM update_run WHERE date = ? AND pid = ?;",
+                        (date.strftime(SQLiteStorage.TIMESTAMP_FORMAT), int(product_id)))
+        
+    def get_category_checkpoint (self, category_id):
+        # None if the category has no checkpoint, else
+        # (Products: ProductId -> [Url, Resolved],
+        #  Variants: ProductId -> [Url, Stage])
+        with self._con as cur:
+            cur.execute("SELECT cid FROM category_checkpoint WHERE cid = ?;", (int(category_id),))
+            
+            if len(cur.fetchall()) == 0:
+                return None
+            
+            cur.execute("SELECT pid, url, resolved FROM checkpoint_product WHERE cid = ?;",
+                        (int(category_id),))
+            products = cur.fetchall()
+            cur.execute("SELECT vid, url, stage FROM checkpoint_variant WHERE cid = ?;",
+                        (int(category_id),))
+            variants = cur.fetchall()
+            
+        products = SQLiteStorage._to_frame(products, MySQLStorage.CHECKPOINT_PRODUCT_COLUMNS,
+                                           MySQLStorage.CHECKPOINT_INDEX)
+        products[MySQLStorage.V_RESOLVED] = products[MySQLStorage.V_RESOLVED].astype(bool)
+        
+        return (products,
+                SQLiteStorage._to_frame(variants, MySQLStorage.CHECKPOINT_VARIANT_COLUMNS,
+                                        MySQLStorage.CHECKPOINT_INDEX))
+    
+    def store_category_checkpoint (self, category_id, product_urls):
+        # Starts the checkpoint of a category update with the product
+        # detail URLs from its listing
+        # product_urls: {Product ID : Product Detail URL}
+        timestamp = dt.datetime.utcnow().strftime(SQLiteStorage.TIMESTAMP_FORMAT)
+        
+        with self._con as cur:
+            cur.execute("""INSERT INTO category_checkpoint (cid, ts) VALUES (?, ?)
+            ON CONFLICT (cid) DO UPDATE SET ts = excluded.ts;""", (int(category_id), timestamp))
+            cur.executemany("INSERT OR IGNORE INTO checkpoint_product (cid, pid, url) VALUES (?, ?, ?);",
+                            [(int(category_id), int(product_id), url)
+                             for product_id, url in product_urls.items()])
+            
+    def store_checkpoint_variants (self, category_id, product_ids, variant_urls):
+        # Marks the product detail pages as resolved into the variants
+        # variant_urls: {Variant ID : Variant URL}
+        with self._con as cur:
+            cur.executemany("INSERT OR IGNORE INTO checkpoint_variant (cid, vid, url) VALUES (?, ?, ?);",
+                            [(int(category_id), int(variant_id), url)
+                             for variant_id, url in variant_urls.items()])
+            cur.executemany("UPDATE checkpoint_product SET resolved = 1 WHERE cid = ? AND pid = ?;",
+                            [(int(category_id), int(product_id)) for product_id in product_ids])
+            
+    def set_checkpoint_variant_stage (self, category_id, variant_ids, stage):
+        with self._con as cur:
+            cur.executemany("UPDATE checkpoint_variant SET stage = MAX(stage, ?) WHERE cid = ? AND vid = ?;",
+                            [(int(stage), int(category_id), int(variant_id)) for variant_id in variant_ids])
+            
+    def delete_category_checkpoint (self, category_id):
+        with self._con as cur:
+            for table in ("checkpoint_variant", "checkpoint_product", "category_checkpoint"):
+                cur.execute(f"DELETE FROM {table} WHERE cid = ?;", (int(category_id),))
+                
+    def store_product_variants (self, variant_urls):
+        # variant_urls: {Product ID : {Variant ID : Variant URL}}
+        # A product without variants is its own variant
+        sql = """INSERT INTO product_variant (pid, vid, url)
+        VALUES (?, ?, ?)
+        ON CONFLICT (pid, vid) DO UPDATE SET
+            url = excluded.url;"""
+        
+        with self._con as cur:
+            cur.executemany(sql, [
+                    (int(product_id), int(variant_id), url)
+                    for product_id, variants in variant_urls.items()
+                    for variant_id, url in variants.items()
+                ])
+            
+    def get_product_variants (self, product_ids):
+        # ProductId -> [VariantId, Url, Stored], Stored tells whether
+        # the variant is in product
+        sql = """SELECT pv.pid, pv.vid, pv.url, p.pid IS NOT NULL
+        FROM product_variant AS pv
+        LEFT JOIN product AS p ON p.pid = pv.vid
+        WHERE pv.pid IN ({:s});""".format(",".join(str(int(x)) for x in product_ids) or "NULL")
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = SQLiteStorage._to_frame(rows, MySQLStorage.PRODUCT_VARIANT_COLUMNS,
+                                     MySQLStorage.PRODUCT_VARIANT_INDEX)
+        df[MySQLStorage.V_STORED] = df[MySQLStorage.V_STORED].astype(bool)
+        return df
+    
+    def get_product_variants_of_category (self, category_id):
+        # Like get_product_variants for the stored variants of a category
+        sql = """SELECT pv.pid, pv.vid, pv.url, 1
+        FROM product_variant AS pv
+        INNER JOIN product AS p ON p.pid = pv.vid
+        WHERE p.cid = ?;"""
+        
+        with self._con as cur:
+            cur.execute(sql, (int(category_id),))
+            rows = cur.fetchall()
+            
+        df = SQLiteStorage._to_frame(rows, MySQLStorage.PRODUCT_VARIANT_COLUMNS,
+                                     MySQLStorage.PRODUCT_VARIANT_INDEX)
+        df[MySQLStorage.V_STORED] = df[MySQLStorage.V_STORED].astype(bool)
+        return df
+    
+    def store_price_checks (self, product_ids, timestamp):
+        # Records when the prices of the products were last requested
+        sql = """INSERT INTO price_check (pid, ts)
+        VALUES (?, ?)
+        ON CONFLICT (pid) DO UPDATE SET
+            ts = excluded.ts;"""
+        timestamp = timestamp.strftime(SQLiteStorage.TIMESTAMP_FORMAT)
+        
+        with self._con as cur:
+            cur.executemany(sql, [(int(product_id), timestamp) for product_id in product_ids])
+            
+    def get_prices_frame (self, product_ids, since):
+        # Long price frame of the products from the date since on
+        sql = "SELECT pid, date, price FROM price WHERE date >= ? AND pid IN ({:s});".format(
+                ",".join(str(int(x)) for x in product_ids)
+            )
+        
+        with self._con as cur:
+            cur.execute(sql, (since.strftime(SQLiteStorage.DATE_FORMAT),))
+            rows = cur.fetchall()
+            
+        return MySQLStorage._to_prices_frame(rows)
+    
+    def get_price_statistics (self, since):
+        # ProductId -> [LastDate, Checked, Changes, Points] of every
+        # product with prices. Changes and Points count the price
+        # changes and price points from since on, Checked is NaT for
+        # products whose prices were never checked.
+        sql = MySQLStorage.PRICE_STATISTICS_SQL.format("?")
+        
+        with self._con as cur:
+            cur.execute(sql, (since.strftime(SQLiteStorage.DATE_FORMAT),))
+            rows = cur.fetchall()
+            
+        return SQLiteStorage._to_frame(rows, MySQLStorage.PRICE_STATISTICS_COLUMNS,
+                                       MySQLStorage.PRICE_STATISTICS_INDEX,
+                                       [MySQLStorage.V_LAST_DATE, MySQLStorage.V_CHECKED])
+    
+    @classmethod
+    def _lease_end (cls, lease):
+        return (dt.datetime.utcnow() + lease).strftime(SQLiteStorage.TIMESTAMP_FORMAT)
+    
+    def _claim_runs (self, table, key_columns, columns, owner, limit, lease, order_columns=None):
+        # Leases up to limit runs to owner that are not leased, whose
+        # lease expired or which are leased to owner already. Runs of
+        # owner are returned again, so a loader restarted with
+        # the same owner resumes them, concurrent claims must therefore
+        # use different owners. BEGIN IMMEDIATE takes the write lock
+        # of the database, so claims of different owners never return
+        # the same run.
+        order_columns = key_columns if order_columns is None else order_columns
+        limit_sql = "" if limit is None else f"LIMIT {int(limit)}"
+        now = dt.datetime.utcnow().strftime(SQLiteStorage.TIMESTAMP_FORMAT)
+        
+        with self._con as cur:
+            cur.execute("BEGIN IMMEDIATE;")
+            cur.execute(f"""SELECT {", ".join(key_columns + columns)}
+            FROM {table}
+            WHERE lease_until IS NULL OR lease_until < ? OR owner = ?
+            ORDER BY {", ".join(order_columns)}
+            {limit_sql};""", (now, owner))
+            rows = cur.fetchall()
+            
+            condition = " AND ".join(f"{column} = ?" for column in key_columns)
+            lease_until = SQLiteStorage._lease_end(lease)
+            cur.executemany(f"UPDATE {table} SET owner = ?, lease_until = ? WHERE {condition};",
+                            [(owner, lease_until) + tuple(row[:len(key_columns)]) for row in rows])
+            
+        return rows
+    
+    def _renew_runs (self, table, owner, lease):
+        # Returns the number of runs still leased to owner
+        with self._con as cur:
+            cur.execute(f"UPDATE {table} SET lease_until = ? WHERE owner = ?;",
+                        (SQLiteStorage._lease_end(lease), owner))
+            return cur.rowcount
+        
+    def _finish_runs (self, table, key_columns, owner, keys, delete):
+        # Deletes (completed) or releases the runs of owner with the
+        # given keys, all runs of owner for keys None
+        if delete:
+            sql = f"DELETE FROM {table} WHERE owner = ?"
+        else:
+            sql = f"UPDATE {table} SET owner = NULL, lease_until = NULL WHERE owner = ?"
+            
+        with self._con as cur:
+            if keys is None:
+                cur.execute(sql+";", (owner,))
+            else:
+                condition = " AND ".join(f"{column} = ?" for column in key_columns)
+                cur.executemany(f"{sql} AND {condition};",
+                                [(owner,) + tuple(key) for key in keys])
+    
+    def claim_update_runs (self, owner, limit, lease):
+        # Same format as get_update_runs. The runs of a plan are claimed
+        # grouped by period.
+        rows = self._claim_runs("update_run", ["date", "pid"], ["period"],
+                                owner, limit, lease, order_columns=["date", "period", "pid"])
+        return SQLiteStorage._to_frame(rows, MySQLStorage.UPDATE_RUN_COLUMNS,
+                                       MySQLStorage.UPDATE_RUN_INDEX,
+                                       [MySQLStorage.V_DATE])
+    
+    def renew_update_runs (self, owner, lease):
+        return self._renew_runs("update_run", owner, lease)
+    
+    def complete_update_runs (self, owner, keys):
+        # keys: [(Date, Product ID), ...], e.g. the index of the claim
+        keys = [
+                (date.strftime(SQLiteStorage.TIMESTAMP_FORMAT), int(product_id))
+                for date, product_id in keys
+            ]
+        self._finish_runs("update_run", ["date", "pid"], owner, keys, True)
+        
+    def release_update_runs (self, owner, keys=None):
+        # keys: [(Date, Product ID), ...], all runs of owner for None
+        if keys is not None:
+            keys = [
+                    (date.strftime(SQLiteStorage.TIMESTAMP_FORMAT), int(product_id))
+                    for date, product_id in keys
+                ]
+            
+        self._finish_runs("update_run", ["date", "pid"], owner, keys, False)
+        
+    def claim_category_update_runs (self, owner, limit, lease):
+        # Same format as get_category_update_run
+        rows = self._claim_runs("category_update_run", ["cid"], ["ts"],
+                                owner, limit, lease)
+        return SQLiteStorage._to_frame([(ts, cid) for cid, ts in rows],
+                                       MySQLStorage.CATEGORY_UPDATE_RUN_COLUMNS,
+                                       MySQLStorage.CATEGORY_UPDATE_RUN_INDEX,
+                                       [MySQLStorage.V_TIMESTAMP])
+    
+    def renew_category_update_runs (self, owner, lease):
+        return self._renew_runs("category_update_run", owner, lease)
+    
+    def complete_category_update_run (self, owner, category_id):
+        # The delete trigger records the update in last_category_update
+        self._finish_runs("category_update_run", ["cid"], owner, [(int(category_id),)], True)
+        
+    def release_category_update_runs (self, owner, category_id=None):
+        keys = None if category_id is None else [(int(category_id),)]
+        self._finish_runs("category_update_run", ["cid"], owner, keys, False)
+        
+    @classmethod
+    def _get_product_selector (cls, product_id, category_id):
+        selectors = []
+        
+        if isinstance(product_id, (list, tuple)):
+            sel = "pid IN ({:s})".format(
+                    ", ".join(
+                            "{:d}".format(int(x))
+                            for x in product_id
+                        )
+                )
+            selectors.append(sel)
+        elif product_id is not None:
+            sel = "pid = {:d}".format(int(product_id))
+            selectors.append(sel)
+            
+        if isinstance(category_id, (list, tuple)):
+            sel = "cid IN ({:s})".format(
+                    ", ".join(
+                            "{:d}".format(int(x))
+                            for x in category_id
+                        )
+                )
+            selectors.append(sel)
+        elif category_id is not None:
+            sel = "cid = {:d}".format(int(category_id))
+            selectors.append(sel)
+            
+        if len(selectors) != 0:
+            sql = "WHERE {:s}".format(
+                    " AND ".join(selectors)
+                )
+        else:
+            sql = ""
+            
+        return sql
+            
+        
+    def get_products (self, product_id=None, category_id=None):
+        sql = "SELECT pid, name, cid FROM product {:s};".format(
+                SQLiteStorage._get_product_selector(product_id, category_id)
+            )
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+        
+        df = pd.DataFrame(rows, columns=["ProdId", "Name", "CatId"])
+        df = df.set_index("ProdId")
+        return df
+        
+class _DBCon ():
+    # Every thread uses its own connection. A persistent connection
+    # stays open between the with-blocks and is reconnected when lost,
+    # otherwise every with-block connects anew.
+    def __init__ (self, host, user, passwd, db_name, persistent=False):
+        self._host = host
+        self._user = user
+        self._passwd = passwd
+        self._db_name = db_name
+        self._persistent = persistent
+        
+        self._local = threading.local()
+        
+    def __enter__ (self):
+        # Every with-block is observed as one round trip
+        self._local.start = time.perf_counter()
+        con = getattr(self._local, "con", None)
+        
+        if con is not None and con.is_connected():
+            return con.cursor()
+        
+        METRICS.inc("storage_connects_total", backend="mysql")
+        
+        attempts = 1000
+        last_attempt = attempts - 1
+        
+        for attempt in range(attempts):
+            try:
+                self._local.con = mysql.connector.connect(
+                        host=self._host,
+                        user=self._user,
+                        password=self._passwd,
+                        database=self._db_name
+                    )
+                return self._local.con.cursor()
+            except Exception as e:
+                if attempt != last_attempt:
+                    if attempt % 100 == 0:
+                        print("Failed to connect - {:d}: {:s}".format(
+                                attempt, str(e)
+                            ))
+                        
+                    time.sleep(1)
+                else:
+                    raise e
+    
+    def __exit__ (self, exc_type, exc_val, exc_tb):
+        try:
+            self._local.con.commit()
+        finally:
+            METRICS.observe("storage_round_trip_seconds", time.perf_counter() - self._local.start,
+                            backend="mysql")
+            
+            if not self._persistent:
+                self.close()
+            
+    def close (self):
+        # Closes the connection of the calling thread
+        con = getattr(self._local, "con", None)
+        
+        if con is not None:
+            con.close()
+            self._local.con = None
+        
+class MySQLStorage (Storage):
+    V_CATEGORY_ID = "CategoryId"
+    V_CATEGORY_NAME = "CategoryName"
+    V_PRODUCT_ID = "ProductId"
+    V_PRODUCT_NAME = "ProductName"
+    V_DATE = "Date"
+    V_TIMESTAMP = "Timestamp"
+    V_PRICE = "Price"
+    V_DATASHEET = "Datasheet"
+    V_AGE = "Age"
+    V_PERIOD = "Period"
+    V_URL = "Url"
+    V_RESOLVED = "Resolved"
+    V_STAGE = "Stage"
+    V_VARIANT_ID = "VariantId"
+    V_STORED = "Stored"
+    V_LAST_DATE = "LastDate"
+    V_CHECKED = "Checked"
+    V_CHANGES = "Changes"
+    V_POINTS = "Points"
+
+    CATEGORY_COLUMNS = [V_CATEGORY_ID, V_CATEGORY_NAME]
+    CATEGORY_INDEX = V_CATEGORY_ID
+
+    CATEGORY_UPDATE_COLUMNS = [V_CATEGORY_ID, V_TIMESTAMP]
+    CATEGORY_UPDATE_INDEX = V_CATEGORY_ID
+    
+    PRODUCT_COLUMNS = [V_PRODUCT_ID, V_PRODUCT_NAME, V_CATEGORY_ID, V_DATASHEET]
+    PRODUCT_INDEX = V_PRODUCT_ID
+    
+    PRODUCT_PRICE_COLUMNS = [V_PRODUCT_ID, V_DATE, V_PRICE]
+    PRODUCT_PRICE_INDEX = [V_PRODUCT_ID, V_DATE]
+    
+    CATEGORY_PRODUCT_PRICE_COLUMNS = [V_CATEGORY_ID, V_PRODUCT_ID, V_DATE, V_PRICE]
+    CATEGORY_PRODUCT_PRICE_INDEX = [V_CATEGORY_ID, V_PRODUCT_ID, V_DATE]
+    
+    LAST_PRICE_DATE_COLUMNS = [V_PRODUCT_ID, V_DATE]
+    LAST_PRICE_DATE_INDEX = V_PRODUCT_ID
+    
+    LAST_PRICE_AGE_COLUMNS = [V_PRODUCT_ID, V_AGE]
+    LAST_PRICE_AGE_INDEX = V_PRODUCT_ID
+    
+    UPDATE_RUN_COLUMNS = [V_DATE, V_PRODUCT_ID, V_PERIOD]
+    UPDATE_RUN_INDEX = [V_DATE, V_PRODUCT_ID]
+    
+    CATEGORY_UPDATE_RUN_COLUMNS = [V_TIMESTAMP, V_CATEGORY_ID]
+    CATEGORY_UPDATE_RUN_INDEX = V_CATEGORY_ID
+    
+    CHECKPOINT_PRODUCT_COLUMNS = [V_PRODUCT_ID, V_URL, V_RESOLVED]
+    CHECKPOINT_VARIANT_COLUMNS = [V_PRODUCT_ID, V_URL, V_STAGE]
+    CHECKPOINT_INDEX = V_PRODUCT_ID
+    
+    PRODUCT_VARIANT_COLUMNS = [V_PRODUCT_ID, V_VARIANT_ID, V_URL, V_STORED]
+    PRODUCT_VARIANT_INDEX = V_PRODUCT_ID
+    
+    PRICE_STATISTICS_COLUMNS = [V_PRODUCT_ID, V_LAST_DATE, V_CHECKED, V_CHANGES, V_POINTS]
+    PRICE_STATISTICS_INDEX = V_PRODUCT_ID
+    
+    # Price points and price changes per product since a date
+    PRICE_STATISTICS_SQL = """
+    SELECT l.pid, l.date, c.ts, COALESCE(s.changes, 0), COALESCE(s.points, 0)
+    FROM last_price_date AS l
+    LEFT JOIN price_check AS c
+        ON c.pid = l.pid
+    LEFT JOIN (
+        SELECT pid, COUNT(*) AS points, SUM(changed) AS changes
+        FROM (
+            SELECT pid, price <> LAG(price) OVER (PARTITION BY pid ORDER BY date) AS changed
+            FROM price
+            WHERE date >= {:s}
+        ) AS w
+        GROUP BY pid
+    ) AS s
+        ON s.pid = l.pid;"""
+    
+    def __init__(self, host, user, passwd, db_name="idealo_data", persistent=False):
+        # persistent: Keep a connection per thread open between the
+        # queries, e.g. for long-running loaders
+        self._host = host
+        self._user = user
+        self._passwd = passwd
+        self._db_name = db_name
+        self._persistent = persistent
+        
+        self._initialize()
+    
+    
+    def _create_database(self):
+        self._con = _DBCon(self._host, self._user, self._passwd, None)
+        
+        with self._con as cur:
+            sql = "CREATE DATABASE IF NOT EXISTS {:s};".format(
+                    self._db_name
+                )
+            cur.execute(sql)
+            
+        self._con = _DBCon(self._host, self._user, self._passwd, self._db_name,
+                           persistent=self._persistent)
+        
+    def close(self):
+        # Closes the persistent connection of the calling thread
+        self._con.close()
+        
+    def _create_category_table(self, cur):
+        sql = """CREATE TABLE IF NOT EXISTS category (
+            cid INTEGER UNSIGNED PRIMARY KEY,
+            name TEXT NOT NULL
+        );"""
+        cur.execute(sql)
+
+    def _create_last_category_update_table(self, cur):
+        sql = """CREATE TABLE IF NOT EXISTS last_category_update (
+            cid INTEGER UNSIGNED PRIMARY KEY,
+            ts DATETIME NOT NULL,
+
+            FOREIGN KEY(cid)
+                REFERENCES category (cid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+        
+    def _create_category_update_run_table(self, cur):
+        sql = """
+        CREATE TABLE IF NOT EXISTS category_update_run (
+            ts DATETIME,
+            cid INTEGER UNSIGNED PRIMARY KEY,
+            owner VARCHAR(64) NULL,
+            lease_until DATETIME NULL,
+
+            FOREIGN KEY (cid)
+                REFERENCES category (cid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+
+    def _create_product_table(self, cur):
+        sql = """CREATE TABLE IF NOT EXISTS product (
+            pid INTEGER UNSIGNED PRIMARY KEY,
+            name TEXT NOT NULL,
+            cid INTEGER UNSIGNED NOT NULL,
+            datasheet BLOB NULL,
+            
+            FOREIGN KEY (cid)
+                REFERENCES category(cid)
+                    ON DELETE CASCADE
+                    ON UPDATE CASCADE
+        );"""
+        cur.execute(sql)
+        
+    def _create_price_table(self, cur):
+        sql = """
+        CREATE TABLE IF NOT EXISTS price (
+            pid INTEGER UNSIGNED,
+            date DATE NOT NULL,
+            price DOUBLE UNSIGNED NOT NULL,
+            PRIMARY KEY (pid, date),
+            FOREIGN KEY (pid)
+                REFERENCES product (pid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+        
+    def _create_last_price_date_table(self, cur):
+        sql = """
+        CREATE TABLE IF NOT EXISTS last_price_date (
+            pid INTEGER UNSIGNED PRIMARY KEY,
+            date DATE NOT NULL,
+            
+            FOREIGN KEY (pid)
+                REFERENCES product (pid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+        
+    def _create_update_run_table(self, cur):
+        sql = """
+        CREATE TABLE IF NOT EXISTS update_run (
+            date DATETIME,
+            pid INTEGER UNSIGNED,
+            period VARCHAR(5),
+            owner VARCHAR(64) NULL,
+            lease_until DATETIME NULL,
+            
+            PRIMARY KEY (date, pid),
+            FOREIGN KEY (pid)
+                REFERENCES product (pid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+
+    def _create_checkpoint_tables(self, cur):
+        # Progress of the category updates, see store_category_checkpoint
+        sql = """
+        CREATE TABLE IF NOT EXISTS category_checkpoint (
+            cid INTEGER UNSIGNED PRIMARY KEY,
+            ts DATETIME NOT NULL,
+
+            FOREIGN KEY (cid)
+                REFERENCES category (cid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+        
+        sql = """
+        CREATE TABLE IF NOT EXISTS checkpoint_product (
+            cid INTEGER UNSIGNED,
+            pid INTEGER UNSIGNED,
+            url TEXT NOT NULL,
+            resolved BOOLEAN NOT NULL DEFAULT FALSE,
+            
+            PRIMARY KEY (cid, pid),
+            FOREIGN KEY (cid)
+                REFERENCES category_checkpoint (cid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+        
+        sql = """
+        CREATE TABLE IF NOT EXISTS checkpoint_variant (
+            cid INTEGER UNSIGNED,
+            vid INTEGER UNSIGNED,
+            url TEXT NOT NULL,
+            stage TINYINT UNSIGNED NOT NULL DEFAULT 0,
+            
+            PRIMARY KEY (cid, vid),
+            FOREIGN KEY (cid)
+                REFERENCES category_checkpoint (cid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+
+    def _create_product_variant_table(self, cur):
+        # Variants listed on the product detail pages, products without
+        # variants are their own variant
+        sql = """
+        CREATE TABLE IF NOT EXISTS product_variant (
+            pid INTEGER UNSIGNED,
+            vid INTEGER UNSIGNED,
+            url TEXT NOT NULL,
+            
+            PRIMARY KEY (pid, vid)
+        );"""
+        cur.execute(sql)
+
+    def _create_price_check_table(self, cur):
+        sql = """
+        CREATE TABLE IF NOT EXISTS price_check (
+            pid INTEGER UNSIGNED PRIMARY KEY,
+            ts DATETIME NOT NULL,
+            
+            FOREIGN KEY (pid)
+                REFERENCES product (pid)
+                    ON DELETE CASCADE
+                    ON UPDATE NO ACTION
+        );"""
+        cur.execute(sql)
+
+    def _add_lease_columns(self, cur, table):
+        # Tables created before runs were leased lack the columns
+        sql = f"""SELECT COUNT(*)
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = \"{table}\"
+            AND COLUMN_NAME IN (\"owner\", \"lease_until\");"""
+        cur.execute(sql)
+        
+        if cur.fetchall()[0][0] == 0:
+            sql = f"""ALTER TABLE {table}
+            ADD COLUMN owner VARCHAR(64) NULL,
+            ADD COLUMN lease_until DATETIME NULL;"""
+            cur.execute(sql)
+
+    def _create_category_update_run_delete_trigger(self, cur):
+        sql = "DROP TRIGGER IF EXISTS delete_category_update_run_trigger;"
+        cur.execute(sql)
+
+        sql = """
+        CREATE TRIGGER delete_category_update_run_trigger
+        AFTER DELETE
+        ON category_update_run
+        FOR EACH ROW
+        INSERT INTO last_category_update (cid, ts)
+        VALUES (OLD.cid, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE
+        ts = UTC_TIMESTAMP()
+        """
+        cur.execute(sql)
+    
+    def _create_category_insert_trigger(self, cur):
+        sql = "DROP TRIGGER IF EXISTS insert_category_trigger;"
+        cur.execute(sql)
+
+        sql = """
+        CREATE TRIGGER insert_category_trigger
+        AFTER INSERT
+        ON category
+        FOR EACH ROW
+        INSERT IGNORE INTO last_category_update (cid, ts)
+        VALUES (NEW.cid, UTC_TIMESTAMP());
+        """
+        cur.execute(sql)
+
+    def _create_price_insert_trigger(self, cur):
+        sql = "DROP TRIGGER IF EXISTS insert_price_trigger;"
+        cur.execute(sql)
+
+        sql = """
+        CREATE TRIGGER insert_price_trigger
+        AFTER INSERT
+        ON price
+        FOR EACH ROW
+        INSERT INTO last_price_date (pid, date)
+        VALUES (NEW.pid, NEW.date)
+        ON DUPLICATE KEY UPDATE date = GREATEST(date, VALUES(date));
+        """
+        cur.execute(sql)
+        
+    def _initialize(self):
+        self._create_database()
+        
+        with self._con as cur:
+            self._create_category_table(cur)
+            self._create_last_category_update_table(cur) 
+            self._create_category_update_run_table(cur)
+            self._create_product_table(cur)
+            self._create_price_table(cur)
+            self._create_last_price_date_table(cur)
+            self._create_update_run_table(cur)
+            self._create_checkpoint_tables(cur)
+            self._create_product_variant_table(cur)
+            self._create_price_check_table(cur)
+            self._add_lease_columns(cur, "update_run")
+            self._add_lease_columns(cur, "category_update_run")
+            
+            self._create_category_update_run_delete_trigger(cur)
+            self._create_category_insert_trigger(cur)
+            self._create_price_insert_trigger(cur)
+            
+    def get_category(self, category_id=None):
+        if category_id is not None:
+            sql = "SELECT cid, name FROM category WHERE cid {:s};"
+            
+            if isinstance(category_id, (list, tuple)):
+                subsql = ",".join(str(x) for x in category_id)
+                sql = sql.format("IN ({:s})".format(subsql))
+            else:
+                subsql = str(category_id)
+                sql = sql.format("= {:s}".format(subsql))
+        else:
+            sql = "SELECT cid, name FROM category;"
+            
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+                
+        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_COLUMNS)
+        s = s.set_index(MySQLStorage.CATEGORY_INDEX)
+        return s
+                
+    def get_last_category_update(self, category_id=None):
+        if category_id is not None:
+            sql = "SELECT cid, ts FROM last_category_update WHERE cid {:s};"
+
+            if isinstance(category_id, (list, tuple)):
+                subsql = ",".join(str(x) for x in category_id)
+                sql = sql.format(f"IN ({subsql})")
+            else:
+                sql = sql.format(f"= {category_id}")
+        else:
+            sql = "SELECT cid, ts FROM last_category_update;"
+
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+
+        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_UPDATE_COLUMNS)
+        s = s.set_index(MySQLStorage.CATEGORY_UPDATE_INDEX)
+        return s
+    
+    def get_category_update_run(self, category_id=None):
+        if category_id is not None:
+            sql = "SELECT ts, cid FROM category_update_run WHERE cid {:s};"
+
+            if isinstance(category_id, (list, tuple)):
+                subsql = ",".join(str(x) for x in category_id)
+                sql = sql.format(f"IN ({subsql})")
+            else:
+                sql = sql.format(f"= {category_id}")
+        else:
+            sql = "SELECT ts, cid FROM category_update_run;"
+
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+
+        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_UPDATE_RUN_COLUMNS)
+        s = s.set_index(MySQLStorage.CATEGORY_UPDATE_RUN_INDEX)
+        return s
+
+    def store_last_category_update(self, category_id, timestamp):
+        timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+        sql = f"""INSERT INTO last_category_update (cid, ts)
+        VALUES ({category_id}, \"{timestamp}\")
+        ON DUPLICATE KEY UPDATE
+            ts = VALUES(last);"""
+
+        with self._con as cur:
+            cur.execute(sql)
+
+    def store_category_update_run(self, category_id, timestamp):
+        timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+        sql = f"""INSERT INTO category_update_run (ts, cid)
+        VALUES (\"{timestamp}\", {category_id})
+        ON DUPLICATE KEY UPDATE
+            ts = VALUES(ts);"""
+
+        with self._con as cur:
+            cur.execute(sql)
+            
+    def store_category (self, category_id, category_name):
+        sql = """INSERT INTO category (cid, name) 
+        VALUES ({:d}, \"{:s}\")
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name)
+        ;"""
+        sql = sql.format(category_id, _escape_string(category_name))
+        
+        with self._con as cur:
+            cur.execute(sql)
+            
+    def store_product (self, product_id, name, category_id, datasheet):
+        if datasheet is not None:
+            datasheet = _compress_datasheet(datasheet).hex()
+            datasheet = "X'{:s}'".format(datasheet)
+        else:
+            datasheet = "NULL"
+        
+        
+        sql = """INSERT INTO product (pid, name, cid, datasheet)
+        VALUES ({:d}, \"{:s}\", {:d}, {:s})
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(NAME),
+            cid = VALUES(cid),
+            datasheet = VALUES(datasheet);""".format(
+                product_id, _escape_string(name),
+                category_id,
+                datasheet
+            )
+        try: 
+            with self._con as cur:
+                cur.execute(sql)
+        except mysqlerrors.DatabaseError as e:
+            msg = f"Product {product_id} {name} {category_id}"
+            raise StorageInsertError(msg)
+        
+        METRICS.inc("storage_rows_written_total", table="product")
+
+
+    def store_prices (self, product_id, df):
+        sql = """INSERT INTO price (pid, date, price)
+        VALUES {:s}
+        ON DUPLICATE KEY UPDATE
+            price = VALUES(price);"""
+        
+        fmt = "({:d},\"{:s}\", {:f})"
+        
+        values = []
+        
+        for ind in df.index:
+            value = df[ind]
+            
+            ind = ind.strftime("%Y-%m-%d")
+            value = fmt.format(product_id, ind, value)
+            values.append(value)
+
+        values = ",".join(values)
+        sql = sql.format(values)
+        
+        try:
+            with self._con as cur:
+                cur.execute(sql)
+        except mysqlerrors.DatabaseError as e:
+            msg = f"Prices for {product_id}"
+            raise StorageInsertError(msg)
+        
+        METRICS.inc("storage_rows_written_total", len(df), table="price")
+
+
+    def store_prices_frame (self, frame, chunk_size=1000):
+        # frame: long price frame
+        # Columns: ProductId, Date, Price
+        sql = """INSERT INTO price (pid, date, price)
+        VALUES {:s}
+        ON DUPLICATE KEY UPDATE
+            price = VALUES(price);"""
+        
+        product_ids = frame[MySQLStorage.V_PRODUCT_ID].values.astype(np.int64)
+        dates = frame[MySQLStorage.V_DATE].dt.strftime("%Y-%m-%d").values
+        prices = frame[MySQLStorage.V_PRICE].values.astype(np.float64)
+        
+        for start in range(0, len(frame), chunk_size):
+            end = start + chunk_size
+            values = ",".join(
+                    "({:d},\"{:s}\", {:f})".format(product_id, date, price)
+                    for product_id, date, price in zip(
+                            product_ids[start:end].tolist(),
+                            dates[start:end],
+                            prices[start:end].tolist()
+                        )
+                )
+            
+            try:
+                with self._con as cur:
+                    cur.execute(sql.format(values))
+            except mysqlerrors.DatabaseError as e:
+                msg = "Prices {:d} to {:d} of {:d}".format(start, min(end, len(frame)), len(frame))
+                raise StorageInsertError(msg)
+            
+            METRICS.inc("storage_rows_written_total", len(product_ids[start:end]), table="price")
+
+    def store_update_runs (self, update_df):
+        # update_df:
+        # Index: ProductId
+        # Columns: Period (e.g. P3M), Date (datetime)
+        
+        sql = """INSERT INTO update_run (date, pid, period)
+        VALUES {:s}
+        ON DUPLICATE KEY UPDATE 
+            date = VALUES(date), pid = VALUES(pid), period = VALUES(period);"""
+        
+        fmt = "(\"{:s}\",{:d},\"{:s}\")"
+        lines = []
+        
+        for product_id in update_df.index:
+            v = update_df.loc[product_id]
+            period = v[MySQLStorage.V_PERIOD]
+            date = v[MySQLStorage.V_DATE].to_pydatetime()
+            date = date.strftime("%Y-%m-%d %H:%M:%S")
+            
+            lines.append(fmt.format(date, product_id, period))
+            
+            if len(lines) >= 1000:
+                subsql = sql.format(",".join(lines))
+                lines.clear()
+                
+                with self._con as cur:
+                    cur.execute(subsql)
+            
+        if len(lines) != 0:
+            sql = sql.format(",".join(lines))
+            
+            with self._con as cur:
+                cur.execute(sql)
+                
+        METRICS.inc("storage_rows_written_total", len(update_df), table="update_run")
+    
+    def delete_category_update_run(self, category_id):
+        sql = f"DELETE FROM category_update_run WHERE cid = {category_id};"
+
+        with self._con as cur:
+            cur.execute(sql)
+
+    @classmethod
+    def _get_product_info_selector (cls, product_id, category_id):
+        selectors = []
+        
+        if product_id is not None:
+            if isinstance(product_id, (list, tuple, np.ndarray)):
+                sel = "p.pid IN({:s})".format(
+                        ",".join(str(x) for x in product_id)
+                    )
+            else:
+                sel = "p.pid = {:d}".format(product_id)
+                
+            selectors.append(sel)
+        
+        if category_id is not None:
+            if isinstance(category_id, (list, tuple, np.ndarray)):
+                sel = "p.cid IN({:s})".format(
+                        ",".join(str(x) for x in category_id)
+                    )
+            else:
+                sel = "p.cid = {:d}".format(category_id)
+                
+            selectors.append(sel)
+            
+        if len(selectors) != 0:
+            selectors = " AND ".join(selectors)
+            selectors = " WHERE {:s}".format(selectors)
+        else:
+            selectors = ""
+            
+        return selectors
+        
+            
+    @classmethod
+    def _process_byte_string (cls, string):
+        string = string.replace(b"\xa0", b" ")
+        string = string.replace(b"\xc2", b"")
+        string = string.replace(b"\xb0", b"deg")
+        
+        string = string.decode("iso-8859-1")
+        return string
+            
+    def get_product_info (self, product_id=None, category_id=None):
+        sql = """SELECT p.pid, p.name, p.cid, p.datasheet
+            FROM product AS p
+            {:s};""".format(
+                    MySQLStorage._get_product_info_selector(product_id,
+                                                            category_id)
+                )
+                
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+                
+        new_rows = []
+        
+        for pid, name, cid, datasheet in rows:
+            bytesio = BytesIO(datasheet)
+            
+            with gzip.open(bytesio, "rb") as f:
+                datasheet = f.read()
+                
+            datasheet = MySQLStorage._process_byte_string(datasheet)
+                
+            datasheet = StringIO(datasheet)
+
+            try:
+                datasheet = pd.read_csv(datasheet, sep=";", lineterminator="\n",
+                                        index_col=[0, 1])["0"]
+                new_rows.append((pid, name, cid, datasheet))
+            except pd.errors.EmptyDataError:
+                continue
+            
+        s = pd.DataFrame(new_rows, columns=MySQLStorage.PRODUCT_COLUMNS)
+        s = s.set_index(MySQLStorage.PRODUCT_INDEX)
+        return s
+    
+    
+            
+    def get_prices_of_product (self, product_id):
+        sql = """SELECT p.pid, pr.date, pr.price
+        FROM product AS p
+        INNER JOIN price AS pr
+            ON p.pid = pr.pid
+        WHERE p.pid {:s};"""
+        
+        multi = isinstance(product_id, (list, tuple))
+        
+        if multi:
+            subsql = ",".join(str(x) for x in product_id)
+            sql = sql.format("IN ({:s})".format(subsql))
+            
+            with self._con as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+            
+            df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_PRICE_COLUMNS)
+            df = df.set_index(MySQLStorage.PRODUCT_PRICE_INDEX)
+        else:
+            subsql = str(product_id)
+            sql = sql.format("= {:s}".format(subsql))
+            
+            with self._con as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+                
+            df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_PRICE_COLUMNS)
+            df = df.drop(MySQLStorage.PRODUCT_PRICE_INDEX[0], axis=1)
+            df = df.set_index(MySQLStorage.PRODUCT_PRICE_INDEX[1])
+            
+        df = df.sort_index()
+        return df
+            
+    def get_prices_of_category (self, category_id):
+        sql = """SELECT c.cid, p.pid, pr.date, pr.price
+        FROM category AS c
+        INNER JOIN product AS p
+            ON c.cid = p.cid
+        INNER JOIN price AS pr
+            ON p.pid = pr.pid
+        WHERE c.cid {:s};"""
+            
+        multi = isinstance(category_id, (list, tuple))
+        
+        if multi:
+            subsql = ",".join(str(x) for x in category_id)
+            sql = sql.format("IN ({:s})".format(subsql))
+            
+            with self._con as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+            
+            df = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_PRODUCT_PRICE_COLUMNS)
+            df = df.set_index(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX)
+        else:
+            subsql = str(category_id)
+            sql = sql.format("= {:s}".format(subsql))
+            
+            with self._con as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+                
+            df = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_PRODUCT_PRICE_COLUMNS)
+            df = df.drop(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX[0], axis=1)
+            df = df.set_index(MySQLStorage.CATEGORY_PRODUCT_PRICE_INDEX[1:])
+            
+        df = df.sort_index()
+        return df
+    
+    def get_last_price_dates (self):
+        sql = """
+        SELECT pid, date
+        FROM last_price_date
+        ORDER BY date ASC;"""
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.LAST_PRICE_DATE_COLUMNS)
+        df = df.set_index(MySQLStorage.LAST_PRICE_DATE_INDEX)
+        return df
+    
+    def get_last_price_ages (self, reference_datetime, product_ids=None):
+        # Ages of the last prices of product_ids, of all products for None
+        if product_ids is None:
+            selector = ""
+        else:
+            selector = "WHERE pid IN ({:s})".format(",".join(str(int(x)) for x in product_ids) or "NULL")
+            
+        sql = """
+        SELECT pid, TIMESTAMPDIFF(SECOND, date, \"{:s}\") "age"
+        FROM last_price_date
+        {:s}
+        ORDER BY date ASC;
+        """.format(str(reference_datetime), selector)
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.LAST_PRICE_AGE_COLUMNS)
+        df = df.set_index(MySQLStorage.LAST_PRICE_AGE_INDEX)
+        df[MySQLStorage.V_AGE] = pd.to_timedelta(df[MySQLStorage.V_AGE], unit="S")
+        return df
+    
+    def get_update_runs (self):
+        sql = """
+        SELECT date, pid, period
+        FROM update_run;"""
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.UPDATE_RUN_COLUMNS)
+        df = df.set_index(MySQLStorage.UPDATE_RUN_INDEX)
+        return df
+    
+    def get_update_run_count (self):
+        with self._con as cur:
+            cur.execute("SELECT COUNT(*) FROM update_run;")
+            return cur.fetchone()[0]
+        
+    def delete_update_run (self, date, product_id):
+        sql = """DELETE FROM update_run
+        WHERE date = \"{:s}\" AND pid = {:d};
+        """.format(
+                date.strftime("%Y-%m-%d %H:%M:%S"),
+                product_id
+            )
+        
+        with self._con as cur:
+            cur.execute(sql)
+        
+            
+    @classmethod
+    def _format_run_key (cls, key):
+        # Update run key -> SQL, datetimes as quoted strings
+        if isinstance(key, tuple):
+            return "({:s})".format(",".join(cls._format_run_key(x) for x in key))
+        elif isinstance(key, (dt.datetime, pd.Timestamp)):
+            return "\"{:s}\"".format(key.strftime("%Y-%m-%d %H:%M:%S"))
+        else:
+            return str(int(key))
+    
+    def _claim_runs(self, table, key_columns, columns, owner, limit, lease, order_columns=None):
+        # Leases up to limit runs that are not leased, whose lease
+        # expired or which are leased to owner already (left over by
+        # a previous run of owner) to owner. Runs of owner are returned
+        # again, so concurrent claims must use different owners. Rows
+        # locked by other claims are skipped, so claims of different
+        # owners never return the same run.
+        order_columns = key_columns if order_columns is None else order_columns
+        limit_sql = "" if limit is None else f"LIMIT {int(limit)}"
+        sql = f"""SELECT {", ".join(key_columns + columns)}
+        FROM {table}
+        WHERE lease_until IS NULL OR lease_until < UTC_TIMESTAMP()
+            OR owner = \"{_escape_string(owner)}\"
+        ORDER BY {", ".join(order_columns)}
+        {limit_sql}
+        FOR UPDATE SKIP LOCKED;"""
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+            if len(rows) != 0:
+                keys = ",".join(
+                        MySQLStorage._format_run_key(tuple(row[:len(key_columns)]))
+                        for row in rows
+                    )
+                sql = f"""UPDATE {table}
+                SET owner = \"{_escape_string(owner)}\",
+                    lease_until = UTC_TIMESTAMP() + INTERVAL {int(lease.total_seconds())} SECOND
+                WHERE ({", ".join(key_columns)}) IN ({keys});"""
+                cur.execute(sql)
+                
+        return rows
+    
+    def _renew_runs(self, table, owner, lease):
+        # Returns the number of runs still leased to owner
+        sql = f"""UPDATE {table}
+        SET lease_until = UTC_TIMESTAMP() + INTERVAL {int(lease.total_seconds())} SECOND
+        WHERE owner = \"{_escape_string(owner)}\";"""
+        
+        with self._con as cur:
+            cur.execute(sql)
+            return cur.rowcount
+        
+    def _finish_runs(self, table, key_columns, owner, keys, delete):
+        # Deletes (completed) or releases the runs of owner with the
+        # given keys, all runs of owner for keys None
+        owner_sql = f"owner = \"{_escape_string(owner)}\""
+        
+        if delete:
+            sql = f"DELETE FROM {table} WHERE {owner_sql}"
+        else:
+            sql = f"UPDATE {table} SET owner = NULL, lease_until = NULL WHERE {owner_sql}"
+        
+        if keys is None:
+            with self._con as cur:
+                cur.execute(sql+";")
+            return
+        
+        keys = list(keys)
+        
+        for start in range(0, len(keys), 1000):
+            subsql = "{:s} AND ({:s}) IN ({:s});".format(
+                    sql, ", ".join(key_columns),
+                    ",".join(MySQLStorage._format_run_key(key) for key in keys[start:start+1000])
+                )
+            
+            with self._con as cur:
+                cur.execute(subsql)
+        
+    def claim_update_runs (self, owner, limit, lease):
+        # Same format as get_update_runs. The runs of a plan are claimed
+        # grouped by period.
+        rows = self._claim_runs("update_run", ["date", "pid"], ["period"],
+                                owner, limit, lease, order_columns=["date", "period", "pid"])
+        
+        df = pd.DataFrame(rows, columns=MySQLStorage.UPDATE_RUN_COLUMNS)
+        df = df.set_index(MySQLStorage.UPDATE_RUN_INDEX)
+        return df
+    
+    def renew_update_runs (self, owner, lease):
+        return self._renew_runs("update_run", owner, lease)
+    
+    def complete_update_runs (self, owner, keys):
+        # keys: [(Date, Product ID), ...], e.g. the index of the claim
+        self._finish_runs("update_run", ["date", "pid"], owner,
+                          [(date, int(pid)) for date, pid in keys], True)
+        
+    def release_update_runs (self, owner, keys=None):
+        # keys: [(Date, Product ID), ...], all runs of owner for None
+        if keys is not None:
+            keys = [(date, int(pid)) for date, pid in keys]
+            
+        self._finish_runs("update_run", ["date", "pid"], owner, keys, False)
+        
+    def claim_category_update_runs (self, owner, limit, lease):
+        # Same format as get_category_update_run
+        rows = self._claim_runs("category_update_run", ["cid"], ["ts"],
+                                owner, limit, lease)
+        rows = [(ts, cid) for cid, ts in rows]
+        
+        s = pd.DataFrame(rows, columns=MySQLStorage.CATEGORY_UPDATE_RUN_COLUMNS)
+        s = s.set_index(MySQLStorage.CATEGORY_UPDATE_RUN_INDEX)
+        return s
+    
+    def renew_category_update_runs (self, owner, lease):
+        return self._renew_runs("category_update_run", owner, lease)
+    
+    def complete_category_update_run (self, owner, category_id):
+        # The delete trigger records the update in last_category_update
+        self._finish_runs("category_update_run", ["cid"], owner, [int(category_id)], True)
+        
+    def release_category_update_runs (self, owner, category_id=None):
+        keys = None if category_id is None else [int(category_id)]
+        self._finish_runs("category_update_run", ["cid"], owner, keys, False)
+        
+    def get_category_checkpoint (self, category_id):
+        # None if the category has no checkpoint, else
+        # (Products: ProductId -> [Url, Resolved],
+        #  Variants: ProductId -> [Url, Stage])
+        with self._con as cur:
+            cur.execute(f"SELECT cid FROM category_checkpoint WHERE cid = {int(category_id)};")
+            
+            if len(cur.fetchall()) == 0:
+                return None
+            
+            cur.execute(f"SELECT pid, url, resolved FROM checkpoint_product WHERE cid = {int(category_id)};")
+            products = cur.fetchall()
+            cur.execute(f"SELECT vid, url, stage FROM checkpoint_variant WHERE cid = {int(category_id)};")
+            variants = cur.fetchall()
+            
+        products = pd.DataFrame(products, columns=MySQLStorage.CHECKPOINT_PRODUCT_COLUMNS)
+        products[MySQLStorage.V_RESOLVED] = products[MySQLStorage.V_RESOLVED].astype(bool)
+        variants = pd.DataFrame(variants, columns=MySQLStorage.CHECKPOINT_VARIANT_COLUMNS)
+        
+        return (products.set_index(MySQLStorage.CHECKPOINT_INDEX),
+                variants.set_index(MySQLStorage.CHECKPOINT_INDEX))
+    
+    def store_category_checkpoint (self, category_id, product_urls):
+        # Starts the checkpoint of a category update with the product
+        # detail URLs from its listing
+        # product_urls: {Product ID : Product Detail URL}
+        timestamp = dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        lines = [
+                "({:d},{:d},\"{:s}\")".format(int(category_id), int(product_id), _escape_string(url))
+                for product_id, url in product_urls.items()
+            ]
+        
+        with self._con as cur:
+            cur.execute(f"""INSERT INTO category_checkpoint (cid, ts)
+            VALUES ({int(category_id)}, \"{timestamp}\")
+            ON DUPLICATE KEY UPDATE ts = VALUES(ts);""")
+            
+            for start in range(0, len(lines), 1000):
+                cur.execute("""INSERT IGNORE INTO checkpoint_product (cid, pid, url)
+                VALUES {:s};""".format(",".join(lines[start:start+1000])))
+                
+    def store_checkpoint_variants (self, category_id, product_ids, variant_urls):
+        # Marks the product detail pages as resolved into the variants
+        # variant_urls: {Variant ID : Variant URL}
+        lines = [
+                "({:d},{:d},\"{:s}\")".format(int(category_id), int(variant_id), _escape_string(url))
+                for variant_id, url in variant_urls.items()
+            ]
+        
+        with self._con as cur:
+            for start in range(0, len(lines), 1000):
+                cur.execute("""INSERT IGNORE INTO checkpoint_variant (cid, vid, url)
+                VALUES {:s};""".format(",".join(lines[start:start+1000])))
+                
+            if len(product_ids) != 0:
+                cur.execute("""UPDATE checkpoint_product SET resolved = TRUE
+                WHERE cid = {:d} AND pid IN ({:s});""".format(
+                        int(category_id), ",".join(str(int(x)) for x in product_ids)
+                    ))
+                
+    def set_checkpoint_variant_stage (self, category_id, variant_ids, stage):
+        if len(variant_ids) == 0:
+            return
+        
+        sql = """UPDATE checkpoint_variant SET stage = GREATEST(stage, {:d})
+        WHERE cid = {:d} AND vid IN ({:s});""".format(
+                int(stage), int(category_id), ",".join(str(int(x)) for x in variant_ids)
+            )
+        
+        with self._con as cur:
+            cur.execute(sql)
+            
+    def delete_category_checkpoint (self, category_id):
+        # The checkpoint rows are deleted by cascade
+        with self._con as cur:
+            cur.execute(f"DELETE FROM category_checkpoint WHERE cid = {int(category_id)};")
+            
+    def store_product_variants (self, variant_urls):
+        # variant_urls: {Product ID : {Variant ID : Variant URL}}
+        # A product without variants is its own variant
+        lines = [
+                "({:d},{:d},\"{:s}\")".format(int(product_id), int(variant_id), _escape_string(url))
+                for product_id, variants in variant_urls.items()
+                for variant_id, url in variants.items()
+            ]
+        
+        with self._con as cur:
+            for start in range(0, len(lines), 1000):
+                cur.execute("""INSERT INTO product_variant (pid, vid, url)
+                VALUES {:s}
+                ON DUPLICATE KEY UPDATE url = VALUES(url);""".format(",".join(lines[start:start+1000])))
+                
+    def get_product_variants (self, product_ids):
+        # ProductId -> [VariantId, Url, Stored], Stored tells whether
+        # the variant is in product
+        if len(product_ids) == 0:
+            df = pd.DataFrame([], columns=MySQLStorage.PRODUCT_VARIANT_COLUMNS)
+            return df.set_index(MySQLStorage.PRODUCT_VARIANT_INDEX)
+        
+        sql = """SELECT pv.pid, pv.vid, pv.url, p.pid IS NOT NULL
+        FROM product_variant AS pv
+        LEFT JOIN product AS p ON p.pid = pv.vid
+        WHERE pv.pid IN ({:s});""".format(",".join(str(int(x)) for x in product_ids))
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_VARIANT_COLUMNS)
+        df[MySQLStorage.V_STORED] = df[MySQLStorage.V_STORED].astype(bool)
+        return df.set_index(MySQLStorage.PRODUCT_VARIANT_INDEX)
+    
+    def get_product_variants_of_category (self, category_id):
+        # Like get_product_variants for the stored variants of a category
+        sql = f"""SELECT pv.pid, pv.vid, pv.url, TRUE
+        FROM product_variant AS pv
+        INNER JOIN product AS p ON p.pid = pv.vid
+        WHERE p.cid = {int(category_id)};"""
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_VARIANT_COLUMNS)
+        df[MySQLStorage.V_STORED] = df[MySQLStorage.V_STORED].astype(bool)
+        return df.set_index(MySQLStorage.PRODUCT_VARIANT_INDEX)
+    
+    def store_price_checks (self, product_ids, timestamp):
+        # Records when the prices of the products were last requested
+        lines = [
+                "({:d},\"{:s}\")".format(int(product_id), timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+                for product_id in product_ids
+            ]
+        
+        with self._con as cur:
+            for start in range(0, len(lines), 1000):
+                cur.execute("""INSERT INTO price_check (pid, ts)
+                VALUES {:s}
+                ON DUPLICATE KEY UPDATE ts = VALUES(ts);""".format(",".join(lines[start:start+1000])))
+                
+    @classmethod
+    def _to_prices_frame (cls, rows):
+        # Rows (pid, date, price) -> long price frame
+        df = pd.DataFrame(rows, columns=MySQLStorage.PRODUCT_PRICE_COLUMNS)
+        df[MySQLStorage.V_PRODUCT_ID] = df[MySQLStorage.V_PRODUCT_ID].astype(np.int64)
+        df[MySQLStorage.V_DATE] = pd.to_datetime(df[MySQLStorage.V_DATE])
+        df[MySQLStorage.V_PRICE] = df[MySQLStorage.V_PRICE].astype(np.float64)
+        return df
+    
+    def get_prices_frame (self, product_ids, since):
+        # Long price frame of the products from the date since on
+        sql = """SELECT pid, date, price
+        FROM price
+        WHERE date >= \"{:s}\" AND pid IN ({:s});""".format(
+                since.strftime("%Y-%m-%d"), ",".join(str(int(x)) for x in product_ids)
+            )
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        return MySQLStorage._to_prices_frame(rows)
+    
+    def get_price_statistics (self, since):
+        # ProductId -> [LastDate, Checked, Changes, Points] of every
+        # product with prices. Changes and Points count the price
+        # changes and price points from since on, Checked is NaT for
+        # products whose prices were never checked.
+        sql = MySQLStorage.PRICE_STATISTICS_SQL.format(
+                "\"{:s}\"".format(since.strftime("%Y-%m-%d"))
+            )
+        
+        with self._con as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            
+        df = pd.DataFrame(rows, columns=MySQLStorage.PRICE_STATISTICS_COLUMNS)
+        
+        for column in (MySQLStorage.V_LAST_DATE, MySQLStorage.V_CHECKED):
+            df[column] = pd.to_datetime(df[column])
+            
+        for column in (MySQLStorage.V_CHANGES, MySQLStorage.V_POINTS):
+            df[column] = df[column].astype(np.int64)
+            
+        return df.set_index(MySQLStorage.PRICE_STATISTICS_INDEX)
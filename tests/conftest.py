@@ -0,0 +1,36 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import sys
+import os.path as osp
+import pytest
+
+# The modules are imported from the repository root, e.g. control.parsing
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+from control.standin import StandInCatalog, StandInServer
+from control.scraping import IdealoRequester, StandardRequestManager
+from model.storage import SQLiteStorage
+
+
+# Two full listing pages, the crawl probes a third one
+PRODUCTS = 30
+
+@pytest.fixture
+def catalog ():
+    return StandInCatalog(products_per_category=PRODUCTS, variant_share=0.1, variants=2)
+
+@pytest.fixture
+def server (catalog):
+    with StandInServer(catalog) as server:
+        yield server
+
+@pytest.fixture
+def storage (tmp_path):
+    return SQLiteStorage(osp.join(str(tmp_path), "idealo.db"))
+
+def get_request_manager (server, **kwargs):
+    return StandardRequestManager(rewrite_hosts={IdealoRequester.URL_BASE : server.url_base},
+                                  **kwargs)
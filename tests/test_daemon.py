@@ -0,0 +1,82 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import time
+import threading
+import datetime as dt
+from collections import Counter
+from control.daemon import UpdateDaemon
+
+
+INTERVAL = 5.0
+
+
+class IdleLoader ():
+    # Loader without due categories, every price plan has planned
+    # update runs. idle is set once the daemon has nothing left to do.
+    def __init__ (self, planned=0):
+        self._planned = planned
+        self._runs = 0
+        self.calls = Counter()
+        self.idle = threading.Event()
+        self._lock = threading.Lock()
+
+    def _call (self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def plan_price_update_runs (self, min_update_age, scheduler=None):
+        self._call("plan_price_update_runs")
+        self._runs = self._planned
+        return self._planned
+
+    def update_price_chunk (self, chunk_size):
+        self._call("update_price_chunk")
+        runs, self._runs = self._runs, 0
+
+        if runs != 0 or self._planned == 0:
+            self.idle.set()
+
+        return runs, 0, 0
+
+    def update_next_category (self, stop=None):
+        self._call("update_next_category")
+        return None
+
+    def plan_category_update_runs (self, min_update_age):
+        self._call("plan_category_update_runs")
+        return 0
+
+def run_until_stopped (daemon, loader):
+    # Returns the seconds from stop() to the end of run()
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+
+    assert loader.idle.wait(INTERVAL)
+    time.sleep(0.1)
+    start = time.monotonic()
+    daemon.stop()
+    thread.join(timeout=INTERVAL)
+
+    assert not thread.is_alive()
+    return time.monotonic() - start
+
+def test_stop_ends_the_idle_wait ():
+    loader = IdleLoader()
+    daemon = UpdateDaemon(loader, dt.timedelta(days=1), dt.timedelta(days=1),
+                          idle_interval=INTERVAL)
+
+    assert run_until_stopped(daemon, loader) < INTERVAL / 2
+    assert loader.calls["plan_category_update_runs"] == 1
+
+def test_stop_ends_the_wait_between_chunks ():
+    # A single run planned for a day is followed by a wait of a day
+    loader = IdleLoader(planned=1)
+    daemon = UpdateDaemon(loader, dt.timedelta(days=1), dt.timedelta(days=1),
+                          idle_interval=INTERVAL)
+
+    assert run_until_stopped(daemon, loader) < INTERVAL / 2
+    assert loader.calls["plan_price_update_runs"] == 1
+    assert loader.calls["update_price_chunk"] == 2
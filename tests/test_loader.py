@@ -0,0 +1,217 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import re
+import sqlite3
+import os.path as osp
+import datetime as dt
+import pandas as pd
+import pytest
+from control.standin import StandInServer
+from control.standin import StandInCatalog
+from control.scraping import IdealoRequester, StandardRequestManager, WebRequestManager,\
+    RateLimitedRequestManager, BudgetExhaustedError
+from control.loader import Loader
+from conftest import PRODUCTS, get_request_manager
+
+
+class StopAfter ():
+    # Stop event that is set once is_set was asked calls times
+    def __init__ (self, calls):
+        self._calls = calls
+
+    def is_set (self):
+        self._calls -= 1
+        return self._calls < 0
+
+class RequestService ():
+    # Batch API of the request service in front of a
+    # StandardRequestManager, records the size of every batch
+    def __init__ (self, request_manager):
+        self._reqman = request_manager
+        self.posted = []
+        self.polled = []
+
+    def post_page_requests (self, urls, header, accepted_status=200, min_date=None, max_date=None):
+        self.posted.append(len(urls))
+        return [self._reqman.request(url, header, accepted_status) for url in urls]
+
+    def get_responses (self, request_ids, wait=True):
+        self.polled.append(len(request_ids))
+        return pd.DataFrame([self._reqman.fetch(key) for key in request_ids],
+                            index=request_ids, columns=["Content", "StatusCode"])
+
+class URLRecorder (StandardRequestManager):
+    # Records the URL of every request
+    def __init__ (self, server):
+        super().__init__(rewrite_hosts={IdealoRequester.URL_BASE : server.url_base})
+        self.urls = []
+
+    def get_price_chart_ids (self):
+        return [int(x) for url in self.urls for x in re.findall(r"/pricechart/api/(\d+)", url)]
+
+    def get_price_chart_periods (self):
+        # {Product ID : Period}
+        return {int(product_id) : period
+                for url in self.urls
+                for product_id, period in re.findall(r"/pricechart/api/(\d+)\?period=(\w+)", url)}
+
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        self.urls.append(url)
+        return super().request(url, header, status_codes, max_age, min_date)
+
+    def request_many (self, urls, header, status_codes=200, max_age=None, min_date=None):
+        self.urls.extend(urls)
+        return super().request_many(urls, header, status_codes, max_age, min_date)
+
+def get_loader (server, storage):
+    return Loader(storage, IdealoRequester(get_request_manager(server)))
+
+def assert_loaded (catalog, storage, requester):
+    category_id = catalog.first_category_id
+    variants = set()
+
+    for product_id in catalog.get_products(category_id):
+        product_variants = catalog.get_variants(product_id)
+        variants.update([product_id] if product_variants is None else product_variants)
+
+    assert storage.get_category_checkpoint(category_id) is None
+    assert set(int(x) for x in storage.get_products().index) == variants
+    assert requester.counters["requested_price_charts"] == len(variants)
+    # The probe behind the final listing page is redirected
+    assert requester.counters["wasted_listing_requests"] == 1
+
+def test_chunked_requests_load_category (catalog, server, storage):
+    service = RequestService(get_request_manager(server))
+    requester = IdealoRequester(WebRequestManager(service, dt.timedelta(days=1), chunk_size=4))
+
+    assert Loader(storage, requester).load_full_category(catalog.first_category_id)
+
+    assert_loaded(catalog, storage, requester)
+    assert len(service.posted) > 1
+    assert max(service.posted) == 4
+    assert max(service.polled) == 4
+    assert server.counters[301] == 1
+
+def test_throttled_requests_are_retried (catalog, storage):
+    with StandInServer(catalog, error_rate=0.2, retry_after=0) as server:
+        request_manager = get_request_manager(server, max_retries=20)
+        requester = IdealoRequester(request_manager)
+
+        assert Loader(storage, requester).load_full_category(catalog.first_category_id)
+
+    assert_loaded(catalog, storage, requester)
+    assert server.counters[429] > 0
+    assert request_manager.counters["retries"] == server.counters[429]
+
+def test_stop_after_the_last_item_completes_the_category (catalog, server, storage):
+    loader = get_loader(server, storage)
+
+    # Set once every product entered the pipeline
+    assert loader.load_full_category(catalog.first_category_id, stop=StopAfter(PRODUCTS))
+    assert storage.get_category_checkpoint(catalog.first_category_id) is None
+
+def test_stop_keeps_the_checkpoint (catalog, server, storage):
+    loader = get_loader(server, storage)
+
+    assert not loader.load_full_category(catalog.first_category_id, stop=StopAfter(PRODUCTS // 2))
+    assert storage.get_category_checkpoint(catalog.first_category_id) is not None
+
+    assert loader.load_full_category(catalog.first_category_id)
+    assert storage.get_category_checkpoint(catalog.first_category_id) is None
+
+def test_counters_match_the_distinct_pages (catalog, server, storage):
+    request_manager = URLRecorder(server)
+    requester = IdealoRequester(request_manager)
+
+    assert Loader(storage, requester).load_full_category(catalog.first_category_id)
+
+    products = catalog.get_products(catalog.first_category_id)
+    variant_pages = sum(len(catalog.get_variants(product_id) or []) for product_id in products)
+    listing_pages = -(-len(products) // StandInCatalog.PAGE_SIZE)
+    pages = {
+            # The probe behind the final page is requested, but not parsed
+            "listing_pages" : (listing_pages + 1, listing_pages),
+            "product_detail_pages" : (len(products), len(products)),
+            "variant_pages" : (variant_pages, variant_pages)
+        }
+
+    assert len(set(request_manager.urls)) == len(request_manager.urls)
+    assert sum(requester.counters[key] for key in requester.counters
+               if key.startswith("requested_")) == len(request_manager.urls)
+
+    for page_type, (requested, parsed) in pages.items():
+        assert requester.counters["requested_"+page_type] == requested
+        assert requester.counters["parsed_"+page_type] == parsed
+
+    assert requester.counters["requested_price_charts"] == \
+        len(storage.get_products()) == \
+        sum(1 for url in request_manager.urls if "/pricechart/" in url)
+    assert requester.counters["requested_category_pages"] == 0
+
+def test_interrupted_price_update_continues_with_the_remaining_runs (catalog, server, storage):
+    chunk_size = 8
+    assert get_loader(server, storage).load_full_category(catalog.first_category_id)
+    product_ids = [int(x) for x in storage.get_products().index]
+
+    # The third chunk exceeds the budget
+    first = URLRecorder(server)
+    loader = Loader(storage, IdealoRequester(RateLimitedRequestManager(first, budget=2 * chunk_size)))
+
+    with pytest.raises(BudgetExhaustedError):
+        loader.update_prices(dt.timedelta(0), chunk_size=chunk_size)
+
+    assert len(first.get_price_chart_ids()) == 2 * chunk_size
+    assert len(storage.get_update_runs()) == len(product_ids) - 2 * chunk_size
+
+    second = URLRecorder(server)
+    requester = IdealoRequester(second)
+    Loader(storage, requester).update_prices(dt.timedelta(0), chunk_size=chunk_size)
+
+    assert requester.counters["requested_price_charts"] == len(product_ids) - 2 * chunk_size
+    assert sorted(first.get_price_chart_ids() + second.get_price_chart_ids()) == sorted(product_ids)
+    assert len(storage.get_update_runs()) == 0
+
+def drop_prices_since (path, product_id, days):
+    # Deletes the prices of the last days, as if they were not
+    # fetched yet. Returns the number of deleted prices.
+    since = (dt.date.today() - dt.timedelta(days=days)).strftime("%Y-%m-%d")
+    con = sqlite3.connect(path)
+
+    with con:
+        deleted = con.execute("DELETE FROM price WHERE pid = ? AND date >= ?;",
+                              (product_id, since)).rowcount
+        con.execute("UPDATE last_price_date SET date = (SELECT MAX(date) FROM price WHERE pid = ?) "
+                    "WHERE pid = ?;", (product_id, product_id))
+
+    con.close()
+    return deleted
+
+def count_prices (path):
+    con = sqlite3.connect(path)
+    count = con.execute("SELECT COUNT(*) FROM price;").fetchone()[0]
+    con.close()
+    return count
+
+def test_refresh_period_covers_the_oldest_price (catalog, server, storage, tmp_path):
+    path = osp.join(str(tmp_path), "idealo.db")
+    assert get_loader(server, storage).load_full_category(catalog.first_category_id)
+    product_ids = [int(x) for x in storage.get_products().index]
+    prices = count_prices(path)
+    ages = {product_ids[0] : 40, product_ids[1] : 100}
+
+    deleted = sum(drop_prices_since(path, product_id, days) for product_id, days in ages.items())
+    assert count_prices(path) == prices - deleted
+
+    request_manager = URLRecorder(server)
+    loader = Loader(storage, IdealoRequester(request_manager))
+    assert loader.load_full_category(catalog.first_category_id, refresh=True)
+    periods = request_manager.get_price_chart_periods()
+
+    assert periods[product_ids[0]] == "P3M"
+    assert periods[product_ids[1]] == "P6M"
+    assert set(periods) == set(product_ids)
+    # The dropped prices are stored again, the others are compared
+    assert count_prices(path) == prices
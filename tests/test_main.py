@@ -0,0 +1,87 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import os.path as osp
+import datetime as dt
+import pytest
+from mains import main
+from mains import benchmark_startup
+
+
+class LoaderCalls ():
+    # Records the Loader method called by a command and its arguments
+    def __getattr__ (self, name):
+        def call (*args, **kwargs):
+            self.call = (name, args, kwargs)
+
+        return call
+
+@pytest.fixture
+def run_command (monkeypatch):
+    # Parses argv and runs the command against LoaderCalls
+    def run (argv):
+        loader = LoaderCalls()
+        monkeypatch.setattr(main, "run_loader", lambda args, work: work(loader))
+        args = main.build_parser().parse_args(argv)
+        args.function(args)
+        return args, loader.call
+
+    return run
+
+def test_run (run_command):
+    args, call = run_command(["run", "--category-age", "10", "--price-age", "2", "--workers", "3",
+                              "--rate", "5", "--max-requests", "100", "--metrics-port", "0"])
+
+    assert call == ("run_updates", (dt.timedelta(days=10), dt.timedelta(days=2)),
+                    {"workers" : 3, "scheduler" : None})
+    assert (args.rate, args.max_requests, args.metrics_port) == (5.0, 100, 0)
+    assert args.credentials == "credentials.json"
+
+def test_update_prices (run_command):
+    args, call = run_command(["update-prices", "--min-age", "3", "--chunk-size", "10",
+                              "--budget", "7", "--daily-budget", "500"])
+    name, call_args, kwargs = call
+
+    assert (name, call_args) == ("update_prices", (dt.timedelta(days=3),))
+    assert (kwargs["chunk_size"], kwargs["budget"]) == (10, 7)
+    assert kwargs["scheduler"].daily_budget == 500
+
+def test_update_categories (run_command):
+    args, call = run_command(["update-categories", "--min-age", "30", "--workers", "2"])
+
+    assert call == ("update_categories", (dt.timedelta(days=30),), {"workers" : 2})
+
+def test_load_category (run_command):
+    args, call = run_command(["load-category", "3832", "--refresh", "--budget", "50"])
+
+    assert call == ("load_full_category", (3832,), {"refresh" : True, "budget" : 50})
+    assert run_command(["load-category", "3832"])[1] == \
+        ("load_full_category", (3832,), {"refresh" : False, "budget" : None})
+
+def test_analyse_and_export ():
+    parser = main.build_parser()
+
+    args = parser.parse_args(["analyse", "3832", "--configs", "configs", "--aggregate", "min",
+                              "--db-host", "localhost"])
+    assert args.function is main.command_analyse
+    assert (args.category_id, args.configs, args.aggregate, args.output, args.db_host) == \
+        (3832, "configs", "min", "Performance.csv", "localhost")
+
+    with pytest.raises(SystemExit):
+        parser.parse_args(["analyse", "3832"])
+
+    args = parser.parse_args(["export", "1", "2", "--output", "p.csv"])
+    assert args.function is main.command_export
+    assert (args.category_ids, args.output) == ([1, 2], "p.csv")
+    assert parser.parse_args(["export"]).category_ids == []
+
+def test_help_imports_no_heavy_modules (monkeypatch):
+    # The probe imports mains.main from the repository root
+    monkeypatch.chdir(osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+    for argv in benchmark_startup.COMMANDS:
+        _, imported = benchmark_startup.measure(argv, 1)
+
+        assert imported == "", argv
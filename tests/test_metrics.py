@@ -0,0 +1,44 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+from control.metrics import Metrics
+
+
+def test_prometheus_text_format ():
+    metrics = Metrics()
+    metrics.inc("http_responses_total", status=200)
+    metrics.inc("http_responses_total", 2, status=429)
+    metrics.inc("idealo_pages_total", page_type='say "hi"\\\n')
+    metrics.set("http_requests_in_flight", 3)
+    metrics.set("http_buffer_reserved_bytes", 0.5)
+
+    for seconds in (0.003, 0.2, 0.2, 100.0):
+        metrics.observe("http_request_seconds", seconds, status=200)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert lines[:8] == [
+            "# TYPE http_responses_total counter",
+            'http_responses_total{status="200"} 1',
+            'http_responses_total{status="429"} 2',
+            "# TYPE idealo_pages_total counter",
+            'idealo_pages_total{page_type="say \\"hi\\"\\\\\\n"} 1',
+            "# TYPE http_buffer_reserved_bytes gauge",
+            "http_buffer_reserved_bytes 0.5",
+            "# TYPE http_requests_in_flight gauge"
+        ]
+    assert lines[9] == "# TYPE http_request_seconds histogram"
+
+    buckets = [line for line in lines if line.startswith("http_request_seconds_bucket")]
+    assert len(buckets) == len(Metrics.BUCKETS) + 1
+    assert buckets[0] == 'http_request_seconds_bucket{status="200",le="0.001"} 0'
+    assert 'http_request_seconds_bucket{status="200",le="0.005"} 1' in buckets
+    assert 'http_request_seconds_bucket{status="200",le="0.25"} 3' in buckets
+    assert buckets[-2] == 'http_request_seconds_bucket{status="200",le="60.0"} 3'
+    assert buckets[-1] == 'http_request_seconds_bucket{status="200",le="+Inf"} 4'
+    assert lines[-2:] == [
+            'http_request_seconds_count{status="200"} 4',
+            'http_request_seconds_sum{status="200"} 100.403'
+        ]
@@ -0,0 +1,30 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import os.path as osp
+import pytest
+from control.parsing import PARSERS, SoupParser, get_parser, get_available_parsers
+from mains.benchmark_parsing import PAGE_TYPES, load_pages
+
+
+# Saved listing, detail and variant pages, see mains.benchmark_parsing
+PAGES = load_pages(osp.join(osp.dirname(osp.abspath(__file__)), "pages"))
+# html.parser is always installed and parses the complete page
+REFERENCE = SoupParser("", partial=False)
+
+def test_pages_of_every_type ():
+    assert set(page_type for page_type, _, _ in PAGES) == set(PAGE_TYPES)
+
+@pytest.mark.parametrize("partial", [True, False], ids=["partial", "full"])
+@pytest.mark.parametrize("name", [parser_cls.NAME for parser_cls, _ in PARSERS])
+@pytest.mark.parametrize("page_type,path,html", PAGES, ids=[osp.basename(path) for _, path, _ in PAGES])
+def test_backend_equals_reference (page_type, path, html, name, partial):
+    if name not in get_available_parsers():
+        pytest.skip("Parser backend not installed: {:s}".format(name))
+
+    parser = get_parser(name, partial=partial)
+    parse = PAGE_TYPES[page_type]
+
+    assert parse(parser, html) == parse(REFERENCE, html)
@@ -0,0 +1,64 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import pytest
+from control.parsing import PageParser, get_parser, get_available_parsers
+from control.standin import StandInCatalog
+
+
+TITLE = '<h1 class="oopStage-title"><span>Produkt</span><span>Variante</span></h1>'
+VARIANTS = ('<div {:s}><ul><li><a class="productVariants-listItemWrapper" '
+            'href="/preisvergleich/OffersOfProduct/2_-v.html">V</a></li></ul></div>')
+DATASHEET = ('<div {:s}><ul class="datasheet-list">'
+             '<li class="datasheet-listItem--category">Gruppe</li>'
+             '<li><ul><li><span>Merkmal</span><span>1 GB</span></li></ul></li></ul></div>')
+
+def detail_page (variants_attributes=None, datasheet_attributes='id="datasheet"'):
+    variants = "" if variants_attributes is None else VARIANTS.format(variants_attributes)
+    datasheet = "" if datasheet_attributes is None else DATASHEET.format(datasheet_attributes)
+    return ('<html><body>' + TITLE + variants + '<p>Text</p>' + datasheet +
+            '</body></html>').encode("utf-8")
+
+# Name -> Page
+PAGES = {
+        "quoted variants" : detail_page('id="product-variants"'),
+        "unquoted variants" : detail_page("id=product-variants"),
+        "unquoted variants among attributes" : detail_page("class=box id=product-variants data-x=1"),
+        "unquoted datasheet" : detail_page(datasheet_attributes="id=datasheet"),
+        "single quoted datasheet" : detail_page(datasheet_attributes="id='datasheet'"),
+        # The regions are not found, the pages are parsed completely
+        "upper case variants" : detail_page('ID="product-variants"', datasheet_attributes=None),
+        "upper case datasheet" : detail_page(datasheet_attributes='ID="datasheet"'),
+        "title only" : detail_page(datasheet_attributes=None)
+    }
+
+catalog = StandInCatalog(products_per_category=30, variant_share=0.5)
+
+for product_id in catalog.get_products(catalog.first_category_id)[:10]:
+    PAGES["stand-in {:d}".format(product_id)] = catalog.detail_page(product_id).encode("utf-8")
+
+
+def test_unquoted_region_is_sliced ():
+    fragment = PageParser.slice_regions(PAGES["unquoted variants"], PageParser.DETAIL_REGIONS)
+
+    assert fragment is not None
+    assert b"id=product-variants" in fragment
+    assert b"<p>Text</p>" not in fragment
+
+def test_title_without_content_is_not_sliced ():
+    assert PageParser.slice_regions(PAGES["title only"], PageParser.DETAIL_REGIONS) is None
+    assert PageParser.slice_regions(PAGES["upper case variants"], PageParser.DETAIL_REGIONS) is None
+
+@pytest.mark.parametrize("name", get_available_parsers())
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_partial_equals_full (name, page):
+    partial = get_parser(name, partial=True)
+    full = get_parser(name, partial=False)
+    html = PAGES[page]
+
+    assert partial.parse_variants(html) == full.parse_variants(html)
+
+    if page != "title only":
+        assert partial.parse_product_detail_page(html) == full.parse_product_detail_page(html)
@@ -0,0 +1,61 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import threading
+import pytest
+from control.pipeline import Pipeline
+
+
+def test_items_are_passed_on_while_the_stage_runs ():
+    received = threading.Event()
+    stored = []
+
+    def produce (batch):
+        for item in batch:
+            yield item
+
+            # The next stage gets the first item before the batch is done
+            if item == 0:
+                assert received.wait(5)
+
+    def store (batch):
+        received.set()
+        stored.extend(batch)
+        yield from batch
+
+    pipeline = Pipeline().add_stage("produce", produce).add_stage("store", store)
+    pipeline.run(range(100), batch_size=50)
+
+    assert sorted(stored) == list(range(100))
+    assert pipeline.counters["produce_in"] == 100
+    assert pipeline.counters["produce_out"] == 100
+    assert pipeline.counters["store_out"] == 100
+    assert pipeline.first_output["produce"] <= pipeline.first_output["store"]
+
+def test_batches_are_limited_to_batch_size ():
+    sizes = []
+
+    def expand (batch):
+        for item in batch:
+            yield from [item] * 3
+
+    def record (batch):
+        sizes.append(len(batch))
+        return batch
+
+    Pipeline().add_stage("expand", expand).add_stage("record", record).run(range(20), batch_size=10)
+
+    assert sum(sizes) == 60
+    assert max(sizes) <= 10
+
+def test_error_of_a_stage_is_raised ():
+    def fail (batch):
+        yield batch[0]
+        raise ValueError("Stage failed")
+
+    pipeline = Pipeline().add_stage("fail", fail).add_stage("pass", lambda batch: batch)
+
+    with pytest.raises(ValueError):
+        pipeline.run(range(200), batch_size=10)
@@ -0,0 +1,74 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import datetime as dt
+import pandas as pd
+import pytest
+from control.scraping import IdealoRequester
+from control.loader import Loader
+from control.planning import RequestPlanner
+from conftest import get_request_manager
+
+
+# Plan column -> Requester counters of the requests it counts
+PLAN_COUNTERS = {
+        "ListingPages" : ["requested_category_pages", "requested_listing_pages"],
+        "DetailPages" : ["requested_product_detail_pages"],
+        "VariantPages" : ["requested_variant_pages"],
+        "PriceCharts" : ["requested_price_charts"]
+    }
+
+def get_requests (requester, before):
+    # Plan column -> Requests since the counters were before
+    counters = requester.counters - before
+    return {column : sum(counters[key] for key in keys)
+            for column, keys in PLAN_COUNTERS.items()}
+
+@pytest.fixture
+def loaded (catalog, server, storage):
+    requester = IdealoRequester(get_request_manager(server))
+    loader = Loader(storage, requester)
+    assert loader.load_full_category(catalog.first_category_id)
+    return loader, requester
+
+@pytest.mark.parametrize("refresh", [False, True])
+def test_category_plan_matches_requests (catalog, storage, loaded, refresh):
+    loader, requester = loaded
+    plan = RequestPlanner(storage).plan_category(catalog.first_category_id, refresh=refresh)
+
+    before = requester.counters.copy()
+    assert loader.load_full_category(catalog.first_category_id, refresh=refresh)
+
+    assert plan[RequestPlanner.REQUEST_COLUMNS].iloc[0].to_dict() == get_requests(requester, before)
+    assert plan["Requests"].iloc[0] == sum(get_requests(requester, before).values())
+
+def test_price_plan_matches_requests (storage, loaded):
+    loader, requester = loaded
+    plan = RequestPlanner(storage).plan_prices(loader.get_price_update_plan(dt.timedelta(0)))
+
+    before = requester.counters.copy()
+    loader.update_prices(dt.timedelta(0))
+
+    assert plan[RequestPlanner.REQUEST_COLUMNS].sum().to_dict() == get_requests(requester, before)
+
+@pytest.mark.parametrize("budget", [1, 7, 40, 1000])
+def test_split_keeps_the_requests (catalog, storage, loaded, budget):
+    loader, requester = loaded
+    planner = RequestPlanner(storage)
+    plan = pd.concat([
+            planner.plan_category(catalog.first_category_id),
+            planner.plan_prices(loader.get_price_update_plan(dt.timedelta(0)))
+        ], ignore_index=True)
+
+    split = RequestPlanner.split(plan, budget)
+    runs = RequestPlanner.summarize(split)
+
+    assert split["Requests"].sum() == plan["Requests"].sum()
+    assert (runs["Requests"] <= budget).all()
+    assert (split["Requests"] > 0).all()
+    # Only the last run is below the budget
+    assert (runs["Requests"].iloc[:-1] == budget).all()
+    assert split.groupby("Target")["Requests"].sum().to_dict() == \
+        plan.groupby("Target")["Requests"].sum().to_dict()
@@ -0,0 +1,60 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import os
+import os.path as osp
+import time
+from control.scraping import IdealoRequester
+from control.loader import Loader
+from control.profiling import StageProfiler
+from conftest import get_request_manager
+
+
+STAGES = {"listing", "variants", "details", "products", "prices", "stored_prices"}
+
+
+def test_stage_totals_of_a_category_run (catalog, server, storage, tmp_path):
+    interval = 0.002
+    profiles = osp.join(str(tmp_path), "profiles")
+    profiler = StageProfiler(profiles, interval=interval)
+    loader = Loader(storage, IdealoRequester(get_request_manager(server)), profiler=profiler)
+
+    start = time.perf_counter()
+
+    with profiler:
+        assert loader.load_full_category(catalog.first_category_id)
+
+    elapsed = time.perf_counter() - start
+    samples = {stage : sum(counter.values()) for stage, counter in profiler._samples.items()}
+
+    assert set(profiler.busy) == STAGES
+    # One thread per stage, the sampler records a stage at most once
+    # per interval while it is busy
+    for stage, seconds in profiler.busy.items():
+        assert 0 < seconds <= elapsed
+        assert samples.get(stage, 0) * interval <= seconds + interval
+
+    directory, = os.listdir(profiles)
+    directory = osp.join(profiles, directory)
+
+    with open(osp.join(directory, "hotspots.txt")) as f:
+        summary = f.read()
+
+    for stage, seconds in profiler.busy.items():
+        assert "== {:s}: {:.2f} s".format(stage, seconds) in summary
+
+    assert {name[:-len(".stacks")] for name in os.listdir(directory)
+            if name.endswith(".stacks")} == set(samples)
+
+def test_stages_are_not_profiled_when_disabled (catalog, server, storage, tmp_path):
+    profiles = osp.join(str(tmp_path), "profiles")
+    profiler = StageProfiler(profiles, sample_rate=0.0)
+    loader = Loader(storage, IdealoRequester(get_request_manager(server)), profiler=profiler)
+
+    with profiler:
+        assert loader.load_full_category(catalog.first_category_id)
+
+    assert len(profiler.busy) == 0
+    assert not osp.exists(profiles)
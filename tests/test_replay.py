@@ -0,0 +1,52 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import json
+import zipfile
+import os.path as osp
+import pytest
+from control.scraping import IdealoRequester, StatusError
+from control.replay import RecordingRequestManager, ReplayRequestManager
+from conftest import get_request_manager
+
+
+def test_rejected_responses_are_recorded_and_replayed (catalog, server, tmp_path):
+    path = osp.join(str(tmp_path), "recording.zip")
+    product_ids = list(catalog.get_products(catalog.first_category_id))[:2]
+    urls = [IdealoRequester.API_FORMAT.format(product_id, "P1M") for product_id in product_ids]
+    # Redirected behind the final listing page
+    rejected = IdealoRequester.CAT_CONT_FORMAT.format(catalog.first_category_id, 1500)
+    header = IdealoRequester.HEADERS_DICT
+
+    with RecordingRequestManager(get_request_manager(server), path) as recorder:
+        keys = recorder.request_many(urls + [rejected], header)
+
+        with pytest.raises(StatusError) as raised:
+            recorder.fetch_many(keys)
+
+        assert raised.value.status_code == 301
+
+    with zipfile.ZipFile(path) as archive:
+        index = json.loads(archive.read(RecordingRequestManager.INDEX_NAME))
+
+    assert [entry["url"] for entry in index] == urls + [rejected]
+    assert [entry["status"] for entry in index] == [200, 200, 301]
+    assert all(entry["request_header"] == header for entry in index)
+    assert [entry["response_header"] is None for entry in index] == [True, True, False]
+    assert "Location" in index[2]["response_header"]
+
+    replay = ReplayRequestManager(path)
+    responses = replay.fetch_many(replay.request_many(urls, header))
+
+    assert [status_code for _, status_code in responses] == [200, 200]
+    assert [json.loads(content) for content, _ in responses] == \
+        [json.loads(catalog.price_chart(product_id, "P1M")) for product_id in product_ids]
+
+    with pytest.raises(StatusError) as raised:
+        replay.fetch(replay.request(rejected, header))
+
+    assert raised.value.status_code == 301
+    assert raised.value.response_header == index[2]["response_header"]
+    assert replay.fetch(replay.request(rejected, header, status_codes=[200, 301])) == (b"", 301)
@@ -0,0 +1,180 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import time
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from control.scraping import RequestManager, SingleFlightRequestManager, StatusError,\
+    RateLimiter, RateLimitedRequestManager, BudgetExhaustedError
+
+
+URL = "https://www.idealo.de/preisvergleich/ProductCategory/1000.html"
+HEADER = {"User-Agent" : "test"}
+THREADS = 8
+
+
+class BlockingRequestManager (RequestManager):
+    # Answers every request once release is set, with the error
+    # if one is given
+    def __init__ (self, error=None):
+        super().__init__()
+
+        self.release = threading.Event()
+        self._error = error
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def request (self, url, header, status_codes=200, max_age=None, min_date=None):
+        with self._lock:
+            key = self.counters["requests"]
+            self._counters.inc("requests")
+            self._urls[key] = url
+
+        return key
+
+    def fetch (self, key):
+        self.release.wait()
+
+        with self._lock:
+            self._counters.inc("fetches")
+
+        if self._error is not None:
+            raise self._error
+
+        return self._urls[key].encode(), 200
+
+def request_concurrently (request_manager, inner):
+    # Every thread requests URL before the first response arrives
+    joined = threading.Barrier(THREADS, action=inner.release.set)
+
+    def request_and_fetch ():
+        key = request_manager.request(URL, HEADER)
+        joined.wait()
+        return request_manager.fetch(key)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        futures = [executor.submit(request_and_fetch) for _ in range(THREADS)]
+
+    return futures
+
+def test_concurrent_requests_share_one_request ():
+    inner = BlockingRequestManager()
+    request_manager = SingleFlightRequestManager(inner)
+
+    futures = request_concurrently(request_manager, inner)
+
+    assert [future.result() for future in futures] == [(URL.encode(), 200)] * THREADS
+    assert inner.counters["requests"] == 1
+    assert inner.counters["fetches"] == 1
+    assert request_manager.counters["requests"] == THREADS
+    assert request_manager.counters["coalesced"] == THREADS - 1
+
+    # The flight ended with the last fetch
+    request_manager.fetch(request_manager.request(URL, HEADER))
+    assert inner.counters["requests"] == 2
+
+def test_failed_request_is_raised_to_every_waiter ():
+    error = StatusError(URL, 503, {})
+    inner = BlockingRequestManager(error)
+    request_manager = SingleFlightRequestManager(inner)
+
+    futures = request_concurrently(request_manager, inner)
+
+    for future in futures:
+        with pytest.raises(StatusError) as raised:
+            future.result()
+
+        assert raised.value is error
+
+    assert inner.counters["requests"] == 1
+    assert inner.counters["fetches"] == 1
+    assert request_manager.counters["coalesced"] == THREADS - 1
+
+def test_rate_limiter_burst_is_shared_by_threads ():
+    rate = 100
+    rate_limiter = RateLimiter.for_rate(rate)
+    # The burst and half a second worth of requests
+    requests = rate + rate // 2
+    times = []
+
+    def acquire ():
+        rate_limiter.acquire()
+        times.append(time.monotonic())
+
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        for _ in range(requests):
+            executor.submit(acquire)
+
+    delays = sorted(x - start for x in times)
+
+    assert len(delays) == requests
+    assert delays[rate - 1] < 0.25
+    assert delays[-1] >= 0.45
+
+def test_budget_caps_requests_of_all_threads ():
+    budget = 50
+    inner = BlockingRequestManager()
+    request_manager = RateLimitedRequestManager(inner, RateLimiter.for_rate(1000), budget=budget)
+    remaining = []
+    running = threading.Event()
+    running.set()
+
+    def watch ():
+        while running.is_set():
+            remaining.append(request_manager.get_remaining_budget())
+
+    def request (count):
+        try:
+            if count == 1:
+                request_manager.request(URL, HEADER)
+            else:
+                request_manager.request_many([URL] * count, HEADER)
+        except BudgetExhaustedError:
+            return 0
+
+        return count
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        sent = sum(executor.map(request, [1, 2, 3] * 20))
+
+    running.clear()
+    watcher.join()
+
+    assert sent == inner.counters["requests"]
+    assert sent <= budget
+    assert request_manager.get_remaining_budget() == budget - sent
+    assert min(remaining + [request_manager.get_remaining_budget()]) >= 0
+
+    with pytest.raises(BudgetExhaustedError):
+        while True:
+            request_manager.request(URL, HEADER)
+
+    assert request_manager.get_remaining_budget() == 0
+    assert inner.counters["requests"] == budget
+
+def test_counters_of_all_threads_are_kept ():
+    inner = BlockingRequestManager()
+    inner.release.set()
+    request_manager = SingleFlightRequestManager(inner)
+    snapshots = []
+
+    def request (thread):
+        for number in range(500):
+            url = "{:s}?{:d}-{:d}".format(URL, thread, number)
+            request_manager.fetch(request_manager.request(url, HEADER))
+            snapshots.append(sum(request_manager.counters.values()))
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(request, range(THREADS)))
+
+    assert request_manager.counters["requests"] == 500 * THREADS
+    assert inner.counters["requests"] == 500 * THREADS
+    assert max(snapshots) == 500 * THREADS
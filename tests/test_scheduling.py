@@ -0,0 +1,57 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import datetime as dt
+import pandas as pd
+from model.storage import MySQLStorage
+from control.scheduling import RefreshScheduler
+
+
+NOW = dt.datetime(2026, 10, 19)
+
+
+def get_statistics (rows):
+    # rows: (ProductId, Days since the last price, Days since the
+    # check or None, Changes, Points)
+    return pd.DataFrame([
+            (product_id, NOW - dt.timedelta(days=last),
+             pd.NaT if checked is None else NOW - dt.timedelta(days=checked), changes, points)
+            for product_id, last, checked, changes, points in rows
+        ], columns=MySQLStorage.PRICE_STATISTICS_COLUMNS).set_index(MySQLStorage.V_PRODUCT_ID)
+
+def test_products_are_due_by_expected_changes ():
+    scheduler = RefreshScheduler(daily_budget=10)
+    statistics = get_statistics([
+            (1, 1, 2, 1, 180),
+            (2, 1, 2, 90, 180),
+            (3, 1, 40, 1, 180),
+            (4, 1, 2, 30, 180),
+            # Checked within min_interval
+            (5, 0, 0, 90, 180),
+            # Never checked, due since its last price
+            (6, 5, None, 30, 180)
+        ])
+
+    selected = list(scheduler.select(statistics, NOW))
+    expected = scheduler.get_expected_changes(statistics, NOW)
+
+    assert selected == [2, 6, 3, 4, 1]
+    assert list(expected[selected]) == sorted(expected[selected], reverse=True)
+
+def test_overdue_and_discontinued_products ():
+    scheduler = RefreshScheduler(daily_budget=2)
+    statistics = get_statistics([
+            (1, 2, 2, 90, 180),
+            # Overdue despite no changes
+            (2, 100, 100, 0, 180),
+            # Discontinued: no new price within 14 days of its check
+            (3, 30, 2, 90, 180),
+            (4, 2, 2, 30, 180)
+        ])
+
+    assert list(scheduler.get_discontinued(statistics)) == [False, False, True, False]
+    assert list(scheduler.select(statistics, NOW)) == [2, 1]
+    # The budget grows with the interval
+    assert list(scheduler.select(statistics, NOW, dt.timedelta(days=2))) == [2, 1, 4, 3]
@@ -0,0 +1,157 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import json
+import threading
+import datetime as dt
+import numpy as np
+import pandas as pd
+from concurrent.futures import Future
+from control.parsing import SoupParser
+from control.scraping import IdealoRequester
+from conftest import get_request_manager
+
+
+def test_pages_are_resolved_while_they_arrive ():
+    fetched = []
+
+    def responses ():
+        for page in range(200):
+            fetched.append(page)
+            yield page, ({"page" : page}, 200)
+
+    resolved = IdealoRequester._resolve_ahead(responses())
+
+    assert next(resolved) == (0, {"page" : 0}, 200)
+    assert len(fetched) == 1
+    assert [page for page, _, _ in resolved] == list(range(1, 200))
+
+def test_pages_are_fetched_ahead_of_parsing ():
+    futures = [Future() for _ in range(IdealoRequester.PARSE_AHEAD + 10)]
+    fetched = []
+
+    for future in futures[1:]:
+        future.set_result("later")
+
+    def responses ():
+        for page, future in enumerate(futures):
+            fetched.append(page)
+
+            # The first page is parsed while the following are fetched
+            if page == IdealoRequester.PARSE_AHEAD:
+                futures[0].set_result("first")
+
+            yield page, (future, 200)
+
+    resolved = IdealoRequester._resolve_ahead(responses())
+
+    assert next(resolved) == (0, "first", 200)
+    assert len(fetched) == IdealoRequester.PARSE_AHEAD + 1
+    assert [parsed for _, parsed, _ in resolved] == ["later"] * (len(futures) - 1)
+
+def test_parser_object_is_used ():
+    parser = SoupParser(IdealoRequester.URL_BASE)
+
+    assert IdealoRequester(None, parser=parser)._parser is parser
+    assert IdealoRequester(None, parser="html.parser")._parser.NAME == "html.parser"
+
+def get_price_chart_urls (catalog):
+    return [IdealoRequester.API_FORMAT.format(product_id, "P500D")
+            for product_id in catalog.get_products(catalog.first_category_id)]
+
+def test_request_many_beyond_the_buffer_budget (catalog, server):
+    # A budget of one byte admits a single request at a time
+    request_manager = get_request_manager(server, max_buffer_bytes=1)
+    urls = get_price_chart_urls(catalog)
+    keys = []
+
+    # Waiting for the budget would never end, the keys that
+    # free it are returned by the same call
+    thread = threading.Thread(target=lambda: keys.extend(
+            request_manager.request_many(urls, IdealoRequester.HEADERS_DICT)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert len(keys) == len(urls)
+    assert len(request_manager._buffer) == 1
+    assert not request_manager.can_request()
+
+    # Fetching a response sends the next request
+    content, status_code = request_manager.fetch(keys[0])
+    assert status_code == 200
+    assert len(request_manager._buffer) == 1
+    assert len(request_manager._deferred) == len(urls) - 2
+
+    responses = request_manager.fetch_many(keys[1:])
+    assert [status_code for _, status_code in responses] == [200] * (len(urls) - 1)
+    assert len(request_manager._buffer) == 0
+    assert request_manager.can_request()
+    assert server.counters[200] == len(urls)
+
+def test_responses_of_request_many_are_fetched_in_any_order (catalog, server):
+    request_manager = get_request_manager(server, max_buffer_bytes=1)
+    urls = get_price_chart_urls(catalog)[:5]
+    keys = request_manager.request_many(urls, IdealoRequester.HEADERS_DICT)
+
+    # A deferred request is sent when its response is fetched
+    last = request_manager.fetch(keys[-1])
+    request_manager.discard(keys[1])
+
+    assert [last] + request_manager.fetch_many(keys[:1] + keys[2:-1]) == \
+        request_manager.fetch_many(request_manager.request_many(urls[-1:] + urls[:1] + urls[2:-1],
+                                                                IdealoRequester.HEADERS_DICT))
+    assert len(request_manager._buffer) == 0
+    assert len(request_manager._deferred) == 0
+
+def get_price_chart (html):
+    # Series of a price chart response as get_api returned it before
+    # the responses were decoded into a long frame
+    data = json.loads(html.decode("utf-8"))["data"]
+
+    indx = []
+    values = []
+
+    for v in data:
+        indx.append(v["x"])
+        values.append(v["y"])
+
+    return pd.Series(values, pd.to_datetime(pd.Index(indx)))
+
+def test_decoded_price_charts_match_the_series (catalog):
+    product_ids = list(catalog.get_products(catalog.first_category_id))[:3] + [1]
+    responses = [json.loads(catalog.price_chart(product_id, "P1M"))
+                 for product_id in product_ids[:3]]
+    # A point without a price and a chart without points
+    responses[1]["data"][0]["y"] = None
+    responses.append({"data" : []})
+    contents = [json.dumps(response).encode() for response in responses]
+
+    frame = IdealoRequester.decode_price_charts(product_ids, contents)
+    charts = IdealoRequester.split_price_frame(frame)
+
+    assert list(frame.columns) == IdealoRequester.PRICE_COLUMNS
+    assert frame["Price"].dtype == np.float64
+    assert frame["Price"].isna().sum() == 1
+    assert list(charts) == product_ids[:3]
+
+    for product_id, content in zip(product_ids, contents[:3]):
+        pd.testing.assert_series_equal(charts[product_id], get_price_chart(content))
+
+def test_covering_period_reaches_back_to_the_age ():
+    periods = {
+            dt.timedelta(0) : "P2D",
+            dt.timedelta(days=2) : "P2D",
+            dt.timedelta(days=2, seconds=1) : "P1M",
+            dt.timedelta(days=40) : "P3M",
+            dt.timedelta(days=90) : "P3M",
+            dt.timedelta(days=100) : "P6M",
+            dt.timedelta(days=365) : "P1Y",
+            dt.timedelta(days=400) : "P500D",
+            dt.timedelta(days=1000) : "P500D"
+        }
+
+    for age, period in periods.items():
+        assert IdealoRequester.get_covering_api_period(age) == period
@@ -0,0 +1,33 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import datetime as dt
+import os.path as osp
+import pandas as pd
+from model.storage import MySQLStorage, SQLiteStorage
+
+
+def test_last_price_ages_of_products (tmp_path):
+    storage = SQLiteStorage(osp.join(str(tmp_path), "prices.db"))
+    storage.store_category(1, "Kategorie")
+    now = dt.datetime(2026, 10, 19)
+
+    for product_id in range(3):
+        storage.store_product(product_id, "Produkt", 1, None)
+
+    storage.merge_prices_frame(pd.DataFrame({
+            "ProductId" : [0, 1, 2],
+            "Date" : pd.to_datetime([now - dt.timedelta(days=days) for days in (1, 2, 3)]),
+            "Price" : [1.0, 2.0, 3.0]
+        }))
+
+    ages = storage.get_last_price_ages(now)[MySQLStorage.V_AGE]
+    assert sorted(ages.index) == [0, 1, 2]
+
+    ages = storage.get_last_price_ages(now, product_ids=[2, 0, 7])[MySQLStorage.V_AGE]
+    assert sorted(ages.index) == [0, 2]
+    assert ages.loc[2] == dt.timedelta(days=3)
+
+    assert len(storage.get_last_price_ages(now, product_ids=[])) == 0
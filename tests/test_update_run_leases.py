@@ -0,0 +1,87 @@
+'''
+Created on 19.10.2026
+
+@author: larsw
+'''
+import datetime as dt
+import multiprocessing as mp
+import os.path as osp
+import pandas as pd
+from model.storage import SQLiteStorage
+
+
+RUNS = 300
+PROCESSES = 4
+
+def store_runs (storage, count):
+    storage.store_category(1, "Kategorie")
+
+    for product_id in range(count):
+        storage.store_product(product_id, "Produkt", 1, None)
+
+    now = dt.datetime.utcnow()
+    storage.store_update_runs(pd.DataFrame(
+            {"Period" : ["P1M"] * count, "Date" : [now] * count},
+            index=pd.Index(range(count), name="ProductId")
+        ))
+
+def work_on_runs (path, owner, results):
+    # Claims and completes runs until none are left, puts the product
+    # IDs of every claim
+    storage = SQLiteStorage(path)
+    claimed = []
+
+    while True:
+        update_runs = storage.claim_update_runs(owner, 7, dt.timedelta(minutes=5))
+
+        if len(update_runs) == 0:
+            break
+
+        claimed.extend(int(product_id) for _, product_id in update_runs.index)
+        storage.complete_update_runs(owner, list(update_runs.index))
+
+    results.put(claimed)
+
+def test_processes_complete_every_run_once (tmp_path):
+    path = osp.join(str(tmp_path), "leases.db")
+    storage = SQLiteStorage(path)
+    store_runs(storage, RUNS)
+
+    results = mp.Queue()
+    processes = [
+            mp.Process(target=work_on_runs, args=(path, "loader-{:d}".format(i), results))
+            for i in range(PROCESSES)
+        ]
+
+    for process in processes:
+        process.start()
+
+    claimed = [results.get(timeout=60) for _ in processes]
+
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    all_claimed = [product_id for claims in claimed for product_id in claims]
+
+    assert len(all_claimed) == len(set(all_claimed))
+    assert set(all_claimed) == set(range(RUNS))
+    assert len(storage.get_update_runs()) == 0
+
+def test_expired_lease_is_taken_over (tmp_path):
+    storage = SQLiteStorage(osp.join(str(tmp_path), "leases.db"))
+    store_runs(storage, 3)
+
+    leased = storage.claim_update_runs("a", None, dt.timedelta(minutes=5))
+    assert len(leased) == 3
+    assert len(storage.claim_update_runs("b", None, dt.timedelta(minutes=5))) == 0
+
+    # A lease that ended already, as if a crashed before renewing it
+    assert storage.renew_update_runs("a", dt.timedelta(seconds=-1)) == 3
+    taken = storage.claim_update_runs("b", None, dt.timedelta(minutes=5))
+
+    assert sorted(taken.index) == sorted(leased.index)
+    assert storage.renew_update_runs("a", dt.timedelta(minutes=5)) == 0
+
+    storage.release_update_runs("b", list(taken.index)[:1])
+    assert len(storage.claim_update_runs("c", None, dt.timedelta(minutes=5))) == 1